@@ -0,0 +1,144 @@
+"""
+Admission Control - Upstream bazlı eşzamanlılık limitleri ve öncelikli kuyruk
+
+Her upstream (LLM, embeddings, SerpAPI, sayfa çekme) için:
+- Aynı anda en fazla N çağrı yapılır
+- Fazlası sınırlı bir kuyrukta öncelik sırasıyla bekler (interaktif > toplu)
+- Kuyruk doluysa veya bekleme süresi aşılırsa UpstreamBusyError fırlatılır (-> 429 + Retry-After)
+"""
+
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+# Öncelik seviyeleri (küçük değer önce çalışır)
+INTERACTIVE = 0
+BULK = 10
+
+_request_priority: contextvars.ContextVar[int] = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+
+
+class UpstreamBusyError(Exception):
+    """Upstream kuyruğu dolu - istemci Retry-After sonra tekrar denemeli"""
+
+    status_code = 429
+
+    def __init__(self, upstream: str, retry_after: int):
+        super().__init__(f"{upstream} meşgul, {retry_after} sn sonra tekrar deneyin")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+@contextmanager
+def request_priority(priority: int) -> Iterator[None]:
+    """Bu blok içindeki upstream çağrılarının önceliğini belirler"""
+    token = _request_priority.set(priority)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+class PriorityLimiter:
+    """Sınırlı, öncelikli bekleme kuyruğuna sahip eşzamanlılık limiti"""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_queue: int,
+        max_wait: float = 30.0,
+        bulk_queue_share: float = 0.5,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        # Toplu işler kuyruğun sadece bu kadarını doldurabilir; kalanı interaktif isteklere ayrılır
+        self.bulk_queue_limit = int(max_queue * bulk_queue_share)
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiters: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._avg_hold = 1.0  # saniye, EWMA
+
+    def _retry_after(self) -> int:
+        backlog = len(self._waiters) + self._active
+        return max(1, math.ceil(self._avg_hold * backlog / self.max_concurrency))
+
+    def acquire(self, priority: Optional[int] = None, timeout: Optional[float] = None) -> None:
+        priority = _request_priority.get() if priority is None else priority
+        timeout = self.max_wait if timeout is None else timeout
+
+        with self._cond:
+            if self._active < self.max_concurrency and not self._waiters:
+                self._active += 1
+                return
+
+            queue_limit = self.max_queue if priority <= INTERACTIVE else self.bulk_queue_limit
+            if len(self._waiters) >= queue_limit:
+                raise UpstreamBusyError(self.name, self._retry_after())
+
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._waiters, entry)
+            deadline = time.monotonic() + timeout
+
+            while True:
+                if self._waiters[0] == entry and self._active < self.max_concurrency:
+                    heapq.heappop(self._waiters)
+                    self._active += 1
+                    # Sıradaki bekleyen de boş slot bulabilir
+                    self._cond.notify_all()
+                    return
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+                    raise UpstreamBusyError(self.name, self._retry_after())
+                self._cond.wait(remaining)
+
+    def release(self, held_for: Optional[float] = None) -> None:
+        with self._cond:
+            self._active -= 1
+            if held_for is not None:
+                self._avg_hold = 0.8 * self._avg_hold + 0.2 * held_for
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: Optional[int] = None, timeout: Optional[float] = None) -> Iterator[None]:
+        """`with limiter.slot(): ...` - slot al, iş bitince bırak"""
+        self.acquire(priority, timeout)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "active": self._active,
+                "queued": len(self._waiters),
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+            }
+
+
+def limiter_from_env(name: str, concurrency: int, queue: int, max_wait: float = 30.0) -> PriorityLimiter:
+    """LIMIT_<NAME>_CONCURRENCY / _QUEUE / _MAX_WAIT ortam değişkenleriyle limiter oluştur"""
+    prefix = f"LIMIT_{name.upper()}_"
+    return PriorityLimiter(
+        name,
+        max_concurrency=int(os.getenv(prefix + "CONCURRENCY", str(concurrency))),
+        max_queue=int(os.getenv(prefix + "QUEUE", str(queue))),
+        max_wait=float(os.getenv(prefix + "MAX_WAIT", str(max_wait))),
+    )
@@ -0,0 +1,104 @@
+"""
+Chunk Metadata - FAISS satırlarına hizalı, kolon bazlı metadata tablosu
+
+- Her FAISS satırı için doküman, sayfa, bölüm ve karakter offset'i numpy kolonlarında tutulur
+- Sorgu filtreleri (doküman / dosya adı / sayfa aralığı / bölüm) bir satır maskesine çevrilir
+- Maske, vektör aramasından ÖNCE FAISS'e izin verilen id kümesi olarak verilir (pre-filtering)
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+
+class ChunkMetadataTable:
+    """FAISS satır numarasıyla indekslenen kolon bazlı metadata"""
+
+    def __init__(self):
+        self.doc_ids: List[str] = []           # doküman kodu -> doküman id
+        self.file_names: List[str] = []        # doküman kodu -> dosya adı
+        self.doc_code = np.zeros(0, dtype=np.int32)
+        self.page = np.zeros(0, dtype=np.int32)
+        self.section = np.zeros(0, dtype=np.int32)
+        self.offset = np.zeros(0, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.doc_code)
+
+    @classmethod
+    def from_faiss(cls, store: FAISS) -> "ChunkMetadataTable":
+        """Store'daki tüm satırların metadata'sından tabloyu kur"""
+        table = cls()
+        codes: Dict[str, int] = {}
+        n = store.index.ntotal
+        doc_code = np.full(n, -1, dtype=np.int32)
+        page = np.zeros(n, dtype=np.int32)
+        section = np.zeros(n, dtype=np.int32)
+        offset = np.zeros(n, dtype=np.int32)
+
+        for row, docstore_id in store.index_to_docstore_id.items():
+            metadata = store.docstore.search(docstore_id).metadata
+            doc_id = metadata.get("doc_id", "")
+            if doc_id not in codes:
+                codes[doc_id] = len(table.doc_ids)
+                table.doc_ids.append(doc_id)
+                table.file_names.append(metadata.get("file_name", ""))
+            doc_code[row] = codes[doc_id]
+            page[row] = metadata.get("page", 0)
+            section[row] = metadata.get("section", 0)
+            offset[row] = metadata.get("offset", 0)
+
+        table.doc_code, table.page, table.section, table.offset = doc_code, page, section, offset
+        return table
+
+    def mask(
+        self,
+        doc_ids: Optional[Sequence[str]] = None,
+        file_names: Optional[Sequence[str]] = None,
+        page_from: Optional[int] = None,
+        page_to: Optional[int] = None,
+        sections: Optional[Sequence[int]] = None,
+    ) -> np.ndarray:
+        """Filtreleri sağlayan satırlar için True olan maske"""
+        mask = np.ones(len(self), dtype=bool)
+
+        if doc_ids is not None or file_names is not None:
+            wanted_ids = set(doc_ids or [])
+            wanted_names = set(file_names or [])
+            codes = [
+                code for code, (doc_id, name) in enumerate(zip(self.doc_ids, self.file_names))
+                if doc_id in wanted_ids or name in wanted_names
+            ]
+            mask &= np.isin(self.doc_code, codes)
+        if page_from is not None:
+            mask &= self.page >= page_from
+        if page_to is not None:
+            mask &= self.page <= page_to
+        if sections is not None:
+            mask &= np.isin(self.section, list(sections))
+        return mask
+
+    def rows(self, **filters) -> np.ndarray:
+        """Filtreleri sağlayan FAISS satır numaraları"""
+        return np.flatnonzero(self.mask(**filters))
+
+
+def filtered_search(store: FAISS, query_vector: Sequence[float], rows: np.ndarray, k: int = 3) -> List[Document]:
+    """Sadece verilen FAISS satırları arasında vektör araması yap"""
+    if len(rows) == 0:
+        return []
+
+    selector = faiss.IDSelectorBatch(rows.astype(np.int64))
+    query = np.asarray([query_vector], dtype=np.float32)
+    if store._normalize_L2:
+        faiss.normalize_L2(query)
+    _, indices = store.index.search(query, min(k, len(rows)), params=faiss.SearchParameters(sel=selector))
+
+    return [
+        store.docstore.search(store.index_to_docstore_id[row])
+        for row in indices[0]
+        if row != -1
+    ]
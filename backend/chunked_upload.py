@@ -0,0 +1,227 @@
+"""
+Chunked Upload - Parça parça, kaldığı yerden devam ettirilebilen dosya yükleme
+
+Protokol:
+- init: dosya adı + toplam boyut -> upload_id
+- append: parça, beklenen offset'e diske akıtılır (tüm dosya bellekte tutulmaz)
+- status: bağlantı koparsa istemci sunucudaki offset'ten devam eder
+- finalize: tüm baytlar geldiyse dosya işlenmeye hazırdır
+
+Durum (meta JSON + veri dosyası) diskte tutulur, aynı dizini paylaşan worker'lar
+aynı yüklemeye devam edebilir. TXT dosyalarında tamamlanmış paragraflar
+yükleme sürerken okunabilir (take_complete_text).
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: process'ler arası kilit yok, tek worker varsayılır
+    fcntl = None
+
+_UPLOAD_ID = re.compile(r"[0-9a-f]{32}")
+_COPY_BUFFER = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Geçersiz yükleme isteği"""
+
+    status_code = 400
+
+
+class UploadNotFound(UploadError):
+    status_code = 404
+
+    def __init__(self, upload_id: str):
+        super().__init__(f"Yükleme bulunamadı: {upload_id}")
+
+
+class UploadOffsetMismatch(UploadError):
+    """Parça beklenen offset'ten başlamıyor; istemci `received`'dan devam etmeli"""
+
+    status_code = 409
+
+    def __init__(self, received: int):
+        self.received = received
+        super().__init__(f"Beklenen offset: {received}")
+
+
+class ChunkedUploadStore:
+    """Diskte parça parça biriken yüklemeler"""
+
+    def __init__(self, directory: str, max_size: int = 200 * 1024 * 1024, ttl_seconds: float = 24 * 3600):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, upload_id: str, suffix: str) -> Path:
+        if not _UPLOAD_ID.fullmatch(upload_id):
+            raise UploadNotFound(upload_id)
+        return self.directory / f"{upload_id}{suffix}"
+
+    @contextmanager
+    def _upload_lock(self, upload_id: str) -> Iterator[None]:
+        # flock farklı dosya tanıtıcıları arasında da çalışır; kilit yoksa process içi lock kullanılır
+        with (nullcontext() if fcntl else self._lock), open(self._path(upload_id, ".lock"), "a") as handle:
+            if fcntl:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _read_meta(self, upload_id: str) -> dict:
+        try:
+            return json.loads(self._path(upload_id, ".json").read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            raise UploadNotFound(upload_id) from None
+
+    def _write_meta(self, upload_id: str, meta: dict) -> None:
+        meta["updated_at"] = time.time()
+        tmp = self._path(upload_id, ".json.tmp")
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, self._path(upload_id, ".json"))
+
+    def init(self, session_id: str, file_name: str, total_size: int) -> dict:
+        """Yeni yükleme başlat"""
+        if total_size <= 0 or total_size > self.max_size:
+            raise UploadError(f"Dosya boyutu 1 - {self.max_size} bayt arasında olmalı")
+        self.cleanup_expired()
+
+        upload_id = uuid.uuid4().hex
+        self._path(upload_id, ".part").touch()
+        meta = {
+            "upload_id": upload_id,
+            "session_id": session_id,
+            "file_name": file_name,
+            "total_size": total_size,
+            "received": 0,
+            "parsed": 0,
+        }
+        self._write_meta(upload_id, meta)
+        return meta
+
+    def status(self, upload_id: str) -> dict:
+        return self._read_meta(upload_id)
+
+    def append(self, upload_id: str, offset: int, source: BinaryIO) -> dict:
+        """
+        Parçayı `offset`'ten itibaren diske yaz.
+
+        Raises:
+            UploadOffsetMismatch: offset sunucudaki alınan bayt sayısına eşit değilse
+        """
+        with self._upload_lock(upload_id):
+            meta = self._read_meta(upload_id)
+            if offset != meta["received"]:
+                raise UploadOffsetMismatch(meta["received"])
+
+            limit = meta["total_size"] - offset
+            written = 0
+            with open(self._path(upload_id, ".part"), "r+b") as data:
+                # Yarıda kalmış önceki bir yazmanın artıkları atılır
+                data.seek(offset)
+                data.truncate()
+                while True:
+                    block = source.read(_COPY_BUFFER)
+                    if not block:
+                        break
+                    written += len(block)
+                    if written > limit:
+                        data.truncate(offset)
+                        raise UploadError("Parça dosyanın bildirilen boyutunu aşıyor")
+                    data.write(block)
+                data.flush()
+                os.fsync(data.fileno())
+
+            meta["received"] = offset + written
+            self._write_meta(upload_id, meta)
+            return meta
+
+    def take_complete_text(self, upload_id: str, encoding: str = "utf-8") -> str:
+        """
+        Henüz okunmamış, tamamlanmış paragrafları döndür (TXT için erken işleme).
+
+        Son paragraf, sonraki parçada devam edebileceği için yükleme bitene kadar bekletilir.
+        """
+        with self._upload_lock(upload_id):
+            meta = self._read_meta(upload_id)
+            start, end = meta["parsed"], meta["received"]
+            if end <= start:
+                return ""
+
+            with open(self._path(upload_id, ".part"), "rb") as data:
+                data.seek(start)
+                raw = data.read(end - start)
+            if end < meta["total_size"]:
+                cut = raw.rfind(b"\n\n")
+                if cut < 0:
+                    return ""
+                raw = raw[:cut + 2]
+
+            meta["parsed"] = start + len(raw)
+            self._write_meta(upload_id, meta)
+        return raw.decode(encoding, errors="replace")
+
+    def finalize(self, upload_id: str) -> dict:
+        """
+        Yüklemeyi tamamla.
+
+        Returns:
+            Meta + "path": birleşmiş dosyanın yolu (işlendikten sonra discard() çağrılmalı)
+        """
+        with self._upload_lock(upload_id):
+            meta = self._read_meta(upload_id)
+            if meta["received"] != meta["total_size"]:
+                raise UploadOffsetMismatch(meta["received"])
+            if meta.get("finalized"):
+                raise UploadError("Yükleme zaten tamamlandı")
+            meta["finalized"] = True
+            self._write_meta(upload_id, meta)
+            meta["path"] = str(self._path(upload_id, ".part"))
+            return meta
+
+    def reopen(self, upload_id: str) -> None:
+        """İşleme başarısız olduysa finalize'ın tekrar çağrılmasına izin ver"""
+        with self._upload_lock(upload_id):
+            meta = self._read_meta(upload_id)
+            meta["finalized"] = False
+            self._write_meta(upload_id, meta)
+
+    def exists(self, upload_id: str) -> bool:
+        try:
+            return self._path(upload_id, ".json").exists()
+        except UploadNotFound:
+            return False
+
+    def discard(self, upload_id: str) -> None:
+        for suffix in (".part", ".json", ".json.tmp", ".lock"):
+            try:
+                self._path(upload_id, suffix).unlink()
+            except FileNotFoundError:
+                pass
+
+    def cleanup_expired(self, now: Optional[float] = None) -> int:
+        """TTL'i dolmuş (terk edilmiş) yüklemeleri sil"""
+        now = now or time.time()
+        removed = 0
+        for meta_file in self.directory.glob("*.json"):
+            try:
+                meta = json.loads(meta_file.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if now - meta.get("updated_at", now) > self.ttl_seconds:
+                self.discard(meta["upload_id"])
+                removed += 1
+        return removed
@@ -0,0 +1,198 @@
+"""
+Context Compression - Prompt'a girecek bağlamı soruyla ilgili cümlelere indirme
+
+- Pasajlar cümlelere bölünür, her cümle soruya göre puanlanır:
+  embedding benzerliği (vektörize, cache'li) + kelime örtüşmesi
+- En yüksek puanlı cümleler token bütçesi dolana kadar seçilir; bütçe bağlamın bir oranıdır
+  (ratio), token_budget sadece üst sınırdır. min_tokens altındaki bağlam olduğu gibi bırakılır
+- Seçilen cümleler pasajlarına geri yazılır (orijinal sıra ve kaynak etiketi korunur)
+- Embedding alınamazsa (breaker açık, deadline) sadece kelime örtüşmesi kullanılır
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    from .context_fusion import Passage, estimate_tokens
+except (ImportError, ValueError):
+    from context_fusion import Passage, estimate_tokens
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+|\n+")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = {
+    "ve", "veya", "ile", "bir", "bu", "şu", "da", "de", "mi", "mı", "mu", "mü", "ne", "nedir", "nasıl",
+    "için", "gibi", "daha", "en", "çok", "ki", "olan", "olarak", "hangi", "neden",
+    "the", "a", "an", "and", "or", "of", "to", "in", "is", "are", "what", "how", "why", "which",
+    "for", "on", "with", "does", "do", "it", "this", "that",
+}
+
+
+def split_sentences(text: str, min_words: int = 3) -> List[str]:
+    """Metni cümlelere böl; çok kısa parçalar bir öncekine eklenir"""
+    sentences: List[str] = []
+    for part in _SENTENCE_END.split(text):
+        part = part.strip()
+        if not part:
+            continue
+        if sentences and len(part.split()) < min_words:
+            sentences[-1] = f"{sentences[-1]} {part}"
+        else:
+            sentences.append(part)
+    return sentences
+
+
+def _terms(text: str) -> set:
+    # Türkçe ekler için kaba kök: ilk 5 karakter ("mimarisi" ~ "mimari")
+    return {w[:5] for w in _WORD.findall(text.lower()) if w not in STOPWORDS and len(w) > 1}
+
+
+def lexical_overlap(question_terms: set, sentence: str) -> float:
+    """Soru terimlerinin cümlede geçen oranı (0-1)"""
+    if not question_terms:
+        return 0.0
+    return len(question_terms & _terms(sentence)) / len(question_terms)
+
+
+class _VectorCache:
+    """Metin -> normalize embedding LRU cache'i"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, texts: Sequence[str]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            found = {}
+            for text in texts:
+                if text in self._items:
+                    self._items.move_to_end(text)
+                    found[text] = self._items[text]
+            return found
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        with self._lock:
+            self._items.update(items)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+class ContextCompressor:
+    """Soru odaklı, çıkarımsal (extractive) bağlam sıkıştırıcı"""
+
+    def __init__(
+        self,
+        embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None,
+        token_budget: int = 600,
+        ratio: float = 0.5,
+        min_tokens: int = 150,
+        semantic_weight: float = 0.7,
+        cache_size: int = 20000,
+    ):
+        """
+        Args:
+            embed_fn: Metin listesini embedding'lere çeviren fonksiyon (None -> sadece kelime örtüşmesi)
+            token_budget: Sıkıştırılmış bağlamın tahmini token üst sınırı
+            ratio: Bağlamın en fazla bu oranı tutulur (bütçe = min(token_budget, ratio * bağlam))
+            min_tokens: Bu kadar veya daha kısa bağlam sıkıştırılmaz (ek embedding çağrısına değmez)
+            semantic_weight: Puanda embedding benzerliğinin ağırlığı (kalanı kelime örtüşmesi)
+            cache_size: Cache'lenecek cümle / soru embedding sayısı
+        """
+        self.embed_fn = embed_fn
+        self.token_budget = token_budget
+        self.ratio = ratio
+        self.min_tokens = min_tokens
+        self.semantic_weight = semantic_weight
+        self._cache = _VectorCache(cache_size)
+
+    def _vectors(self, texts: Sequence[str]) -> Optional[np.ndarray]:
+        """Normalize embedding matrisi; sadece cache'te olmayanlar embed edilir"""
+        if self.embed_fn is None:
+            return None
+
+        unique = list(dict.fromkeys(texts))
+        found = self._cache.get_many(unique)
+        missing = [text for text in unique if text not in found]
+        if missing:
+            try:
+                matrix = np.asarray(self.embed_fn(missing), dtype=np.float32)
+            except Exception as e:
+                print(f"ContextCompressor embedding error: {e}")
+                return None
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            new = dict(zip(missing, matrix))
+            self._cache.put_many(new)
+            found.update(new)
+        return np.vstack([found[text] for text in texts])
+
+    def score(self, question: str, sentences: Sequence[str]) -> np.ndarray:
+        """Her cümlenin soruyla ilgililik puanı"""
+        question_terms = _terms(question)
+        lexical = np.fromiter((lexical_overlap(question_terms, s) for s in sentences), dtype=np.float32, count=len(sentences))
+
+        vectors = self._vectors([question, *sentences])
+        if vectors is None:
+            return lexical
+        semantic = vectors[1:] @ vectors[0]
+        return self.semantic_weight * semantic + (1 - self.semantic_weight) * lexical
+
+    def compress(self, question: str, passages: Sequence[Passage], token_budget: Optional[int] = None) -> List[Passage]:
+        """
+        Pasajları soruyla en ilgili cümlelere indir.
+
+        Args:
+            question: Kullanıcı sorusu
+            passages: Alaka sırasına göre pasajlar
+            token_budget: Verilmezse sıkıştırıcının varsayılan üst sınırı
+
+        Returns:
+            En az bir cümlesi seçilmiş pasajlar (kaynak, etiket ve url korunur)
+        """
+        total = sum(estimate_tokens(p.text) for p in passages)
+        if total <= self.min_tokens:
+            return list(passages)
+        budget = max(self.min_tokens, min(token_budget or self.token_budget, int(total * self.ratio)))
+        if total <= budget:
+            return list(passages)
+
+        # (pasaj, cümle sırası, cümle) düz listesi
+        owners, positions, sentences = [], [], []
+        for i, passage in enumerate(passages):
+            for j, sentence in enumerate(split_sentences(passage.text)):
+                owners.append(i)
+                positions.append(j)
+                sentences.append(sentence)
+        if not sentences:
+            return []
+
+        scores = self.score(question, sentences)
+
+        # Puana göre açgözlü seçim; en iyi cümle bütçeyi aşsa bile alınır
+        chosen = []
+        used = 0
+        for index in np.argsort(-scores, kind="stable"):
+            cost = estimate_tokens(sentences[index])
+            if chosen and used + cost > budget:
+                continue
+            chosen.append(index)
+            used += cost
+
+        # Cümleleri pasajlarına orijinal sırayla geri yaz
+        kept: Dict[int, List[int]] = {}
+        for index in sorted(chosen, key=lambda k: (owners[k], positions[k])):
+            kept.setdefault(owners[index], []).append(index)
+
+        compressed = []
+        for i, indices in sorted(kept.items()):
+            parts = [sentences[indices[0]]]
+            for prev, index in zip(indices, indices[1:]):
+                # Atlanan cümleler "…" ile işaretlenir
+                parts.append(sentences[index] if positions[index] == positions[prev] + 1 else f"… {sentences[index]}")
+            source = passages[i]
+            compressed.append(Passage(" ".join(parts), source.source, source.kind, label=source.label, url=source.url))
+        return compressed
@@ -0,0 +1,91 @@
+"""
+Context Fusion - Farklı kaynaklardan gelen bağlamı tek prompt'ta birleştirme
+
+Hybrid modda doküman (RAG) ve web pasajları:
+- Kaynaklar arasında sırayla (round-robin) seçilir, böylece iki taraf da temsil edilir
+- Neredeyse aynı pasajlar tekilleştirilir
+- Toplam tahmini token sayısı verilen bütçeyi aşmaz
+"""
+
+import re
+from typing import List, Optional, Sequence
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Kaba token tahmini (~4 karakter / token)"""
+    return max(1, len(text) // 4)
+
+
+class Passage:
+    """Prompt'a girecek, kaynağı etiketli tek bir bağlam parçası"""
+
+    def __init__(self, text: str, source: str, kind: str, label: str = "", url: Optional[str] = None):
+        self.text = text
+        self.source = source  # kullanıcıya gösterilecek kaynak (dosya adı / sayfa başlığı)
+        self.kind = kind      # "doc" veya "web"
+        self.label = label    # prompt içindeki atıf etiketi, ör. D1 / W2
+        self.url = url
+
+
+def _shingles(text: str) -> set:
+    words = _WORD.findall(text.lower())
+    return {" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+
+
+def _is_duplicate(candidate: set, seen: List[set], threshold: float) -> bool:
+    for other in seen:
+        union = len(candidate | other)
+        if union and len(candidate & other) / union >= threshold:
+            return True
+    return False
+
+
+def fuse_passages(
+    groups: Sequence[Sequence[Passage]],
+    token_budget: int,
+    dedup_threshold: float = 0.8,
+) -> List[Passage]:
+    """
+    Kaynak gruplarını round-robin birleştir, tekilleştir ve token bütçesine sığdır.
+
+    Args:
+        groups: Her kaynağın alaka sırasına göre pasaj listesi (ör. [doc_passages, web_passages])
+        token_budget: Bağlam için toplam tahmini token bütçesi
+        dedup_threshold: Bu Jaccard benzerliğinin üstündeki pasajlar tekrar sayılır
+
+    Returns:
+        Etiketlenmiş (D1, W1...) seçili pasajlar
+    """
+    selected: List[Passage] = []
+    seen: List[set] = []
+    used = 0
+    counters = {}
+    max_len = max((len(g) for g in groups), default=0)
+
+    for rank in range(max_len):
+        for group in groups:
+            if rank >= len(group):
+                continue
+            passage = group[rank]
+            cost = estimate_tokens(passage.text)
+            if used + cost > token_budget:
+                continue
+
+            shingles = _shingles(passage.text)
+            if _is_duplicate(shingles, seen, dedup_threshold):
+                continue
+
+            counters[passage.kind] = counters.get(passage.kind, 0) + 1
+            passage.label = f"{passage.kind[0].upper()}{counters[passage.kind]}"
+            selected.append(passage)
+            seen.append(shingles)
+            used += cost
+
+    return selected
+
+
+def format_passages(passages: Sequence[Passage]) -> str:
+    """Pasajları prompt'a girecek "[D1] (kaynak) metin" biçiminde yaz"""
+    return "\n\n".join(f"[{p.label}] ({p.source})\n{p.text}" for p in passages)
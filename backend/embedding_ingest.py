@@ -0,0 +1,223 @@
+"""
+Parallel Embedding Ingestion - AIMD hız kontrollü toplu embedding
+
+Doküman chunk'larını batch'lere bölüp embedding API'sine eşzamanlı gönderir:
+- Eşzamanlılık 429 / gecikme sinyallerine göre AIMD ile ayarlanır
+- Başarısız batch'ler tek başına yeniden denenir (başarılı olanlar tekrar gönderilmez)
+- Tamamlanan her batch FAISS index'ine hemen eklenir
+- Opsiyonel bir upstream limiter verilirse her batch onun slot'u altında gönderilir
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+
+try:
+    from .profiling import span
+except (ImportError, ValueError):
+    from profiling import span
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Hata bir 429 / kota aşımı sinyali mi?"""
+    for attr in ("status_code", "code"):
+        if getattr(error, attr, None) == 429:
+            return True
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+
+    text = f"{type(error).__name__} {error}".lower()
+    return any(s in text for s in ("429", "resourceexhausted", "resource exhausted", "rate limit", "quota"))
+
+
+class AIMDController:
+    """Additive-increase / multiplicative-decrease eşzamanlılık kontrolcüsü"""
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 16,
+        latency_target: float = 5.0,
+        decrease_factor: float = 0.5,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self._limit = float(min(max(initial, minimum), maximum))
+        self._lock = threading.Lock()
+
+    @property
+    def current(self) -> int:
+        """Şu an izin verilen eşzamanlı batch sayısı"""
+        with self._lock:
+            return max(self.minimum, int(self._limit))
+
+    def on_success(self, latency: float) -> None:
+        """Başarılı batch: gecikme hedefin altındaysa limiti yavaşça artır"""
+        with self._lock:
+            if latency > self.latency_target:
+                self._decrease()
+            else:
+                # Her "tam pencere" başarı için +1 (TCP tarzı additive increase)
+                self._limit = min(self.maximum, self._limit + 1.0 / max(self._limit, 1.0))
+
+    def on_throttle(self) -> None:
+        """429 geldi: limiti çarpımsal olarak düşür"""
+        with self._lock:
+            self._decrease()
+
+    def _decrease(self) -> None:
+        self._limit = max(float(self.minimum), self._limit * self.decrease_factor)
+
+
+class ParallelEmbedder:
+    """Chunk'ları eşzamanlı batch'lerle embed edip FAISS'e akıtan ingestion yardımcısı"""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = 64,
+        controller: Optional[AIMDController] = None,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        limiter=None,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.controller = controller or AIMDController()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limiter = limiter
+
+    def _embed_batch(
+        self, batch: List[str], known: Dict[str, List[float]]
+    ) -> Tuple[List[List[float]], Optional[float]]:
+        # Önceden hesaplanmış vektörü olan metinler API'ye gönderilmez
+        missing = [text for text in batch if text not in known]
+        if not missing:
+            return [known[text] for text in batch], None
+
+        with span("embeddings.batch", texts=len(missing)):
+            if self.limiter is None:
+                started = time.monotonic()
+                fetched = self.embeddings.embed_documents(missing)
+                latency = time.monotonic() - started
+            else:
+                with self.limiter.slot():
+                    # Gecikme, limiter kuyruğunda beklenen süreyi içermemeli
+                    started = time.monotonic()
+                    fetched = self.embeddings.embed_documents(missing)
+                    latency = time.monotonic() - started
+
+        fetched_by_text = dict(zip(missing, fetched))
+        return [known[text] if text in known else fetched_by_text[text] for text in batch], latency
+
+    def _embed_batches(
+        self, texts: List[str], known: Dict[str, List[float]]
+    ) -> Iterator[Tuple[int, List[str], List[List[float]]]]:
+        """Batch'leri paralel embed et; tamamlananları (başlangıç indeksi, metinler, vektörler) olarak ver"""
+        # (hazır olma zamanı, başlangıç indeksi) kuyruğu
+        pending: List[Tuple[float, int]] = [(0.0, start) for start in range(0, len(texts), self.batch_size)]
+        attempts: Dict[int, int] = {start: 0 for _, start in pending}
+        in_flight: Dict[Future, int] = {}
+
+        with ThreadPoolExecutor(max_workers=self.controller.maximum) as pool:
+            while pending or in_flight:
+                now = time.monotonic()
+
+                # Limit izin verdiği kadar hazır batch gönder
+                for item in sorted(pending):
+                    if len(in_flight) >= self.controller.current or item[0] > now:
+                        break
+                    pending.remove(item)
+                    start = item[1]
+                    batch = texts[start:start + self.batch_size]
+                    # Çağıranın context'i (istek önceliği vb.) worker thread'e taşınır
+                    context = contextvars.copy_context()
+                    in_flight[pool.submit(context.run, self._embed_batch, batch, known)] = start
+
+                if not in_flight:
+                    # Sadece geri çekilmede bekleyen batch'ler var
+                    time.sleep(max(0.0, min(ready for ready, _ in pending) - now))
+                    continue
+
+                next_ready = min((ready for ready, _ in pending), default=None)
+                timeout = max(0.0, next_ready - now) if next_ready is not None else None
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    start = in_flight.pop(future)
+                    batch = texts[start:start + self.batch_size]
+                    try:
+                        vectors, latency = future.result()
+                    except Exception as e:
+                        attempts[start] += 1
+                        if attempts[start] > self.max_retries:
+                            raise
+                        if is_rate_limit_error(e):
+                            self.controller.on_throttle()
+                        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts[start] - 1)))
+                        pending.append((time.monotonic() + delay, start))
+                        continue
+
+                    if latency is not None:
+                        self.controller.on_success(latency)
+                    yield start, batch, vectors
+
+    def embed_documents(
+        self, texts: List[str], known_vectors: Optional[Dict[str, List[float]]] = None
+    ) -> List[List[float]]:
+        """Metinleri index'e eklemeden, aynı batch / AIMD / retry mantığıyla embed et (giriş sırasıyla)"""
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for start, _, batch_vectors in self._embed_batches(texts, known_vectors or {}):
+            vectors[start:start + len(batch_vectors)] = batch_vectors
+        return vectors
+
+    def embed_into_faiss(
+        self,
+        texts: List[str],
+        metadatas: Optional[List[dict]] = None,
+        on_batch: Optional[Callable[[int, List[str], List[List[float]]], None]] = None,
+        store: Optional[FAISS] = None,
+        known_vectors: Optional[Dict[str, List[float]]] = None,
+    ) -> FAISS:
+        """
+        Metinleri paralel embed eder ve tamamlanan batch'leri sırayla FAISS'e ekler.
+
+        Args:
+            texts: Embed edilecek chunk'lar
+            metadatas: Her chunk için opsiyonel metadata
+            on_batch: Her batch index'e eklendikten sonra (başlangıç indeksi, docstore id'leri, vektörler) ile çağrılır
+            store: Verilirse yeni chunk'lar bu store'a eklenir
+            known_vectors: Önceden embed edilmiş chunk'lar (metin -> vektör); bunlar için API çağrılmaz
+
+        Returns:
+            Tüm chunk'ları içeren FAISS store
+        """
+        if not texts:
+            raise ValueError("Embed edilecek metin yok")
+
+        for start, batch, vectors in self._embed_batches(texts, known_vectors or {}):
+            # Tamamlanan batch'i index'e akıt
+            pairs = list(zip(batch, vectors))
+            batch_metadatas = metadatas[start:start + len(batch)] if metadatas else None
+            if store is None:
+                store = FAISS.from_embeddings(pairs, self.embeddings, metadatas=batch_metadatas)
+                ids = list(store.index_to_docstore_id.values())
+            else:
+                ids = store.add_embeddings(pairs, metadatas=batch_metadatas)
+
+            if on_batch:
+                on_batch(start, ids, vectors)
+
+        return store
@@ -0,0 +1,119 @@
+"""
+Hierarchical Index - Büyük dokümanlar için iki aşamalı (coarse-to-fine) arama
+
+- Her bölüm (PDF sayfası, DOCX başlığı, TXT parçası) için chunk embedding'lerinin
+  normalize ortalaması bölüm özet vektörü olarak tutulur (ek API çağrısı gerekmez)
+- Sorgu önce bölüm vektörlerinde aranır, sonra sadece en iyi `fan_out` bölümün chunk'ları taranır
+- Index upload sırasında, embedding batch'leri geldikçe artımlı olarak kurulur
+- Arama yapıları tek bir tuple olarak atanır: eşzamanlı sorgular yarım kurulmuş hali görmez
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class HierarchicalIndex:
+    """Bölüm özet vektörleri + bölüm içi chunk vektörleri"""
+
+    def __init__(self):
+        self._ids: List[str] = []                      # satır -> docstore id
+        self._vectors: List[np.ndarray] = []           # satır -> normalize chunk vektörü
+        self._section_rows: Dict[int, List[int]] = {}  # bölüm -> satırlar
+        self._section_sums: Dict[int, np.ndarray] = {}
+        # (chunk matrisi, bölüm sırası, bölüm özetleri, bölüm -> satırlar) - arama için lazy kurulur
+        self._search_state: Optional[Tuple[np.ndarray, List[int], np.ndarray, Dict[int, List[int]]]] = None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @classmethod
+    def from_faiss(cls, store) -> "HierarchicalIndex":
+        """Store'daki vektörlerden ve chunk'ların 'section' metadata'sından index'i yeniden kur"""
+        index = cls()
+        n = store.index.ntotal
+        if n == 0:
+            return index
+        ids = [store.index_to_docstore_id[row] for row in range(n)]
+        sections = [store.docstore.search(doc_id).metadata.get("section", 0) for doc_id in ids]
+        index.add(ids, store.index.reconstruct_n(0, n), sections)
+        return index
+
+    @property
+    def next_section(self) -> int:
+        """Yeni eklenecek dokümanın ilk bölüm numarası"""
+        return max(self._section_sums, default=-1) + 1
+
+    def add(self, ids: Sequence[str], vectors: Sequence[Sequence[float]], sections: Sequence[int]) -> None:
+        """Bir embedding batch'ini ekle (sıra önemli değil)"""
+        normalized = _normalize(np.asarray(vectors, dtype=np.float32))
+        for doc_id, vector, section in zip(ids, normalized, sections):
+            row = len(self._ids)
+            self._ids.append(doc_id)
+            self._vectors.append(vector)
+            self._section_rows.setdefault(section, []).append(row)
+            if section in self._section_sums:
+                self._section_sums[section] = self._section_sums[section] + vector
+            else:
+                self._section_sums[section] = vector.copy()
+
+        # Arama yapıları bir sonraki sorguda yeniden oluşturulur
+        self._search_state = None
+
+    def _prepare(self) -> Tuple[np.ndarray, List[int], np.ndarray, Dict[int, List[int]]]:
+        state = self._search_state
+        if state is not None:
+            return state
+        # Önce yerel değişkenlerde kur, sonra tek atamayla yayınla
+        matrix = np.vstack(self._vectors)
+        rows = len(matrix)
+        section_rows = {s: [r for r in section if r < rows] for s, section in list(self._section_rows.items())}
+        section_order = [s for s in section_rows if section_rows[s] and s in self._section_sums]
+        centroids = _normalize(np.vstack([self._section_sums[s] for s in section_order]))
+        state = (matrix, section_order, centroids, section_rows)
+        self._search_state = state
+        return state
+
+    def search(self, query_vector: Sequence[float], k: int = 3, fan_out: int = 4) -> List[str]:
+        """
+        İki aşamalı arama.
+
+        Args:
+            query_vector: Sorgu embedding'i
+            k: Döndürülecek chunk sayısı
+            fan_out: İnce aramanın yapılacağı bölüm sayısı
+
+        Returns:
+            En benzer chunk'ların docstore id'leri (benzerliğe göre sıralı)
+        """
+        if not self._ids:
+            return []
+        matrix, section_order, centroids, section_rows = self._prepare()
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+
+        # 1) Coarse: bölüm özetleri
+        section_scores = centroids @ query
+        fan_out = min(fan_out, len(section_order))
+        top_sections = np.argpartition(-section_scores, fan_out - 1)[:fan_out]
+
+        # 2) Fine: sadece seçili bölümlerin chunk'ları
+        rows = np.fromiter(
+            (row for i in top_sections for row in section_rows[section_order[i]]),
+            dtype=np.int64,
+        )
+        scores = matrix[rows] @ query
+        k = min(k, len(rows))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [self._ids[rows[i]] for i in best]
+
+    def __getstate__(self) -> dict:
+        # Paylaşımlı state için serileştirilirken türetilmiş matrisler atılır
+        state = self.__dict__.copy()
+        state["_search_state"] = None
+        return state
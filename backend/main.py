@@ -1,9 +1,17 @@
+import contextvars
+import copy
+import math
 import os
+import pickle
 import requests
 import tempfile
 import shutil
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
 
@@ -19,14 +27,15 @@ os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
 # LangChain imports
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, HumanMessage
 from langchain_community.document_loaders import PyPDFLoader, TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
 
 # FastAPI imports
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Request
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
 # Document processing
@@ -38,9 +47,192 @@ try:
 except (ImportError, ValueError):
     from semantic_router import SemanticRouter
 
+# Paralel embedding ingestion
+try:
+    from .embedding_ingest import AIMDController, ParallelEmbedder
+except (ImportError, ValueError):
+    from embedding_ingest import AIMDController, ParallelEmbedder
+
+# Paylaşımlı session state (çoklu worker / node)
+try:
+    from .state_store import BackendChatMessageHistory, SharedObjectRegistry, create_state_backend
+except (ImportError, ValueError):
+    from state_store import BackendChatMessageHistory, SharedObjectRegistry, create_state_backend
+
+# Admission control (upstream limitleri)
+try:
+    from .admission import BULK, UpstreamBusyError, limiter_from_env, request_priority
+except (ImportError, ValueError):
+    from admission import BULK, UpstreamBusyError, limiter_from_env, request_priority
+
+# Deadline, hedged retry ve circuit breaker
+try:
+    from .resilience import CircuitOpenError, DeadlineExceeded, Upstream, deadline_scope, remaining
+except (ImportError, ValueError):
+    from resilience import CircuitOpenError, DeadlineExceeded, Upstream, deadline_scope, remaining
+
+# Router karar verirken spekülatif retrieval
+try:
+    from .speculation import SpeculativeRetriever, predict_mode
+except (ImportError, ValueError):
+    from speculation import SpeculativeRetriever, predict_mode
+
+# Çok kaynaklı (hybrid) bağlam birleştirme
+try:
+    from .context_fusion import Passage, format_passages, fuse_passages
+except (ImportError, ValueError):
+    from context_fusion import Passage, format_passages, fuse_passages
+
+# Soru odaklı cümle seçimiyle prompt bağlamını küçültme
+try:
+    from .context_compression import ContextCompressor
+except (ImportError, ValueError):
+    from context_compression import ContextCompressor
+
+# Çekilen sayfalardan kalıcı web bilgi index'i
+try:
+    from .web_knowledge import WebKnowledgeIndex
+except (ImportError, ValueError):
+    from web_knowledge import WebKnowledgeIndex
+
+# Büyük dokümanlar için iki aşamalı (bölüm -> chunk) arama
+try:
+    from .hierarchical_index import HierarchicalIndex
+except (ImportError, ValueError):
+    from hierarchical_index import HierarchicalIndex
+
+# Kolon bazlı chunk metadata'sı + filtreli (pre-filter) arama
+try:
+    from .chunk_metadata import ChunkMetadataTable, filtered_search
+except (ImportError, ValueError):
+    from chunk_metadata import ChunkMetadataTable, filtered_search
+
+# İsteğe bağlı istek profili (örnekleme profili + span ağacı)
+try:
+    from .profiling import RequestProfiler, span, traced
+except (ImportError, ValueError):
+    from profiling import RequestProfiler, span, traced
+
+# Parça parça, devam ettirilebilir doküman yükleme
+try:
+    from .chunked_upload import ChunkedUploadStore, UploadError, UploadOffsetMismatch
+except (ImportError, ValueError):
+    from chunked_upload import ChunkedUploadStore, UploadError, UploadOffsetMismatch
+
 # FastAPI app
 app = FastAPI(title="Yazılım Mimarı Asistanı")
 
+# Upstream başına eşzamanlılık limitleri (LIMIT_<NAME>_CONCURRENCY / _QUEUE / _MAX_WAIT ile ayarlanır)
+upstream_limiters = {
+    "llm": limiter_from_env("llm", concurrency=8, queue=32),
+    "embeddings": limiter_from_env("embeddings", concurrency=8, queue=64),
+    "serpapi": limiter_from_env("serpapi", concurrency=4, queue=16),
+    "fetch": limiter_from_env("fetch", concurrency=8, queue=16),
+}
+
+
+# Upstream sarmalayıcıları: kalan deadline'a göre timeout, p95 sonrası hedged deneme, circuit breaker
+upstreams = {
+    "llm": Upstream(
+        "llm", timeout=float(os.getenv("LLM_TIMEOUT", "60")),
+        limiter=upstream_limiters["llm"], ignore_errors=(UpstreamBusyError,),
+    ),
+    "embeddings": Upstream(
+        "embeddings", timeout=float(os.getenv("EMBEDDINGS_TIMEOUT", "20")),
+        limiter=upstream_limiters["embeddings"], ignore_errors=(UpstreamBusyError,),
+    ),
+    "serpapi": Upstream(
+        "serpapi", timeout=float(os.getenv("SERPAPI_TIMEOUT", "10")),
+        limiter=upstream_limiters["serpapi"], ignore_errors=(UpstreamBusyError,),
+    ),
+    "fetch": Upstream(
+        "fetch", timeout=float(os.getenv("FETCH_TIMEOUT", "10")),
+        limiter=upstream_limiters["fetch"], ignore_errors=(UpstreamBusyError,),
+    ),
+}
+
+# İstek başına toplam süre bütçesi (Streamlit istemcisinin 120 sn timeout'undan kısa)
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "100"))
+# X-Request-Timeout ile istenebilecek en kısa bütçe
+MIN_REQUEST_DEADLINE_SECONDS = float(os.getenv("MIN_REQUEST_DEADLINE_SECONDS", "5"))
+
+
+@app.middleware("http")
+async def request_deadline(request: Request, call_next):
+    """Her isteğe bir deadline ata; istemci X-Request-Timeout ile daha kısa bir bütçe isteyebilir"""
+    seconds = REQUEST_DEADLINE_SECONDS
+    try:
+        requested = float(request.headers.get("X-Request-Timeout", seconds))
+        if math.isfinite(requested):
+            seconds = min(seconds, max(MIN_REQUEST_DEADLINE_SECONDS, requested))
+    except ValueError:
+        pass
+    with deadline_scope(seconds):
+        return await call_next(request)
+
+
+# Profil: X-Profile başlığı PROFILE_ADMIN_TOKEN ile eşleşen veya PROFILE_SAMPLE_RATE ile seçilen istekler
+request_profiler = RequestProfiler(
+    directory=os.getenv("PROFILE_DIR", "profiles"),
+    admin_token=os.getenv("PROFILE_ADMIN_TOKEN") or None,
+    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+    interval_ms=float(os.getenv("PROFILE_INTERVAL_MS", "5")),
+)
+
+
+@app.middleware("http")
+async def request_profiling(request: Request, call_next):
+    """Seçilen isteği profille; dosya adı X-Profile-Id başlığında döner"""
+    if not request_profiler.enabled or not request_profiler.should_profile(request.headers.get("X-Profile")):
+        return await call_next(request)
+    
+    with request_profiler.profile(f"{request.method} {request.url.path}") as trace:
+        response = await call_next(request)
+    response.headers["X-Profile-Id"] = trace.trace_id
+    return response
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc), "upstream": exc.upstream},
+        headers={"Retry-After": "15"},
+    )
+
+
+@app.exception_handler(UpstreamBusyError)
+async def upstream_busy_handler(request: Request, exc: UpstreamBusyError):
+    """Kuyruk doluysa erkenden 429 + Retry-After ile yükü at"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "upstream": exc.upstream},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(UploadError)
+async def upload_error_handler(request: Request, exc: UploadError):
+    content = {"detail": str(exc)}
+    if isinstance(exc, UploadOffsetMismatch):
+        # İstemci yüklemeye bu offset'ten devam eder
+        content["received"] = exc.received
+    return JSONResponse(status_code=exc.status_code, content=content)
+
+
+@app.get("/admission/stats")
+def admission_stats():
+    """Upstream limitlerinin anlık doluluk, breaker ve gecikme bilgisi"""
+    return {
+        name: {**limiter.stats(), **upstreams[name].stats()}
+        for name, limiter in upstream_limiters.items()
+    }
+
 # ---------------------------
 # 1) LLM (Gemini API)
 # ---------------------------
@@ -52,6 +244,8 @@ llm = ChatGoogleGenerativeAI(
     model=MODEL_NAME,
     google_api_key=GOOGLE_API_KEY,
     temperature=0.3,
+    # Varsayılan üst sınır; upstream üzerinden yapılan çağrılar kalan bütçeyi timeout olarak verir
+    timeout=upstreams["llm"].timeout,
 )
 
 
@@ -82,26 +276,44 @@ prompt = ChatPromptTemplate.from_messages([
     ("human", "{input}")
 ])
 
-# LCEL chain
-chain = prompt | llm
+
+def invoke_llm(prompt_text: str):
+    """LLM çağrısını 'llm' upstream'i üzerinden yap (limit + deadline + hedge + breaker)"""
+    # Deneme bütçesi istemciye verilir: süresi dolan deneme gerçekten kesilir ve slot'unu bırakır
+    return upstreams["llm"].call(lambda timeout: llm.invoke(prompt_text, timeout=timeout))
+
+
+class GuardedLLM:
+    """SemanticRouter gibi `.invoke` bekleyen bileşenler için korumalı LLM"""
+
+    def invoke(self, prompt_text: str):
+        return invoke_llm(prompt_text)
 
 # ---------------------------
 # 4) Memory store (session bazlı)
 # ---------------------------
-_store: Dict[str, InMemoryChatMessageHistory] = {}
-
-def get_history(session_id: str) -> InMemoryChatMessageHistory:
-    if session_id not in _store:
-        _store[session_id] = InMemoryChatMessageHistory()
-    return _store[session_id]
-
-# RunnableWithMessageHistory -> otomatik history ekler/tutar
-chatbot = RunnableWithMessageHistory(
-    chain,
-    get_history,
-    input_messages_key="input",      # kullanıcı girişi hangi key'de
-    history_messages_key="history",  # geçmiş promptta hangi isimle geçiyor
-)
+# STATE_BACKEND=memory|sqlite|redis -> sqlite/redis ile birden fazla worker aynı state'i görür
+state_backend = create_state_backend()
+SESSION_TTL = float(os.getenv("SESSION_TTL_SECONDS", "0")) or None
+# Paylaşımlı backend'de worker başına yerel olarak tutulan (deserialize edilmiş) session nesnesi sayısı
+STATE_LOCAL_CACHE_SIZE = int(os.getenv("STATE_LOCAL_CACHE_SIZE", "64"))
+# Paylaşımlı backend'e yazılan pickle / FAISS verisini HMAC ile imzala (tüm worker'larda aynı olmalı)
+STATE_SIGNING_KEY = os.getenv("STATE_SIGNING_KEY", "").encode("utf-8") or None
+
+def get_history(session_id: str) -> BaseChatMessageHistory:
+    # memory backend'de de aynı sınıf: SESSION_TTL_SECONDS geçmişe uygulanır
+    return BackendChatMessageHistory(state_backend, session_id, ttl=SESSION_TTL)
+
+
+def invoke_chatbot(message: str, session_id: str):
+    """History'li chat çağrısını 'llm' upstream'i üzerinden yap"""
+    history = get_history(session_id)
+    messages = prompt.format_messages(history=history.messages, input=message)
+    result = upstreams["llm"].call(lambda timeout: llm.invoke(messages, timeout=timeout))
+    # History sadece kabul edilen yanıtla yazılır: timeout (504) sonrası geç gelen yanıt eklenmez,
+    # hedged ikinci deneme de mesajı iki kez eklemez
+    history.add_messages([HumanMessage(content=message), result])
+    return result
 
 # ---------------------------
 # 5) Request/Response model
@@ -115,11 +327,9 @@ class ChatResponse(BaseModel): #llm output
 
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    result = chatbot.invoke(
-        {"input": request.message},
-        config={"configurable": {"session_id": request.session_id}}
-    )
+@traced("endpoint.chat")
+def chat(request: ChatRequest):
+    result = invoke_chatbot(request.message, request.session_id)
     return ChatResponse(answer=result.content)
 
 
@@ -128,6 +338,7 @@ async def chat(request: ChatRequest):
 # ---------------------------
 SERPAPI_KEY = os.getenv("SERPAPI_KEY")
 
+@traced("web.serpapi")
 def serpapi_search(query: str) -> dict:
     """SerpAPI ile Google araması yap ve ilk sonucun URL'sini döndür"""
     params = {
@@ -139,9 +350,13 @@ def serpapi_search(query: str) -> dict:
         "num": 5
     }
     
+    def _search(timeout: float) -> dict:
+        response = requests.get("https://serpapi.com/search", params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    
     try:
-        response = requests.get("https://serpapi.com/search", params=params, timeout=10)
-        data = response.json()
+        data = upstreams["serpapi"].call(_search)
         
         if "organic_results" in data and len(data["organic_results"]) > 0:
             first_result = data["organic_results"][0]
@@ -151,7 +366,10 @@ def serpapi_search(query: str) -> dict:
                 "snippet": first_result.get("snippet", "")
             }
         return None
-            
+    
+    # Kuyruk doluysa 429 olarak yukarı çıkar (None'a yutulmaz)
+    except UpstreamBusyError:
+        raise
     except Exception as e:
         return None
 
@@ -160,27 +378,69 @@ def fetch_url_content(url: str, max_chars: int = 3000) -> str:
     """URL'den içerik çek ve temizle"""
     try:
         headers = {"User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"}
-        response = requests.get(url, headers=headers, timeout=10)
+        response = upstreams["fetch"].call(
+            lambda timeout: requests.get(url, headers=headers, timeout=timeout)
+        )
         response.raise_for_status()
         
-        soup = BeautifulSoup(response.text, "html.parser")
-        
-        # Script ve style taglerini kaldır
-        for tag in soup(["script", "style", "nav", "footer", "header"]):
-            tag.decompose()
-        
-        # Metni al
-        text = soup.get_text(separator=" ", strip=True)
+        with span("web.parse_html", bytes=len(response.content)):
+            soup = BeautifulSoup(response.text, "html.parser")
+            
+            # Script ve style taglerini kaldır
+            for tag in soup(["script", "style", "nav", "footer", "header"]):
+                tag.decompose()
+            
+            # Metni al
+            text = soup.get_text(separator=" ", strip=True)
         
         # Fazla boşlukları temizle
         text = " ".join(text.split())
         
         return text[:max_chars]
         
+    except UpstreamBusyError:
+        raise
     except Exception as e:
         return ""
 
 
+def lookup_web_knowledge(query: str) -> Optional[Tuple[dict, str]]:
+    """Lokal web bilgi index'inde taze ve benzer bir sayfa varsa (arama sonucu, içerik) döndür"""
+    if web_knowledge is None:
+        return None
+    try:
+        docs = upstreams["embeddings"].call(lambda timeout: web_knowledge.lookup(query), hedge=False)
+    except Exception as e:
+        # Index sadece bir kısayol: hata olursa normal web aramasına devam
+        return None
+    if not docs:
+        return None
+    
+    # Atıf doğru olsun diye sadece en iyi eşleşen sayfanın chunk'ları kullanılır
+    top = docs[0].metadata
+    page_chunks = [doc.page_content for doc in docs if doc.metadata.get("url") == top["url"]]
+    search_result = {"url": top["url"], "title": top.get("title", top["url"]), "snippet": page_chunks[0][:200]}
+    return search_result, "\n\n".join(page_chunks)
+
+
+def retrieve_web(query: str) -> Tuple[Optional[dict], str]:
+    """Ara ve ilk sonucun içeriğini çek -> (arama sonucu, sayfa içeriği)"""
+    # Önce lokal index: yeterince taze eşleşme varsa SerpAPI ve sayfa çekme atlanır
+    cached = lookup_web_knowledge(query)
+    if cached:
+        return cached
+    
+    search_result = serpapi_search(query)
+    if not search_result:
+        return None, ""
+    content = fetch_url_content(search_result["url"])
+    
+    # Çekilen sayfayı sonraki sorular için index'e ekle (arka planda)
+    if content and web_knowledge is not None and not web_knowledge.is_fresh(search_result["url"]):
+        web_knowledge.add_page_async(search_result["url"], search_result["title"], content)
+    return search_result, content
+
+
 class WebSearchRequest(BaseModel):
     session_id: str
     message: str
@@ -191,18 +451,16 @@ class WebSearchResponse(BaseModel):
 
 
 @app.post("/web_search", response_model=WebSearchResponse)
-async def web_search(request: WebSearchRequest):
+@traced("endpoint.web_search")
+def web_search(request: WebSearchRequest):
     """Web'de ara, ilk sonucu çek ve LLM ile özetle"""
     
-    # 1. SerpAPI ile arama yap
-    search_result = serpapi_search(request.message)
+    # 1. Lokal web index'i / SerpAPI ile ara ve 2. URL'den içerik çek
+    search_result, content = retrieve_web(request.message)
     
     if not search_result:
         return WebSearchResponse(answer="❌ Arama sonucu bulunamadı.")
     
-    # 2. URL'den içerik çek
-    content = fetch_url_content(search_result["url"])
-    
     if not content:
         # İçerik çekilemezse sadece snippet döndür
         return WebSearchResponse(
@@ -214,7 +472,7 @@ async def web_search(request: WebSearchRequest):
 Yanıtı Türkçe ve akıcı bir dille oluştur. Kaynak bilgisini de belirt.
 
 WEB SAYFASI İÇERİĞİ:
-{content}
+{compress_text(request.message, content, search_result['title'])}
 
 KULLANICI SORUSU: {request.message}
 
@@ -222,7 +480,7 @@ KAYNAK: {search_result['url']}
 
 YANIT:"""
     
-    result = llm.invoke(web_prompt)
+    result = invoke_llm(web_prompt)
     answer = f"{result.content}\n\n📚 **Kaynak:** [{search_result['title']}]({search_result['url']})"
     
     return WebSearchResponse(answer=answer)
@@ -235,11 +493,77 @@ YANIT:"""
 # Embedding modeli (Gemini ile)
 embeddings = GoogleGenerativeAIEmbeddings(
     model="models/embedding-001",
-    google_api_key=GOOGLE_API_KEY
+    google_api_key=GOOGLE_API_KEY,
+    # Çağrı başına timeout desteklenmiyor: HTTP istemcisi upstream timeout'uyla sınırlanır
+    client_args={"timeout": upstreams["embeddings"].timeout},
 )
 
-# Global FAISS index (session bazlı tutulabilir)
-_faiss_stores: Dict[str, FAISS] = {}
+# Upload sırasında chunk'ları eşzamanlı batch'lerle embed eden yardımcı
+parallel_embedder = ParallelEmbedder(
+    embeddings,
+    batch_size=int(os.getenv("EMBED_BATCH_SIZE", "64")),
+    controller=AIMDController(
+        initial=int(os.getenv("EMBED_INITIAL_CONCURRENCY", "4")),
+        maximum=int(os.getenv("EMBED_MAX_CONCURRENCY", "16")),
+    ),
+    max_retries=int(os.getenv("EMBED_MAX_RETRIES", "5")),
+    limiter=upstream_limiters["embeddings"],
+)
+
+# Session bazlı FAISS index'leri (paylaşımlı backend'de serileştirilip tüm worker'lara açılır)
+# FAISS / pickle verisi deserialize edilir: STATE_BACKEND sunucusu güvenilir olmalı (bkz. state_store)
+_faiss_stores = SharedObjectRegistry(
+    state_backend,
+    namespace="faiss",
+    serialize=lambda store: store.serialize_to_bytes(),
+    deserialize=lambda data: FAISS.deserialize_from_bytes(
+        data, embeddings, allow_dangerous_deserialization=True
+    ),
+    ttl=SESSION_TTL,
+    max_local=STATE_LOCAL_CACHE_SIZE,
+    signing_key=STATE_SIGNING_KEY,
+)
+
+# Session bazlı chunk metadata tabloları (FAISS satırlarına hizalı)
+_chunk_tables = SharedObjectRegistry(
+    state_backend,
+    namespace="chunkmeta",
+    serialize=pickle.dumps,
+    deserialize=pickle.loads,
+    ttl=SESSION_TTL,
+    max_local=STATE_LOCAL_CACHE_SIZE,
+    signing_key=STATE_SIGNING_KEY,
+)
+
+# Session bazlı hiyerarşik index'ler (FAISS store ile birlikte yazılır)
+_hierarchies = SharedObjectRegistry(
+    state_backend,
+    namespace="hierarchy",
+    serialize=pickle.dumps,
+    deserialize=pickle.loads,
+    ttl=SESSION_TTL,
+    max_local=STATE_LOCAL_CACHE_SIZE,
+    signing_key=STATE_SIGNING_KEY,
+)
+
+def _rebuilt(registry: SharedObjectRegistry, session_id: str, faiss_store: FAISS, build):
+    """Registry'de olmayan (süresi dolmuş / eski kayıt) türetilmiş nesneyi store'dan yeniden kur"""
+    obj = registry.get(session_id)
+    if obj is None:
+        obj = build(faiss_store)
+        # Bu arada yeni bir doküman eklendiyse onun nesnesini eskisiyle ezme
+        if _faiss_stores.get(session_id) is faiss_store:
+            registry.put(session_id, obj)
+    return obj
+
+
+def session_hierarchy(session_id: str, faiss_store: FAISS) -> HierarchicalIndex:
+    return _rebuilt(_hierarchies, session_id, faiss_store, HierarchicalIndex.from_faiss)
+
+
+def session_table(session_id: str, faiss_store: FAISS) -> ChunkMetadataTable:
+    return _rebuilt(_chunk_tables, session_id, faiss_store, ChunkMetadataTable.from_faiss)
+
 
 def load_document(file_path: str, file_type: str) -> List[str]:
     """Dosyayı yükle ve metin listesi döndür"""
@@ -260,6 +584,94 @@ def load_document(file_path: str, file_type: str) -> List[str]:
     
     return texts
 
+@traced("doc.load")
+def load_sections(file_path: str, file_type: str) -> List[str]:
+    """Dosyayı bölümlere ayırarak yükle (PDF: sayfa, DOCX: başlık altı, TXT: tek bölüm)"""
+    if file_type != "docx":
+        return load_document(file_path, file_type)
+    
+    doc = DocxDocument(file_path)
+    sections, current = [], []
+    for para in doc.paragraphs:
+        if not para.text.strip():
+            continue
+        # Her başlık yeni bir bölüm açar
+        if para.style is not None and para.style.name.lower().startswith(("heading", "başlık", "title")) and current:
+            sections.append("\n".join(current))
+            current = []
+        current.append(para.text)
+    if current:
+        sections.append("\n".join(current))
+    return sections
+
+
+class RAGFilters(BaseModel):
+    """Aramayı daraltan opsiyonel filtreler (vektör aramasından önce uygulanır)"""
+    doc_ids: Optional[List[str]] = None
+    file_names: Optional[List[str]] = None
+    page_from: Optional[int] = None
+    page_to: Optional[int] = None
+    sections: Optional[List[int]] = None
+
+
+class SourceRef(BaseModel):
+    """Yanıtta kullanılan chunk'ın kaynağı"""
+    doc_id: str
+    file_name: str
+    page: int
+    offset: int
+    excerpt: str
+
+
+def source_refs(docs) -> List[SourceRef]:
+    return [
+        SourceRef(
+            doc_id=doc.metadata.get("doc_id", ""),
+            file_name=doc.metadata.get("file_name", ""),
+            page=doc.metadata.get("page", 0),
+            offset=doc.metadata.get("offset", 0),
+            excerpt=doc.page_content[:100] + "..."
+        )
+        for doc in docs
+    ]
+
+# Hiyerarşik arama ayarları: bu chunk sayısının üstünde iki aşamalı arama kullanılır
+HIERARCHICAL_MIN_CHUNKS = int(os.getenv("HIERARCHICAL_MIN_CHUNKS", "200"))
+HIERARCHICAL_FAN_OUT = int(os.getenv("HIERARCHICAL_FAN_OUT", "4"))
+# Bir bölüm en fazla bu kadar chunk içerir (uzun TXT / sayfalar alt bölümlere ayrılır)
+SECTION_MAX_CHUNKS = int(os.getenv("SECTION_MAX_CHUNKS", "16"))
+
+@traced("rag.search")
+def search_documents(
+    faiss_store: FAISS,
+    query: str,
+    k: int = 3,
+    hierarchy: Optional[HierarchicalIndex] = None,
+    filters: Optional[RAGFilters] = None,
+    table: Optional[ChunkMetadataTable] = None,
+):
+    """Sorgu embedding'ini 'embeddings' upstream'i üzerinden alıp FAISS'te ara"""
+    if filters is not None:
+        # Tablo yoksa / store'un gerisinde kaldıysa yeniden kurulur: filtreler asla yok sayılmaz
+        if table is None or len(table) != faiss_store.index.ntotal:
+            table = ChunkMetadataTable.from_faiss(faiss_store)
+        rows = table.rows(**filters.model_dump())
+        if len(rows) < len(table):
+            # Filtre: sadece izin verilen satırlar arasında ara
+            query_vector = upstreams["embeddings"].call(lambda timeout: embeddings.embed_query(query))
+            return filtered_search(faiss_store, query_vector, rows, k=k)
+    
+    if hierarchy is None or len(hierarchy) < HIERARCHICAL_MIN_CHUNKS:
+        return upstreams["embeddings"].call(lambda timeout: faiss_store.similarity_search(query, k=k))
+    
+    # Büyük doküman: önce bölüm özetleri, sonra sadece en iyi bölümlerin chunk'ları
+    query_vector = upstreams["embeddings"].call(lambda timeout: embeddings.embed_query(query))
+    ids = hierarchy.search(query_vector, k=k, fan_out=HIERARCHICAL_FAN_OUT)
+    # Store'da olmayan id için docstore Document yerine "ID ... not found" metni döner: atla
+    docs = (faiss_store.docstore.search(doc_id) for doc_id in ids)
+    return [doc for doc in docs if not isinstance(doc, str)]
+
+
 def chunk_texts(texts: List[str], chunk_size: int = 500, chunk_overlap: int = 50) -> List[str]:
     """Metinleri chunk'lara böl"""
     splitter = RecursiveCharacterTextSplitter(
@@ -272,19 +684,122 @@ def chunk_texts(texts: List[str], chunk_size: int = 500, chunk_overlap: int = 50
     return chunks
 
 
+@traced("doc.split")
+def chunk_sections(
+    sections: List[str],
+    max_section_chunks: int = SECTION_MAX_CHUNKS,
+    first_section: int = 0,
+) -> Tuple[List[str], List[dict]]:
+    """
+    Bölümleri chunk'la.
+    
+    Returns:
+        (chunk'lar, her chunk için {"section", "page", "offset"} metadata'sı)
+        page: PDF'te sayfa, DOCX'te başlık bloğu numarası (1'den başlar)
+    """
+    chunks, metadatas = [], []
+    section = first_section
+    for page, text in enumerate(sections, start=1):
+        section_chunks = chunk_texts([text])
+        
+        # Chunk'ların bölüm içindeki karakter offset'leri
+        offsets, cursor = [], 0
+        for chunk in section_chunks:
+            found = text.find(chunk, cursor)
+            offset = found if found >= 0 else cursor
+            offsets.append(offset)
+            cursor = offset + 1
+        
+        # Çok uzun bölümler ardışık alt bölümlere ayrılır
+        for start in range(0, len(section_chunks), max_section_chunks):
+            for chunk, offset in zip(section_chunks[start:start + max_section_chunks], offsets[start:start + max_section_chunks]):
+                chunks.append(chunk)
+                metadatas.append({"section": section, "page": page, "offset": offset})
+            section += 1
+    return chunks, metadatas
+
+
+def embed_web_page_chunks(texts: List[str]) -> List[List[float]]:
+    """Web index'i doldurma: toplu öncelikle limiter + AIMD yolu; breaker kapalı değilse API'ye gidilmez"""
+    if upstreams["embeddings"].breaker.state != "closed":
+        raise CircuitOpenError("embeddings")
+    with request_priority(BULK):
+        return parallel_embedder.embed_documents(texts)
+
+
+# Çekilen web sayfalarından kalıcı, worker'lar arası paylaşılan bilgi index'i
+web_knowledge = (
+    WebKnowledgeIndex(
+        embeddings,
+        directory=os.getenv("WEB_INDEX_DIR", "web_index"),
+        chunker=chunk_texts,
+        max_age_seconds=float(os.getenv("WEB_INDEX_MAX_AGE_HOURS", "72")) * 3600,
+        min_score=float(os.getenv("WEB_INDEX_MIN_SCORE", "0.75")),
+        max_pages=int(os.getenv("WEB_INDEX_MAX_PAGES", "2000")),
+        embed_fn=embed_web_page_chunks,
+    )
+    if os.getenv("WEB_INDEX_ENABLED", "1") == "1"
+    else None
+)
+
+
+# RAG / web / hybrid prompt'larındaki bağlamı soruyla ilgili cümlelere indir
+CONTEXT_COMPRESSION = os.getenv("CONTEXT_COMPRESSION", "1") == "1"
+
+context_compressor = ContextCompressor(
+    # Cümle embedding'leri cache'lenir; sadece yeni cümleler 'embeddings' upstream'ine gider
+    embed_fn=(
+        (lambda texts: upstreams["embeddings"].call(lambda timeout: embeddings.embed_documents(texts)))
+        if os.getenv("COMPRESSION_SEMANTIC", "1") == "1"
+        else None
+    ),
+    # Bütçe bağlamın COMPRESSION_RATIO'su kadardır (en fazla COMPRESSION_TOKEN_BUDGET);
+    # COMPRESSION_MIN_TOKENS altındaki bağlam için embedding çağrısı yapılmaz
+    token_budget=int(os.getenv("COMPRESSION_TOKEN_BUDGET", "600")),
+    ratio=float(os.getenv("COMPRESSION_RATIO", "0.5")),
+    min_tokens=int(os.getenv("COMPRESSION_MIN_TOKENS", "150")),
+)
+
+
+def compress_passages(question: str, passages: List[Passage], token_budget: Optional[int] = None) -> List[Passage]:
+    if not CONTEXT_COMPRESSION:
+        return passages
+    with span("context.compress", passages=len(passages)):
+        return context_compressor.compress(question, passages, token_budget=token_budget)
+
+
+def compress_text(question: str, text: str, source: str = "") -> str:
+    """Tek bir sayfa / bağlam metnini sıkıştır"""
+    return "\n\n".join(p.text for p in compress_passages(question, [Passage(text, source, "web")]))
+
+
 class RAGUploadResponse(BaseModel):
     status: str
     chunks: int
     message: str
+    doc_id: str = ""
+
+
+def clone_faiss(store: FAISS) -> FAISS:
+    """Okuyucuları etkilemeden üzerine ekleme yapılabilecek bir kopya"""
+    return FAISS.deserialize_from_bytes(store.serialize_to_bytes(), embeddings, allow_dangerous_deserialization=True)
+
+
+SUPPORTED_EXTENSIONS = ["pdf", "txt", "docx"]
+
+
+def file_extension(file_name: str) -> str:
+    return file_name.split(".")[-1].lower()
 
 
 @app.post("/rag/upload", response_model=RAGUploadResponse)
-async def rag_upload(session_id: str, file: UploadFile = File(...)):
-    """Dosya yükle, chunk'la ve FAISS index'e ekle"""
+@traced("endpoint.rag_upload")
+def rag_upload(session_id: str, file: UploadFile = File(...)):
+    """Dosya yükle, chunk'la ve session'ın FAISS index'ine ekle (önceki dokümanlar korunur)"""
     try:
         # Dosya uzantısını al
-        file_ext = file.filename.split(".")[-1].lower()
-        if file_ext not in ["pdf", "txt", "docx"]:
+        file_ext = file_extension(file.filename)
+        if file_ext not in SUPPORTED_EXTENSIONS:
             return RAGUploadResponse(status="error", chunks=0, message="Desteklenmeyen dosya formatı!")
         
         # Geçici dosyaya kaydet
@@ -292,56 +807,277 @@ async def rag_upload(session_id: str, file: UploadFile = File(...)):
             shutil.copyfileobj(file.file, tmp)
             tmp_path = tmp.name
         
-        # Dosyayı yükle ve chunk'la
-        texts = load_document(tmp_path, file_ext)
-        chunks = chunk_texts(texts)
-        
-        # Geçici dosyayı sil
-        os.unlink(tmp_path)
-        
-        if not chunks:
-            return RAGUploadResponse(status="error", chunks=0, message="Dosyadan metin çıkarılamadı!")
-        
-        # FAISS index oluştur
-        faiss_store = FAISS.from_texts(chunks, embeddings)
-        _faiss_stores[session_id] = faiss_store
-        
-        return RAGUploadResponse(
-            status="success",
-            chunks=len(chunks),
-            message=f"✅ {file.filename} başarıyla yüklendi! {len(chunks)} chunk oluşturuldu."
-        )
+        try:
+            return ingest_document(session_id, tmp_path, file.filename)
+        finally:
+            # Geçici dosyayı sil
+            os.unlink(tmp_path)
         
+    except UpstreamBusyError:
+        raise
     except Exception as e:
         return RAGUploadResponse(status="error", chunks=0, message=f"Hata: {str(e)}")
 
 
+# Session başına yazma kilidi (kullanan kalmayınca silinir)
+_session_locks: Dict[str, Tuple[threading.Lock, int]] = {}
+_session_locks_guard = threading.Lock()
+
+
+@contextmanager
+def session_write_lock(session_id: str) -> Iterator[None]:
+    """Aynı session'ın index'lerini oku-klonla-yaz adımlarını bu worker içinde sıraya sokar"""
+    with _session_locks_guard:
+        lock, users = _session_locks.get(session_id, (None, 0))
+        lock = lock or threading.Lock()
+        _session_locks[session_id] = (lock, users + 1)
+    try:
+        with lock:
+            yield
+    finally:
+        with _session_locks_guard:
+            lock, users = _session_locks[session_id]
+            if users > 1:
+                _session_locks[session_id] = (lock, users - 1)
+            else:
+                del _session_locks[session_id]
+
+
+def ingest_document(
+    session_id: str,
+    path: str,
+    file_name: str,
+    known_vectors: Optional[Dict[str, List[float]]] = None,
+) -> RAGUploadResponse:
+    """Diskteki dosyayı chunk'la, embed et ve session'ın index'lerine ekle"""
+    # Aynı session'a eşzamanlı iki yükleme aynı store'u klonlayıp birbirinin dokümanını ezmesin
+    with session_write_lock(session_id):
+        return _ingest_document(session_id, path, file_name, known_vectors)
+
+
+def _ingest_document(
+    session_id: str,
+    path: str,
+    file_name: str,
+    known_vectors: Optional[Dict[str, List[float]]],
+) -> RAGUploadResponse:
+    file_ext = file_extension(file_name)
+    
+    # Session'ın mevcut index'leri (yeni doküman bunlara eklenir)
+    existing_store = _faiss_stores.get(session_id)
+    if existing_store is None:
+        hierarchy = HierarchicalIndex()
+    else:
+        # Hiyerarşi düşmüşse store'dan yeniden kurulur: sadece yeni dokümanı içeren index eski dokümanları gizlerdi
+        existing_hierarchy = _hierarchies.get(session_id)
+        hierarchy = (
+            copy.deepcopy(existing_hierarchy) if existing_hierarchy is not None
+            else HierarchicalIndex.from_faiss(existing_store)
+        )
+    
+    # Dosyayı bölümlere ayırarak yükle ve chunk'la
+    doc_id = uuid.uuid4().hex[:8]
+    sections = load_sections(path, file_ext)
+    chunks, metadatas = chunk_sections(sections, first_section=hierarchy.next_section)
+    for metadata in metadatas:
+        metadata.update(doc_id=doc_id, file_name=file_name)
+    section_ids = [metadata["section"] for metadata in metadatas]
+    
+    if not chunks:
+        return RAGUploadResponse(status="error", chunks=0, message="Dosyadan metin çıkarılamadı!")
+    
+    # FAISS index oluştur (batch'ler paralel embed edilip index'e akıtılır)
+    # Hiyerarşik index aynı batch'lerle artımlı kurulur
+    def on_batch(start: int, ids: List[str], vectors: List[List[float]]):
+        hierarchy.add(ids, vectors, section_ids[start:start + len(ids)])
+    
+    # Toplu yükleme interaktif chat isteklerinin arkasında bekler
+    with request_priority(BULK), span("doc.embed_index", chunks=len(chunks)):
+        faiss_store = parallel_embedder.embed_into_faiss(
+            chunks,
+            metadatas=metadatas,
+            on_batch=on_batch,
+            store=clone_faiss(existing_store) if existing_store is not None else None,
+            known_vectors=known_vectors
+        )
+    # Önce store yayınlanır: eski tablo / hiyerarşideki id'ler yeni store'da da vardır,
+    # tersi sırada okuyucu yeni hiyerarşinin id'lerini eski store'da arardı
+    _faiss_stores.put(session_id, faiss_store)
+    with span("doc.metadata_table"):
+        _chunk_tables.put(session_id, ChunkMetadataTable.from_faiss(faiss_store))
+    _hierarchies.put(session_id, hierarchy)
+    
+    return RAGUploadResponse(
+        status="success",
+        chunks=len(chunks),
+        message=f"✅ {file_name} başarıyla yüklendi! {len(chunks)} chunk oluşturuldu.",
+        doc_id=doc_id
+    )
+
+
+# Parça parça yükleme: init -> PUT parça(lar) -> finalize
+# Bağlantı koparsa istemci GET ile alınan offset'i öğrenip devam eder
+upload_store = ChunkedUploadStore(
+    os.getenv("UPLOAD_DIR", "uploads"),
+    max_size=int(os.getenv("UPLOAD_MAX_MB", "200")) * 1024 * 1024,
+    ttl_seconds=float(os.getenv("UPLOAD_TTL_HOURS", "24")) * 3600,
+)
+UPLOAD_PART_SIZE = int(os.getenv("UPLOAD_PART_SIZE", str(4 * 1024 * 1024)))
+
+# TXT yüklemelerinde tamamlanan paragraflar yükleme sürerken embed edilir (bu worker'da)
+EARLY_EMBEDDING = os.getenv("UPLOAD_EARLY_EMBEDDING", "1") == "1"
+_prefetched_vectors: Dict[str, Dict[str, List[float]]] = {}
+# Yükleme başına süren prefetch işleri: finalize bunları bekler (aynı chunk iki kez embed edilmez)
+_prefetch_futures: Dict[str, List[Future]] = {}
+_prefetch_lock = threading.Lock()
+prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="upload-prefetch")
+
+
+def prefetch_embeddings(upload_id: str, chunks: List[str]) -> None:
+    """Chunk'ları arka planda embed et; finalize'da aynı chunk'lar için API çağrılmaz"""
+    def run():
+        try:
+            # Toplu iş: interaktif 'embeddings' upstream'i (hedge / breaker) yerine batch'li,
+            # AIMD kontrollü ingestion yolu; limiter kuyruğunda chat isteklerinin arkasında bekler
+            with request_priority(BULK), span("upload.prefetch", chunks=len(chunks)):
+                vectors = parallel_embedder.embed_documents(chunks)
+            with _prefetch_lock:
+                _prefetched_vectors.setdefault(upload_id, {}).update(zip(chunks, vectors))
+        except Exception as e:
+            # Önemli değil: finalize'da eksik chunk'lar yeniden embed edilir
+            print(f"Upload prefetch error: {e}")
+    
+    # İsteğin context'i (profil / trace) arka plan thread'ine taşınır
+    future = prefetch_executor.submit(contextvars.copy_context().run, run)
+    with _prefetch_lock:
+        _prefetch_futures.setdefault(upload_id, []).append(future)
+
+
+def wait_for_prefetch(upload_id: str) -> Optional[Dict[str, List[float]]]:
+    """Yüklemenin süren prefetch işlerini (en fazla isteğin kalan süresi kadar) bekle, vektörleri döndür"""
+    with _prefetch_lock:
+        futures = _prefetch_futures.pop(upload_id, [])
+    if futures:
+        with span("upload.prefetch_wait", jobs=len(futures)):
+            wait(futures, timeout=remaining())
+    with _prefetch_lock:
+        return _prefetched_vectors.get(upload_id)
+
+
+class UploadInitRequest(BaseModel):
+    session_id: str
+    file_name: str
+    total_size: int
+
+
+class UploadStatusResponse(BaseModel):
+    upload_id: str
+    file_name: str
+    total_size: int
+    received: int
+    part_size: int = UPLOAD_PART_SIZE
+
+
+def upload_status_response(meta: dict) -> UploadStatusResponse:
+    return UploadStatusResponse(
+        upload_id=meta["upload_id"],
+        file_name=meta["file_name"],
+        total_size=meta["total_size"],
+        received=meta["received"]
+    )
+
+
+@app.post("/rag/upload/init", response_model=UploadStatusResponse)
+def rag_upload_init(request: UploadInitRequest):
+    """Parçalı yükleme başlat"""
+    if file_extension(request.file_name) not in SUPPORTED_EXTENSIONS:
+        raise UploadError("Desteklenmeyen dosya formatı!")
+    
+    # Terk edilmiş yüklemelerin önceden hesaplanmış vektörlerini bırak
+    with _prefetch_lock:
+        for upload_id in [u for u in _prefetched_vectors if not upload_store.exists(u)]:
+            del _prefetched_vectors[upload_id]
+            _prefetch_futures.pop(upload_id, None)
+    return upload_status_response(upload_store.init(request.session_id, request.file_name, request.total_size))
+
+
+@app.get("/rag/upload/{upload_id}", response_model=UploadStatusResponse)
+def rag_upload_status(upload_id: str):
+    """Sunucuya ulaşan bayt sayısı (devam etmek için)"""
+    return upload_status_response(upload_store.status(upload_id))
+
+
+@app.put("/rag/upload/{upload_id}", response_model=UploadStatusResponse)
+@traced("endpoint.rag_upload_part")
+def rag_upload_part(upload_id: str, offset: int, part: UploadFile = File(...)):
+    """Parçayı `offset`'ten itibaren diske akıt (offset uyuşmazsa 409 + received)"""
+    meta = upload_store.append(upload_id, offset, part.file)
+    
+    # Son parçada istemci hemen finalize çağırır: kalan metni ingest_document embed eder
+    complete = meta["received"] == meta["total_size"]
+    if EARLY_EMBEDDING and not complete and file_extension(meta["file_name"]) == "txt":
+        text = upload_store.take_complete_text(upload_id)
+        if text.strip():
+            prefetch_embeddings(upload_id, chunk_texts([text]))
+    
+    return upload_status_response(meta)
+
+
+@app.post("/rag/upload/{upload_id}/finalize", response_model=RAGUploadResponse)
+@traced("endpoint.rag_upload_finalize")
+def rag_upload_finalize(upload_id: str):
+    """Tüm parçalar geldiyse dokümanı işle ve session'ın index'ine ekle"""
+    meta = upload_store.finalize(upload_id)
+    known_vectors = wait_for_prefetch(upload_id)
+    try:
+        response = ingest_document(meta["session_id"], meta["path"], meta["file_name"], known_vectors=known_vectors)
+    except UpstreamBusyError:
+        # Dosya silinmez, istemci Retry-After sonrası finalize'ı tekrarlar
+        upload_store.reopen(upload_id)
+        raise
+    except Exception as e:
+        response = RAGUploadResponse(status="error", chunks=0, message=f"Hata: {str(e)}")
+    
+    upload_store.discard(upload_id)
+    with _prefetch_lock:
+        _prefetched_vectors.pop(upload_id, None)
+        _prefetch_futures.pop(upload_id, None)
+    return response
+
+
 class RAGQueryRequest(BaseModel):
     session_id: str
     message: str
+    filters: Optional[RAGFilters] = None  # doküman / sayfa / bölüm kapsamı
 
 
 class RAGQueryResponse(BaseModel):
     answer: str
     sources: List[str]
+    source_refs: List[SourceRef] = []
 
 
 @app.post("/rag/query", response_model=RAGQueryResponse)
-async def rag_query(request: RAGQueryRequest):
+@traced("endpoint.rag_query")
+def rag_query(request: RAGQueryRequest):
     """Soru sor, ilgili chunk'ları bul ve LLM ile cevapla"""
     session_id = request.session_id
     
     # FAISS index var mı kontrol et
-    if session_id not in _faiss_stores:
+    faiss_store = _faiss_stores.get(session_id)
+    if faiss_store is None:
         return RAGQueryResponse(
             answer="⚠️ Önce bir dosya yüklemeniz gerekiyor!",
             sources=[]
         )
     
-    faiss_store = _faiss_stores[session_id]
-    
     # Benzer chunk'ları bul (top 3)
-    docs = faiss_store.similarity_search(request.message, k=3)
+    docs = search_documents(
+        faiss_store, request.message, k=3,
+        hierarchy=session_hierarchy(session_id, faiss_store),
+        filters=request.filters,
+        table=session_table(session_id, faiss_store) if request.filters else None
+    )
     
     if not docs:
         return RAGQueryResponse(
@@ -349,8 +1085,8 @@ async def rag_query(request: RAGQueryRequest):
             sources=[]
         )
     
-    # Context oluştur
-    context = "\n\n".join([doc.page_content for doc in docs])
+    # Context oluştur (soruyla ilgili cümlelere sıkıştırılmış)
+    context = "\n\n".join(p.text for p in compress_passages(request.message, doc_passages(docs)))
     
     # RAG prompt
     rag_prompt = f"""Aşağıdaki bağlam bilgisini kullanarak kullanıcının sorusunu yanıtla.
@@ -364,11 +1100,12 @@ SORU: {request.message}
 CEVAP:"""
     
     # LLM ile cevapla
-    result = llm.invoke(rag_prompt)
+    result = invoke_llm(rag_prompt)
     
     return RAGQueryResponse(
         answer=result.content,
-        sources=[doc.page_content[:100] + "..." for doc in docs]
+        sources=[doc.page_content[:100] + "..." for doc in docs],
+        source_refs=source_refs(docs)
     )
 
 
@@ -376,14 +1113,56 @@ CEVAP:"""
 # 8) Smart Chat (Semantic Router)
 # ---------------------------
 
-# Router instance
-semantic_router = SemanticRouter(llm)
+# Router instance (LLM hatasında / breaker açıkken "chat"e düşer)
+semantic_router = SemanticRouter(GuardedLLM())
+
+# Optimistic routing: tek LLM çağrısı hem yönlendirir hem chat mesajlarını yanıtlar;
+# sadece web_search/rag mesajları ikinci bir çağrıya ihtiyaç duyar
+OPTIMISTIC_ROUTING = os.getenv("OPTIMISTIC_ROUTING", "1") == "1"
+
+# Router çalışırken olası retrieval'ı (FAISS / SerpAPI) paralel başlatır
+speculative_retriever = SpeculativeRetriever(
+    max_in_flight=int(os.getenv("SPECULATION_MAX_IN_FLIGHT", "8")),
+    enabled=os.getenv("SPECULATIVE_RETRIEVAL", "1") == "1",
+)
+
+
+# Hybrid modda RAG ve web retrieval'ı paralel çalıştırır
+retrieval_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="retrieval")
+
+# Hybrid prompt'a girecek birleşik bağlamın token bütçesi
+HYBRID_CONTEXT_TOKENS = int(os.getenv("HYBRID_CONTEXT_TOKENS", "1500"))
+
+
+def submit_retrieval(fn):
+    """fn'i istek context'iyle (deadline, öncelik) arka planda başlat"""
+    return retrieval_executor.submit(contextvars.copy_context().run, fn)
+
+
+def doc_passages(docs) -> List[Passage]:
+    return [Passage(doc.page_content, doc.metadata.get("file_name") or "Doküman", "doc") for doc in docs]
+
+
+def web_passages(search_result: Optional[dict], content: str) -> List[Passage]:
+    if not search_result:
+        return []
+    title, url = search_result["title"], search_result["url"]
+    if not content:
+        return [Passage(search_result["snippet"], title, "web", url=url)]
+    return [Passage(chunk, title, "web", url=url) for chunk in chunk_texts([content])]
+
+
+@app.get("/metrics/speculation")
+def speculation_metrics():
+    """Spekülatif retrieval hit oranı ve kazanılan gecikme"""
+    return speculative_retriever.metrics.snapshot()
 
 
 class SmartChatRequest(BaseModel):
     session_id: str
     message: str
-    force_mode: Optional[str] = None  # "chat", "web_search", "rag" veya None (otomatik)
+    force_mode: Optional[str] = None  # "chat", "web_search", "rag", "hybrid" veya None (otomatik)
+    filters: Optional[RAGFilters] = None  # rag / hybrid aramasının doküman / sayfa kapsamı
 
 
 class SmartChatResponse(BaseModel):
@@ -391,10 +1170,12 @@ class SmartChatResponse(BaseModel):
     mode_used: str
     mode_explanation: str
     sources: List[str] = []
+    source_refs: List[SourceRef] = []
 
 
 @app.post("/smart_chat", response_model=SmartChatResponse)
-async def smart_chat(request: SmartChatRequest):
+@traced("endpoint.smart_chat")
+def smart_chat(request: SmartChatRequest):
     """
     Akıllı chat endpoint - mesajı analiz edip doğru moda yönlendirir.
     
@@ -405,22 +1186,60 @@ async def smart_chat(request: SmartChatRequest):
     message = request.message
     
     # Doküman yüklü mü kontrol et
-    has_document = session_id in _faiss_stores
+    faiss_store = _faiss_stores.get(session_id)
+    hierarchy = session_hierarchy(session_id, faiss_store) if faiss_store is not None else None
+    table = session_table(session_id, faiss_store) if faiss_store is not None and request.filters else None
+    has_document = faiss_store is not None
+    
+    def retrieve_docs():
+        return search_documents(
+            faiss_store, message, k=3, hierarchy=hierarchy, filters=request.filters, table=table
+        )
     
     # Mod belirleme
-    if request.force_mode and request.force_mode in ["chat", "web_search", "rag"]:
+    direct_answer = None
+    speculation = None
+    if request.force_mode and request.force_mode in ["chat", "web_search", "rag", "hybrid"]:
         mode = request.force_mode
     else:
-        mode = semantic_router.route(message, has_document=has_document)
+        # Router karar verirken muhtemel retrieval'ı paralel başlat
+        predicted = predict_mode(message, has_document=has_document)
+        if predicted == "rag":
+            speculation = speculative_retriever.start("rag", retrieve_docs)
+        elif predicted == "web_search":
+            speculation = speculative_retriever.start("web_search", lambda: retrieve_web(message))
+        
+        if OPTIMISTIC_ROUTING:
+            history = get_history(session_id)
+            mode, direct_answer = semantic_router.route_or_answer(
+                message, history.messages, system_prompt, has_document=has_document
+            )
+            if direct_answer:
+                # chatbot.invoke'un yapacağı gibi history'ye ekle
+                history.add_messages([HumanMessage(content=message), AIMessage(content=direct_answer)])
+        else:
+            mode = semantic_router.route(message, has_document=has_document)
+    
+    # Doküman yoksa hybrid sadece web aramasıdır
+    if mode == "hybrid" and not has_document:
+        mode = "web_search"
+    
+    # Spekülasyon doğru moda aitse sonucu kullanılır, değilse iptal edilir
+    needed_retrievals = ("rag", "web_search") if mode == "hybrid" else (mode,)
+    speculative_result = speculative_retriever.resolve(speculation, needed_retrievals)
     
     mode_explanation = semantic_router.get_route_explanation(mode)
     
     # Moda göre yönlendir
-    if mode == "chat":
-        result = chatbot.invoke(
-            {"input": message},
-            config={"configurable": {"session_id": session_id}}
+    if mode == "chat" and direct_answer:
+        return SmartChatResponse(
+            answer=direct_answer,
+            mode_used=mode,
+            mode_explanation=mode_explanation
         )
+    
+    if mode == "chat":
+        result = invoke_chatbot(message, session_id)
         return SmartChatResponse(
             answer=result.content,
             mode_used=mode,
@@ -429,33 +1248,39 @@ async def smart_chat(request: SmartChatRequest):
     
     elif mode == "web_search":
         # Web search logic
-        search_result = serpapi_search(message)
+        search_result, content = speculative_result.result() if speculative_result else retrieve_web(message)
         
         if not search_result:
+            # Arama yok / SerpAPI breaker açık -> chat moduna düş
+            result = invoke_chatbot(message, session_id)
             return SmartChatResponse(
-                answer="❌ Web araması sonuç bulunamadı. Normal yanıt veriyorum.",
+                answer=result.content,
                 mode_used="chat",
                 mode_explanation="💬 Web araması başarısız, asistan yanıtlıyor"
             )
         
-        content = fetch_url_content(search_result["url"])
+        snippet_answer = f"🌐 **{search_result['title']}**\n\n{search_result['snippet']}\n\n🔗 {search_result['url']}"
         
         if not content:
-            answer = f"🌐 **{search_result['title']}**\n\n{search_result['snippet']}\n\n🔗 {search_result['url']}"
+            answer = snippet_answer
         else:
             web_prompt = f"""Aşağıdaki web sayfası içeriğine dayanarak kullanıcının sorusunu yanıtla.
 Yanıtı Türkçe ve akıcı bir dille oluştur. Kaynak bilgisini de belirt.
 
 WEB SAYFASI İÇERİĞİ:
-{content}
+{compress_text(message, content, search_result['title'])}
 
 KULLANICI SORUSU: {message}
 
 KAYNAK: {search_result['url']}
 
 YANIT:"""
-            result = llm.invoke(web_prompt)
-            answer = f"{result.content}\n\n📚 **Kaynak:** [{search_result['title']}]({search_result['url']})"
+            try:
+                result = invoke_llm(web_prompt)
+                answer = f"{result.content}\n\n📚 **Kaynak:** [{search_result['title']}]({search_result['url']})"
+            except (CircuitOpenError, DeadlineExceeded):
+                # LLM yavaş/devre dışı -> sadece snippet
+                answer = snippet_answer
         
         return SmartChatResponse(
             answer=answer,
@@ -473,8 +1298,7 @@ YANIT:"""
                 mode_explanation="📄 Doküman bulunamadı"
             )
         
-        faiss_store = _faiss_stores[session_id]
-        docs = faiss_store.similarity_search(message, k=3)
+        docs = speculative_result.result() if speculative_result else retrieve_docs()
         
         if not docs:
             return SmartChatResponse(
@@ -483,7 +1307,7 @@ YANIT:"""
                 mode_explanation=mode_explanation
             )
         
-        context = "\n\n".join([doc.page_content for doc in docs])
+        context = "\n\n".join(p.text for p in compress_passages(message, doc_passages(docs)))
         
         rag_prompt = f"""Aşağıdaki bağlam bilgisini kullanarak kullanıcının sorusunu yanıtla.
 Yanıtı sadece verilen bağlama dayandır. Bağlamda bilgi yoksa "Bu bilgi dokümanda bulunamadı" de.
@@ -495,13 +1319,96 @@ SORU: {message}
 
 CEVAP:"""
         
-        result = llm.invoke(rag_prompt)
+        try:
+            answer = invoke_llm(rag_prompt).content
+        except (CircuitOpenError, DeadlineExceeded):
+            # LLM yavaş/devre dışı -> ilgili bölümleri doğrudan göster
+            answer = "⚠️ Asistan şu an yanıt üretemiyor, dokümandaki ilgili bölümler:\n\n" + "\n\n---\n\n".join(
+                doc.page_content for doc in docs
+            )
         
         return SmartChatResponse(
-            answer=result.content,
+            answer=answer,
+            mode_used=mode,
+            mode_explanation=mode_explanation,
+            sources=[doc.page_content[:100] + "..." for doc in docs],
+            source_refs=source_refs(docs)
+        )
+    
+    elif mode == "hybrid":
+        # RAG ve web retrieval paralel: gecikme max(rag, web) + üretim
+        futures = {"rag": None, "web_search": None}
+        if speculative_result:
+            futures[speculation.mode] = speculative_result
+        if futures["rag"] is None:
+            futures["rag"] = submit_retrieval(retrieve_docs)
+        if futures["web_search"] is None:
+            futures["web_search"] = submit_retrieval(lambda: retrieve_web(message))
+        
+        # Bir taraf hata verirse (breaker açık, deadline, fetch hatası) diğerinin bağlamıyla devam edilir
+        errors = {}
+        
+        def side_result(name, empty):
+            try:
+                return futures[name].result()
+            except Exception as e:
+                print(f"Hybrid {name} retrieval error: {e}")
+                errors[name] = e
+                return empty
+        
+        docs = side_result("rag", [])
+        search_result, content = side_result("web_search", (None, ""))
+        if len(errors) == len(futures):
+            # İki taraf da başarısız: ilgili handler (429 / 503 / 504) yanıt versin
+            raise errors["rag"]
+        if "rag" in errors:
+            mode_explanation = "🔀 Doküman araması başarısız, sadece web kullanıldı"
+        elif "web_search" in errors:
+            mode_explanation = "🔀 Web araması başarısız, sadece doküman kullanıldı"
+        
+        passages = fuse_passages(
+            [doc_passages(docs), web_passages(search_result, content)],
+            token_budget=HYBRID_CONTEXT_TOKENS
+        )
+        used_docs = {p.text for p in passages if p.kind == "doc"}
+        # [D1] / [W1] etiketleri sıkıştırmada korunur
+        passages = compress_passages(message, passages)
+        
+        if not passages:
+            return SmartChatResponse(
+                answer="❌ Dokümanda ve web'de ilgili bilgi bulunamadı.",
+                mode_used=mode,
+                mode_explanation=mode_explanation
+            )
+        
+        hybrid_prompt = f"""Aşağıdaki bağlam, kullanıcının yüklediği dokümandan [D] ve web'den [W] alınmış parçalardan oluşuyor.
+Kullanıcının sorusunu bu bağlama dayanarak Türkçe yanıtla. Doküman ile web kaynaklarını karşılaştır,
+her bilginin sonunda kaynağını köşeli parantez içinde etiketiyle belirt (ör. [D1], [W2]).
+Bağlamda bilgi yoksa bunu açıkça söyle.
+
+BAĞLAM:
+{format_passages(passages)}
+
+SORU: {message}
+
+CEVAP:"""
+        
+        try:
+            answer = invoke_llm(hybrid_prompt).content
+        except (CircuitOpenError, DeadlineExceeded):
+            answer = "⚠️ Asistan şu an yanıt üretemiyor, bulunan ilgili bölümler:\n\n" + format_passages(passages)
+        
+        sources = [p.text[:100] + "..." for p in passages if p.kind == "doc"]
+        sources += list(dict.fromkeys(p.url for p in passages if p.kind == "web"))
+        if search_result and any(p.kind == "web" for p in passages):
+            answer += f"\n\n📚 **Kaynak:** [{search_result['title']}]({search_result['url']})"
+        
+        return SmartChatResponse(
+            answer=answer,
             mode_used=mode,
             mode_explanation=mode_explanation,
-            sources=[doc.page_content[:100] + "..." for doc in docs]
+            sources=sources,
+            source_refs=source_refs([doc for doc in docs if doc.page_content in used_docs])
         )
     
     # Fallback
@@ -0,0 +1,279 @@
+"""
+Request Profiling - İstek bazlı, isteğe bağlı örnekleme profili + span ağacı
+
+- Sadece seçilen isteklerde çalışır: admin başlığı (X-Profile) veya örnekleme oranı
+- span() ile işaretlenen bölümler (HTML parse, PDF okuma, split, FAISS, upstream çağrıları)
+  süreleriyle bir ağaç olarak kaydedilir; context ile executor thread'lerine de taşınır
+- Profil açıkken, isteğin span'ı açık olan thread'lerinin stack'leri arka planda
+  sabit aralıklarla örneklenir
+- İstek bitince PROFILE_DIR altına yazılır:
+  <id>.folded     -> flamegraph.pl / speedscope uyumlu "stack;stack;... sayı" satırları
+  <id>.trace.json -> span ağacı + Chrome / Perfetto trace event'leri
+- Profil kapalıyken maliyet: span() başına tek bir ContextVar okuması
+"""
+
+import contextvars
+import functools
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("profile_trace", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("profile_span", default=None)
+
+
+class Span:
+    """Ağaçtaki tek bir zamanlanmış bölüm"""
+
+    __slots__ = ("name", "attrs", "start", "end", "thread", "children")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.thread = threading.current_thread().name
+        self.children: List["Span"] = []
+
+    def to_dict(self, origin: float) -> dict:
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(((self.end or time.perf_counter()) - self.start) * 1000, 3),
+            "thread": self.thread,
+            "attrs": self.attrs,
+            "children": [child.to_dict(origin) for child in self.children],
+        }
+
+
+class Trace:
+    """Profillenen tek bir isteğin span'ları ve stack örnekleri"""
+
+    def __init__(self, name: str):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.root = Span(name, {})
+        self.samples: Counter = Counter()
+        self._lock = threading.Lock()
+        self._thread_depth: Dict[int, int] = {}
+
+    def enter_thread(self) -> None:
+        ident = threading.get_ident()
+        with self._lock:
+            self._thread_depth[ident] = self._thread_depth.get(ident, 0) + 1
+
+    def exit_thread(self) -> None:
+        ident = threading.get_ident()
+        with self._lock:
+            depth = self._thread_depth.get(ident, 0) - 1
+            if depth > 0:
+                self._thread_depth[ident] = depth
+            else:
+                self._thread_depth.pop(ident, None)
+
+    def active_threads(self) -> List[int]:
+        with self._lock:
+            return list(self._thread_depth)
+
+    def add_sample(self, stack: str) -> None:
+        with self._lock:
+            self.samples[stack] += 1
+
+    def folded_samples(self) -> List[tuple]:
+        with self._lock:
+            return self.samples.most_common()
+
+    def add_child(self, parent: Span, child: Span) -> None:
+        with self._lock:
+            parent.children.append(child)
+
+    def to_dict(self) -> dict:
+        origin = self.root.start
+        events = []
+
+        def walk(span: Span) -> None:
+            events.append({
+                "name": span.name,
+                "ph": "X",
+                "ts": round((span.start - origin) * 1e6),
+                "dur": round(((span.end or span.start) - span.start) * 1e6),
+                "pid": os.getpid(),
+                "tid": span.thread,
+                "args": span.attrs,
+            })
+            for child in span.children:
+                walk(child)
+
+        walk(self.root)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "duration_ms": round(((self.root.end or time.perf_counter()) - origin) * 1000, 3),
+            "spans": self.root.to_dict(origin),
+            "traceEvents": events,
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _ActiveSpan:
+    __slots__ = ("trace", "span", "token")
+
+    def __init__(self, trace: Trace, name: str, attrs: Dict[str, Any]):
+        self.trace = trace
+        self.span = Span(name, attrs)
+
+    def __enter__(self) -> None:
+        self.trace.add_child(_current_span.get() or self.trace.root, self.span)
+        self.token = _current_span.set(self.span)
+        self.trace.enter_thread()
+
+    def __exit__(self, *exc) -> bool:
+        self.span.end = time.perf_counter()
+        self.trace.exit_thread()
+        _current_span.reset(self.token)
+        return False
+
+
+def span(name: str, **attrs: Any):
+    """Profillenen istekte bir bölümü zamanla (profil yoksa paylaşılan no-op döner)"""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return _ActiveSpan(trace, name, attrs)
+
+
+def traced(name: str):
+    """Fonksiyonu span(name) içinde çalıştıran dekoratör"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _fold(frame, thread_name: str) -> str:
+    """Frame zincirini kökten yaprağa "a;b;c" biçimine çevir"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})".replace(";", ":"))
+        frame = frame.f_back
+    names.append(thread_name.replace(";", ":"))
+    return ";".join(reversed(names))
+
+
+class _Sampler:
+    """Aktif trace'lerin thread'lerini örnekleyen tek arka plan thread'i"""
+
+    def __init__(self):
+        self._traces: Dict[str, Trace] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.interval = 0.005
+
+    def add(self, trace: Trace) -> None:
+        with self._lock:
+            self._traces[trace.trace_id] = trace
+            if self._thread is None:
+                # Sadece profillenen istek varken çalışır
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+
+    def remove(self, trace: Trace) -> None:
+        with self._lock:
+            self._traces.pop(trace.trace_id, None)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                traces = list(self._traces.values())
+                if not traces:
+                    self._thread = None
+                    return
+
+            frames = sys._current_frames()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for trace in traces:
+                for ident in trace.active_threads():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        trace.add_sample(_fold(frame, names.get(ident, str(ident))))
+            del frames
+            time.sleep(self.interval)
+
+
+_sampler = _Sampler()
+
+
+class RequestProfiler:
+    """Hangi isteklerin profilleneceğine karar verir ve sonuçları diske yazar"""
+
+    def __init__(
+        self,
+        directory: str = "profiles",
+        admin_token: Optional[str] = None,
+        sample_rate: float = 0.0,
+        interval_ms: float = 5.0,
+    ):
+        self.directory = Path(directory)
+        self.admin_token = admin_token
+        self.sample_rate = sample_rate
+        _sampler.interval = interval_ms / 1000
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.admin_token) or self.sample_rate > 0
+
+    def should_profile(self, header_value: Optional[str]) -> bool:
+        if self.admin_token and header_value == self.admin_token:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @contextmanager
+    def profile(self, name: str) -> Iterator[Trace]:
+        """İsteği trace + örnekleme profili altında çalıştır, bitince dosyalara yaz"""
+        trace = Trace(name)
+        token = _current_trace.set(trace)
+        _sampler.add(trace)
+        try:
+            yield trace
+        finally:
+            trace.root.end = time.perf_counter()
+            _sampler.remove(trace)
+            _current_trace.reset(token)
+            self._write(trace)
+
+    def _write(self, trace: Trace) -> None:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / f"{trace.trace_id}.folded", "w", encoding="utf-8") as folded:
+                for stack, count in trace.folded_samples():
+                    folded.write(f"{stack} {count}\n")
+            (self.directory / f"{trace.trace_id}.trace.json").write_text(
+                json.dumps(trace.to_dict(), ensure_ascii=False, default=str), encoding="utf-8"
+            )
+        except OSError as e:
+            print(f"Profile write error: {e}")
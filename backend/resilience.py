@@ -0,0 +1,301 @@
+"""
+Resilience - Deadline yayılımı, hedged retry ve circuit breaker
+
+- Her istek için bir deadline tutulur; upstream çağrıları kalan süreyi timeout olarak kullanır
+- Yavaş bir çağrı p95 gecikmesini aşarsa (veya hızlıca hata verirse) ikinci (hedged) bir deneme
+  başlatılır, ilk başarılı olan kazanır
+- Hata oranı eşiği aşan upstream için circuit breaker açılır ve çağrılar anında reddedilir
+- Sadece upstream'in kendi timeout'u dolarsa veya denemeler hata verirse breaker'a hata yazılır;
+  isteğin (istemcinin) kısa deadline'ı yüzünden kesilen çağrı upstream sağlığını yansıtmaz
+- fn(timeout) kalan süreyi istemci kütüphanesine vermeli: timeout'a uğrayan deneme gerçekten
+  durur, limiter slot'unu ve executor thread'ini çağrı bitene kadar tutar
+- Limiter'ın boş slot'u yoksa hedge başlatılmaz; limiter'ın reddettiği hedge sadece o denemeyi
+  düşürür. Gecikme slot alındıktan sonra ölçülür (kuyruk beklemesi p95'e girmez)
+"""
+
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Callable, Deque, Iterator, List, Optional, Tuple, Type, TypeVar
+
+try:
+    from .profiling import span
+except (ImportError, ValueError):
+    from profiling import span
+
+T = TypeVar("T")
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+# Upstream denemeleri bu havuzda çalışır (timeout'a uğrayan çağrı arka planda biter)
+_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="upstream")
+
+
+class DeadlineExceeded(Exception):
+    """İsteğin zaman bütçesi doldu"""
+
+
+class CircuitOpenError(Exception):
+    """Upstream'in circuit breaker'ı açık - çağrı yapılmadan reddedildi"""
+
+    def __init__(self, upstream: str):
+        super().__init__(f"{upstream} geçici olarak devre dışı (circuit open)")
+        self.upstream = upstream
+
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[None]:
+    """Bu blok için deadline belirler (dıştaki deadline daha erkense o korunur)"""
+    new_deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(min(current, new_deadline) if current is not None else new_deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Deadline'a kalan saniye (deadline yoksa None)"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def time_left(cap: float) -> float:
+    """min(cap, kalan süre); süre bittiyse DeadlineExceeded"""
+    left = remaining()
+    if left is None:
+        return cap
+    if left <= 0:
+        raise DeadlineExceeded("İstek için ayrılan süre doldu")
+    return min(cap, left)
+
+
+class LatencyTracker:
+    """Son N başarılı çağrının gecikmesinden yüzdelik hesaplar"""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    """Kayan pencerede hata oranına bakan closed / open / half-open breaker"""
+
+    def __init__(self, error_threshold: float = 0.5, min_calls: int = 10, window: float = 30.0, cooldown: float = 15.0):
+        self.error_threshold = error_threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self._events: Deque[Tuple[float, bool]] = deque()
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            # Cooldown sonrası tek bir deneme (probe) çağrısına izin ver
+            if time.monotonic() - self._opened_at >= self.cooldown and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def abandon(self) -> None:
+        """Sonucu ölçülemeyen probe çağrısını serbest bırak"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record(self, ok: bool) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self._opened_at is not None:
+                if self._probe_in_flight:
+                    self._probe_in_flight = False
+                    if ok:
+                        self._opened_at = None
+                        self._events.clear()
+                    else:
+                        self._opened_at = now
+                return
+
+            self._events.append((now, ok))
+            while self._events and now - self._events[0][0] > self.window:
+                self._events.popleft()
+
+            failures = sum(1 for _, success in self._events if not success)
+            if len(self._events) >= self.min_calls and failures / len(self._events) >= self.error_threshold:
+                self._opened_at = now
+
+
+class Upstream:
+    """Deadline, hedging, breaker ve (opsiyonel) admission limiter'ı birleştiren upstream sarmalayıcı"""
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float,
+        hedge: bool = True,
+        hedge_percentile: float = 0.95,
+        min_hedge_delay: float = 0.05,
+        limiter=None,
+        breaker: Optional[CircuitBreaker] = None,
+        ignore_errors: Tuple[Type[BaseException], ...] = (),
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.limiter = limiter
+        self.breaker = breaker or CircuitBreaker()
+        # Bu hatalar (ör. admission reddi) upstream sağlığını yansıtmaz: breaker'a sayılmadan yukarı çıkar
+        self.ignore_errors = ignore_errors
+        self.latency = LatencyTracker()
+
+    def _attempt(self, fn: Callable[[float], T], budget: float) -> Tuple[T, float]:
+        """(sonuç, gecikme) döndürür; gecikme limiter slot'u alındıktan sonra ölçülür"""
+        started = time.monotonic()
+        timeout = budget
+        try:
+            with span(f"upstream.{self.name}"):
+                if self.limiter is None:
+                    return fn(timeout), time.monotonic() - started
+                with self.limiter.slot(timeout=min(budget, self.limiter.max_wait)):
+                    # Kuyrukta beklenen süre bütçeden düşülür ama gecikmeye sayılmaz
+                    timeout = budget - (time.monotonic() - started)
+                    if timeout <= 0:
+                        raise DeadlineExceeded(f"{self.name} denemesi limiter kuyruğunda süresini doldurdu")
+                    timeout = time_left(timeout)
+                    started = time.monotonic()
+                    return fn(timeout), time.monotonic() - started
+        except self.ignore_errors:
+            raise
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            # Bütçesini dolduran denemenin hatası (istemci timeout'u) upstream hatası değil, süre aşımıdır
+            if time.monotonic() - started >= timeout * 0.9:
+                raise DeadlineExceeded(f"{self.name} denemesi {timeout:.1f} sn içinde tamamlanmadı") from e
+            raise
+
+    def _has_free_slot(self) -> bool:
+        if self.limiter is None:
+            return True
+        stats = self.limiter.stats()
+        return stats["active"] < stats["max_concurrency"] and not stats["queued"]
+
+    def call(self, fn: Callable[[float], T], hedge: Optional[bool] = None) -> T:
+        """
+        fn(timeout) çağrısını koruma altında yap.
+
+        Args:
+            fn: Deneme başına timeout (saniye) alan çağrı
+            hedge: Bu çağrı için hedging (yan etkili çağrılarda False verilmeli)
+        """
+        budget = time_left(self.timeout)
+        # Bütçe isteğin deadline'ıyla kısaldıysa süre dolması upstream hatası sayılmaz
+        deadline_bound = budget < self.timeout
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.name)
+
+        hedge = self.hedge if hedge is None else hedge
+        hedge_delay = self.latency.percentile(self.hedge_percentile) if hedge else None
+        spare_attempts = 1 if hedge else 0
+
+        started = time.monotonic()
+        end = started + budget
+        attempts: List[Future] = [self._submit(fn, budget)]
+        last_error: Optional[BaseException] = None
+        rejected: Optional[BaseException] = None
+        timed_out = False
+
+        while attempts and time.monotonic() < end:
+            now = time.monotonic()
+            wait_for = end - now
+            can_hedge = spare_attempts > 0 and hedge_delay is not None
+            if can_hedge:
+                wait_for = min(wait_for, max(self.min_hedge_delay, started + hedge_delay - now))
+
+            done, _ = wait(attempts, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # İlk deneme p95'i aştı: ikinci deneme başlat, ilk biten kazanır.
+                # Limiter doluysa hedge sadece kuyruğu büyütür: slot boşalana kadar bekle
+                if can_hedge and time.monotonic() < end and self._has_free_slot():
+                    attempts.append(self._submit(fn, end - time.monotonic()))
+                    spare_attempts -= 1
+                continue
+
+            for future in done:
+                attempts.remove(future)
+                try:
+                    result, latency = future.result()
+                except self.ignore_errors as e:
+                    # Reddedilen deneme (ör. dolu kuyruk) sadece kendini düşürür
+                    rejected = e
+                    continue
+                except DeadlineExceeded:
+                    timed_out = True
+                    continue
+                except Exception as e:
+                    last_error = e
+                    continue
+                self.latency.record(latency)
+                self.breaker.record(True)
+                return result
+
+            if rejected is not None and not attempts:
+                # Çalışan başka deneme kalmadı: admission reddi breaker'a sayılmadan yukarı çıkar
+                self.breaker.abandon()
+                raise rejected
+
+            if not attempts and spare_attempts > 0 and time.monotonic() < end:
+                # Hızlı hata: kalan bütçeyle bir kez daha dene
+                attempts.append(self._submit(fn, end - time.monotonic()))
+                spare_attempts -= 1
+
+        if last_error is not None and not attempts and not timed_out:
+            # Tüm denemeler hata verdi
+            self.breaker.record(False)
+            raise last_error
+        if deadline_bound and last_error is None:
+            # Upstream kendi timeout'unu doldurmadı: sonucu bilinmiyor, (varsa) probe serbest bırakılır
+            self.breaker.abandon()
+        else:
+            self.breaker.record(False)
+        raise DeadlineExceeded(f"{self.name} çağrısı {budget:.1f} sn içinde tamamlanmadı")
+
+    def _submit(self, fn: Callable[[float], T], budget: float) -> Future:
+        # Deadline ve öncelik contextvar'ları deneme thread'ine taşınır
+        return _executor.submit(contextvars.copy_context().run, self._attempt, fn, budget)
+
+    def stats(self) -> dict:
+        return {
+            "breaker": self.breaker.state,
+            "p50": self.latency.percentile(0.5),
+            "p95": self.latency.percentile(self.hedge_percentile),
+        }
@@ -5,10 +5,36 @@ Kullanıcı mesajlarını analiz ederek doğru endpoint'e yönlendirir:
 - chat: Genel yazılım/mimari soruları
 - web_search: Güncel bilgi gerektiren sorular
 - rag: Yüklü dokümana referans içeren sorular
+- hybrid: Hem yüklü dokümanı hem güncel web bilgisini gerektiren sorular
+
+Optimistic modda tek LLM çağrısı hem yönlendirir hem de chat mesajlarını doğrudan yanıtlar.
 """
 
+import re
+from typing import List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
 
+ROUTES = ["chat", "web_search", "rag", "hybrid"]
+
+# Modeller başlığı sık sık markdown ile sarar: **MODE: rag**, `MODE: rag`, ```\nMODE: rag\n```
+_MARKDOWN_NOISE = re.compile(r"[*`#>]")
+_MODE_HEADER = re.compile(r"mode\s*:\s*([a-z_]+)[\s.,!?]*(.*)$", re.IGNORECASE)
+
+
+def _strip_markdown(line: str) -> str:
+    """Satırı markdown süsünden arındır (kod bloğu sınırı boş sayılır)"""
+    line = line.strip()
+    if line.startswith("```"):
+        return ""
+    return _MARKDOWN_NOISE.sub("", line).strip()
+
+HYBRID_DESCRIPTION = (
+    "Hem yüklenen dokümanı hem güncel web bilgisini gerektiren sorular "
+    "(ör. dokümandaki tasarımı güncel en iyi uygulamalarla karşılaştırma)"
+)
+
 
 class SemanticRouter:
     """LLM tabanlı akıllı yönlendirici"""
@@ -25,10 +51,13 @@ class SemanticRouter:
             has_document: Session'da yüklü doküman var mı
             
         Returns:
-            "chat", "web_search" veya "rag"
+            "chat", "web_search", "rag" veya "hybrid"
         """
         
         rag_context = "Kullanıcının yüklediği bir doküman VAR. " if has_document else ""
+        hybrid_line = f"- hybrid: {HYBRID_DESCRIPTION}\n" if has_document else ""
+        hybrid_rule = "5. Doküman VE güncel web bilgisi birlikte gerekiyorsa → hybrid\n" if has_document else ""
+        choices = "chat, web_search, rag, hybrid" if has_document else "chat, web_search, rag"
         
         prompt = f"""Kullanıcının mesajını analiz et ve hangi moda yönlendirileceğini belirle.
 
@@ -36,16 +65,16 @@ MODLAR:
 - chat: Genel yazılım/mimari soruları, kavram açıklamaları, kod örnekleri, teorik bilgiler
 - web_search: Güncel bilgi gerektiren sorular (2024, son, güncel, yeni, trend, haberler, karşılaştırma)
 - rag: {rag_context}Dokümana/dosyaya referans içeren sorular (dosyada, belgede, yüklediğim, dokümanda)
-
+{hybrid_line}
 KURALLAR:
 1. Güncel tarih/yıl içeren sorular, bugünün tarihi, etkinlik arama → web_search
 2. "En iyi", "karşılaştır", "önerir misin" gibi sorular → web_search
 3. Dosya/doküman referansı varsa VE doküman yüklüyse → rag
 4. Genel kavram açıklaması, kod örneği → chat
-
+{hybrid_rule}
 MESAJ: {message}
 
-SADECE şu kelimelerden BİRİNİ yaz (başka hiçbir şey yazma): chat, web_search, rag"""
+SADECE şu kelimelerden BİRİNİ yaz (başka hiçbir şey yazma): {choices}"""
 
         try:
             result = self.llm.invoke(prompt)
@@ -58,12 +87,14 @@ SADECE şu kelimelerden BİRİNİ yaz (başka hiçbir şey yazma): chat, web_sea
             route = route.strip(".,!?")
             
             # Geçerli route kontrolü
-            if route not in ["chat", "web_search", "rag"]:
+            if route not in ROUTES:
                 return "chat"
             
-            # RAG sadece doküman varsa
+            # RAG sadece doküman varsa; hybrid doküman yoksa web aramasına iner
             if route == "rag" and not has_document:
                 return "chat"
+            if route == "hybrid" and not has_document:
+                return "web_search"
             
             return route
             
@@ -71,10 +102,90 @@ SADECE şu kelimelerden BİRİNİ yaz (başka hiçbir şey yazma): chat, web_sea
             print(f"SemanticRouter error: {e}")
             return "chat"
     
+    def route_or_answer(
+        self,
+        message: str,
+        history: List[BaseMessage],
+        system_prompt: str,
+        has_document: bool = False,
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Tek çağrıda yönlendirme + chat yanıtı.
+
+        Args:
+            message: Kullanıcı mesajı
+            history: Session'ın konuşma geçmişi
+            system_prompt: Asistanın sistem promptu (chat yanıtı için)
+            has_document: Session'da yüklü doküman var mı
+
+        Returns:
+            (mod, yanıt) - mod "chat" ise yanıt doğrudan kullanılabilir;
+            "web_search"/"rag" veya yanıt üretilemediyse yanıt None döner
+        """
+        rag_context = "Kullanıcının yüklediği bir doküman VAR. " if has_document else ""
+        hybrid_line = f"\n- hybrid: {HYBRID_DESCRIPTION}" if has_document else ""
+        hybrid_choice = ', "MODE: hybrid"' if has_document else ""
+
+        routing_instructions = f"""
+
+YANIT BİÇİMİ:
+Önce kullanıcının son mesajının hangi moda ait olduğuna karar ver.
+- web_search: Güncel bilgi gerektiren sorular (güncel tarih/yıl, son sürümler, trendler, haberler, "en iyi", karşılaştırma)
+- rag: {rag_context}Dokümana/dosyaya referans içeren sorular (dosyada, belgede, yüklediğim, dokümanda){hybrid_line}
+- chat: Diğer her şey (kavram açıklaması, kod örneği, tasarım tartışması, sohbet)
+
+İlk satıra SADECE "MODE: chat", "MODE: web_search", "MODE: rag"{hybrid_choice} yaz.
+Mod chat ise ikinci satırdan itibaren kullanıcıya vereceğin yanıtı yaz.
+Mod chat değilse başka hiçbir şey yazma."""
+
+        messages = [SystemMessage(content=system_prompt + routing_instructions)]
+        messages.extend(history)
+        messages.append(HumanMessage(content=message))
+
+        try:
+            result = self.llm.invoke(messages)
+            route, answer = self._parse_route_and_answer(result.content)
+        except Exception as e:
+            print(f"SemanticRouter error: {e}")
+            return "chat", None
+
+        if route == "rag" and not has_document:
+            return "chat", None
+        if route == "hybrid" and not has_document:
+            return "web_search", None
+        if route != "chat":
+            return route, None
+        return route, answer
+
+    @staticmethod
+    def _parse_route_and_answer(text: str) -> Tuple[str, Optional[str]]:
+        """'MODE: <route>' satırı + yanıt biçimindeki çıktıyı ayrıştır (markdown süsü yok sayılır)"""
+        lines = text.strip().splitlines()
+        # Sadece süsten ibaret satırlar (```lang, **) atlanır; ilk dolu satır başlık adayıdır
+        contents = [_strip_markdown(line) for line in lines]
+        first = next((i for i, content in enumerate(contents) if content), None)
+        match = _MODE_HEADER.search(contents[first]) if first is not None else None
+
+        if match is None:
+            # Biçime uymadı: tamamını chat yanıtı say
+            return "chat", text.strip() or None
+
+        route = match.group(1).lower()
+        if route not in ROUTES:
+            route = "chat"
+
+        # Başlık yanıta sızmaz; başlığı kapatan ``` / ** satırları da atlanır
+        rest = lines[first + 1:]
+        while rest and not _strip_markdown(rest[0]):
+            rest = rest[1:]
+        answer = "\n".join([match.group(2).strip(), *rest] if match.group(2).strip() else rest).strip()
+        return route, answer or None
+
     def get_route_explanation(self, route: str) -> str:
         """Route için kullanıcıya gösterilecek açıklama"""
         return {
             "chat": "💬 Asistan bilgisiyle yanıtlanıyor",
             "web_search": "🌐 Web'de aranıyor",
-            "rag": "📄 Dokümanda aranıyor"
+            "rag": "📄 Dokümanda aranıyor",
+            "hybrid": "🔀 Doküman ve web birlikte aranıyor"
         }.get(route, "💬 Yanıtlanıyor")
@@ -0,0 +1,152 @@
+"""
+Speculative Retrieval - Router karar verirken olası retrieval'ı paralel başlatır
+
+- Mesajdaki güncellik ipuçları (yıl, "son sürüm", "latest"...) -> web_search tahmini
+- Session'da doküman varsa -> rag tahmini
+- Router aynı modu seçerse sonuç kullanılır (hit), seçmezse iptal edilir / atılır (miss)
+- Aynı anda en fazla N spekülasyon çalışır (bütçe dolarsa spekülasyon yapılmaz)
+"""
+
+import contextvars
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Sequence, Union
+
+RECENCY_CUES = re.compile(
+    r"\b(20[2-9]\d|güncel|bugün|yeni çıkan|son sürüm|en son|en yeni|haber|trend|latest|newest|current|"
+    r"release[sd]?|today|news|this year)\b",
+    re.IGNORECASE,
+)
+DOCUMENT_CUES = re.compile(
+    r"(doküman|dokuman|belge|dosya|yüklediğim|pdf|document|uploaded|attached|the file)",
+    re.IGNORECASE,
+)
+
+
+def predict_mode(message: str, has_document: bool = False) -> Optional[str]:
+    """Ucuz sezgisel tahmin: spekülatif başlatılacak retrieval modu (yoksa None)"""
+    if has_document and DOCUMENT_CUES.search(message):
+        return "rag"
+    if RECENCY_CUES.search(message):
+        return "web_search"
+    if has_document:
+        return "rag"
+    return None
+
+
+class SpeculationMetrics:
+    """Spekülasyon hit oranı ve kazanılan gecikme sayaçları"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.saved_seconds = 0.0
+
+    def record_hit(self, saved: float) -> None:
+        with self._lock:
+            self.hits += 1
+            self.saved_seconds += saved
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def record_started(self) -> None:
+        with self._lock:
+            self.started += 1
+
+    def record_skipped(self) -> None:
+        with self._lock:
+            self.skipped += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            resolved = self.hits + self.misses
+            return {
+                "started": self.started,
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped_budget": self.skipped,
+                "hit_rate": self.hits / resolved if resolved else None,
+                "saved_ms_total": round(self.saved_seconds * 1000, 1),
+                "saved_ms_per_hit": round(self.saved_seconds * 1000 / self.hits, 1) if self.hits else None,
+            }
+
+
+class Speculation:
+    """Çalışmakta olan tek bir spekülatif retrieval"""
+
+    def __init__(self, mode: str, future: Future, started_at: float):
+        self.mode = mode
+        self.future = future
+        self.started_at = started_at
+        self.finished_at: Optional[float] = None
+
+
+class SpeculativeRetriever:
+    """Spekülatif retrieval'ları bütçe dahilinde başlatır ve router kararıyla eşleştirir"""
+
+    def __init__(self, max_in_flight: int = 8, enabled: bool = True):
+        self.enabled = enabled and max_in_flight > 0
+        self.metrics = SpeculationMetrics()
+        self._budget = threading.BoundedSemaphore(max(1, max_in_flight))
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_in_flight), thread_name_prefix="speculation")
+
+    def start(self, mode: Optional[str], fn: Callable[[], Any]) -> Optional[Speculation]:
+        """Bütçe varsa fn'i arka planda başlat"""
+        if not self.enabled or mode is None:
+            return None
+        if not self._budget.acquire(blocking=False):
+            self.metrics.record_skipped()
+            return None
+
+        self.metrics.record_started()
+        speculation = Speculation(mode, None, time.monotonic())
+
+        def run():
+            try:
+                return fn()
+            finally:
+                speculation.finished_at = time.monotonic()
+
+        # Deadline ve öncelik gibi istek context'i spekülasyona da taşınır
+        future = self._executor.submit(contextvars.copy_context().run, run)
+        future.add_done_callback(lambda _: self._budget.release())
+        speculation.future = future
+        return speculation
+
+    def resolve(self, speculation: Optional[Speculation], mode: Union[str, Sequence[str]]) -> Optional[Future]:
+        """
+        Router kararı geldi: mod eşleşiyorsa spekülasyonun future'ını döndür, değilse iptal et.
+
+        Args:
+            speculation: start() sonucu
+            mode: Seçilen mod veya o modun ihtiyaç duyduğu retrieval modları (ör. hybrid -> rag + web_search)
+
+        Returns:
+            Sonucu kullanılacak future veya None (hiç spekülasyon yoksa / miss)
+        """
+        if speculation is None:
+            return None
+
+        accepted = (mode,) if isinstance(mode, str) else tuple(mode)
+        if speculation.mode not in accepted:
+            # Henüz başlamadıysa iptal edilir, başladıysa sonucu atılır
+            speculation.future.cancel()
+            self.metrics.record_miss()
+            return None
+
+        decided_at = time.monotonic()
+
+        def on_done(_):
+            # Kazanç = retrieval'ın router ile çakışan süresi
+            finished_at = speculation.finished_at or decided_at
+            self.metrics.record_hit(max(0.0, min(finished_at, decided_at) - speculation.started_at))
+
+        speculation.future.add_done_callback(on_done)
+        return speculation.future
@@ -0,0 +1,378 @@
+"""
+State Store - Process'ler arası paylaşılabilir session state
+
+Konuşma geçmişi, vektör store'lar ve cache'ler bu katman üzerinden tutulur:
+- memory: Tek process (varsayılan, eski davranış)
+- sqlite: Aynı makinedeki tüm uvicorn worker'ları tek bir dosyayı paylaşır
+- redis: Redis uyumlu bir sunucu üzerinden birden fazla node paylaşır
+
+Konuşma geçmişi liste olarak tutulur; yeni mesajlar atomik append ile eklenir
+(RPUSH / INSERT), aynı session'a eşzamanlı yazan worker'lar birbirinin mesajını ezmez.
+
+UYARI: Paylaşımlı backend'deki nesneler (FAISS store, pickle) okunurken deserialize edilir.
+Backend'e yazabilen herkes worker'larda kod çalıştırabilir; sadece güvenilen, erişimi
+kısıtlı bir sunucu kullanın (STATE_SIGNING_KEY ile imza doğrulaması açılabilir).
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+
+class StateBackend:
+    """Anahtar -> bytes saklayan basit backend arayüzü"""
+
+    # Backend başka process'lerle paylaşılıyor mu (serileştirme gerekir mi)
+    shared = True
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def append(self, key: str, values: Sequence[bytes], ttl: Optional[float] = None) -> None:
+        """Listenin sonuna atomik ekle (TTL listenin tamamı için yenilenir)"""
+        raise NotImplementedError
+
+    def get_list(self, key: str) -> List[bytes]:
+        raise NotImplementedError
+
+
+class InMemoryStateBackend(StateBackend):
+    """Process içi backend (tek worker)"""
+
+    shared = False
+
+    def __init__(self, purge_interval: float = 60.0):
+        self._data: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._lock = threading.Lock()
+        self.purge_interval = purge_interval
+        self._last_purge = time.time()
+
+    def _live(self, key: str, now: float) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at < now:
+            del self._data[key]
+            return None
+        return value
+
+    def _purge_expired(self, now: float) -> None:
+        # Hiç okunmayan süresi dolmuş anahtarlar da belli aralıklarla silinir
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        for key in [k for k, (_, expires_at) in self._data.items() if expires_at is not None and expires_at < now]:
+            del self._data[key]
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._live(key, time.time())
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._purge_expired(now)
+            self._data[key] = (value, now + ttl if ttl else None)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def append(self, key: str, values: Sequence[bytes], ttl: Optional[float] = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._purge_expired(now)
+            items = list(self._live(key, now) or [])
+            items.extend(values)
+            self._data[key] = (items, now + ttl if ttl else None)
+
+    def get_list(self, key: str) -> List[bytes]:
+        with self._lock:
+            return list(self._live(key, time.time()) or [])
+
+
+class SQLiteStateBackend(StateBackend):
+    """Lokal diskte SQLite (WAL) backend - aynı makinedeki worker'lar paylaşır"""
+
+    def __init__(self, path: str, purge_interval: float = 60.0):
+        self.path = path
+        self._local = threading.local()
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS list_items ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, value BLOB NOT NULL, expires_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS list_items_key ON list_items (key, seq)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite bağlantıları thread'ler arasında paylaşılmamalı
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM kv WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            self.delete(key)
+            return None
+        return bytes(value)
+
+    def _purge_expired(self, conn: sqlite3.Connection, now: float) -> None:
+        # Hiç okunmayan süresi dolmuş satırlar da belli aralıklarla silinir
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        conn.execute("DELETE FROM kv WHERE expires_at < ?", (now,))
+        conn.execute("DELETE FROM list_items WHERE expires_at < ?", (now,))
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        with self._connect() as conn:
+            self._purge_expired(conn, time.time())
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, sqlite3.Binary(value), time.time() + ttl if ttl else None),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+            conn.execute("DELETE FROM list_items WHERE key = ?", (key,))
+
+    def append(self, key: str, values: Sequence[bytes], ttl: Optional[float] = None) -> None:
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self._connect() as conn:
+            self._purge_expired(conn, now)
+            # Süresi dolmuş liste önce silinir; INSERT'ler tek transaction'da, mevcut satırlar yeniden yazılmaz
+            conn.execute("DELETE FROM list_items WHERE key = ? AND expires_at < ?", (key, now))
+            conn.executemany(
+                "INSERT INTO list_items (key, value, expires_at) VALUES (?, ?, ?)",
+                [(key, sqlite3.Binary(value), expires_at) for value in values],
+            )
+            conn.execute("UPDATE list_items SET expires_at = ? WHERE key = ?", (expires_at, key))
+
+    def get_list(self, key: str) -> List[bytes]:
+        rows = self._connect().execute(
+            "SELECT value FROM list_items WHERE key = ? AND (expires_at IS NULL OR expires_at >= ?) ORDER BY seq",
+            (key, time.time()),
+        ).fetchall()
+        return [bytes(value) for value, in rows]
+
+
+class RedisStateBackend(StateBackend):
+    """
+    Redis uyumlu sunucu (Redis, Valkey, KeyDB...) backend - node'lar arası paylaşım.
+
+    Sunucu güvenilir olmalı: okunan FAISS / pickle verisi deserialize edilir (bkz. modül notu).
+    """
+
+    def __init__(self, url: str, prefix: str = "smart-llm:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("STATE_BACKEND=redis için 'redis' paketi gerekli: pip install redis") from e
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        self._client.set(self.prefix + key, value, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key: str) -> None:
+        self._client.delete(self.prefix + key)
+
+    def exists(self, key: str) -> bool:
+        return bool(self._client.exists(self.prefix + key))
+
+    def append(self, key: str, values: Sequence[bytes], ttl: Optional[float] = None) -> None:
+        pipe = self._client.pipeline(transaction=True)
+        pipe.rpush(self.prefix + key, *values)
+        if ttl:
+            pipe.pexpire(self.prefix + key, int(ttl * 1000))
+        pipe.execute()
+
+    def get_list(self, key: str) -> List[bytes]:
+        return self._client.lrange(self.prefix + key, 0, -1)
+
+
+def create_state_backend() -> StateBackend:
+    """STATE_BACKEND ortam değişkenine göre backend oluştur"""
+    kind = os.getenv("STATE_BACKEND", "memory").strip().lower()
+
+    if kind == "sqlite":
+        return SQLiteStateBackend(os.getenv("STATE_SQLITE_PATH", "state.sqlite3"))
+    if kind == "redis":
+        return RedisStateBackend(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    return InMemoryStateBackend()
+
+
+class BackendChatMessageHistory(BaseChatMessageHistory):
+    """Mesajları StateBackend'de mesaj başına bir JSON liste elemanı olarak tutan konuşma geçmişi"""
+
+    def __init__(self, backend: StateBackend, session_id: str, ttl: Optional[float] = None):
+        self.backend = backend
+        # Eski tek-JSON biçimindeki "history:" anahtarlarıyla çakışmasın diye ayrı anahtar
+        self.key = f"history_list:{session_id}"
+        self.ttl = ttl
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return messages_from_dict([json.loads(raw) for raw in self.backend.get_list(self.key)])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        # Okuma-değiştirme-yazma yok: sadece yeni mesajlar eklenir
+        items = [json.dumps(item).encode("utf-8") for item in messages_to_dict(list(messages))]
+        if items:
+            self.backend.append(self.key, items, ttl=self.ttl)
+
+    def clear(self) -> None:
+        self.backend.delete(self.key)
+
+
+class SharedObjectRegistry:
+    """
+    Session bazlı nesneleri (FAISS store vb.) backend üzerinden paylaşır.
+
+    Paylaşımlı backend'lerde nesne serileştirilip bir versiyon anahtarıyla yazılır;
+    her worker versiyon değişmedikçe kendi yerel kopyasını kullanır.
+
+    Paylaşımlı backend'de yerel kopyalar LRU (max_local) ve TTL ile sınırlıdır; düşen kopya
+    gerektiğinde backend'den tekrar okunur. memory backend'de yerel kopya tek kopyadır: LRU
+    uygulanmaz, sadece (verildiyse) TTL'i dolan session silinir.
+    """
+
+    def __init__(
+        self,
+        backend: StateBackend,
+        namespace: str,
+        serialize: Callable[[Any], bytes],
+        deserialize: Callable[[bytes], Any],
+        ttl: Optional[float] = None,
+        max_local: int = 64,
+        signing_key: Optional[bytes] = None,
+    ):
+        self.backend = backend
+        self.namespace = namespace
+        self.serialize = serialize
+        self.deserialize = deserialize
+        self.ttl = ttl
+        self.max_local = max_local
+        self.signing_key = signing_key
+        # session_id -> (versiyon, nesne, son geçerlilik zamanı)
+        self._local: "OrderedDict[str, Tuple[str, Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _keys(self, session_id: str) -> Tuple[str, str]:
+        return f"{self.namespace}:data:{session_id}", f"{self.namespace}:version:{session_id}"
+
+    def _cached(self, session_id: str) -> Optional[Tuple[str, Any, Optional[float]]]:
+        """Yerel kopya (süresi dolduysa silinir); lock altında çağrılmalı"""
+        item = self._local.get(session_id)
+        if item is None:
+            return None
+        if item[2] is not None and item[2] < time.time():
+            del self._local[session_id]
+            return None
+        self._local.move_to_end(session_id)
+        return item
+
+    def _remember(self, session_id: str, version: str, obj: Any) -> None:
+        with self._lock:
+            self._local[session_id] = (version, obj, time.time() + self.ttl if self.ttl else None)
+            self._local.move_to_end(session_id)
+            # memory backend'de yerel kopya tek kopya: sınır aşılsa da atılmaz
+            while self.backend.shared and len(self._local) > self.max_local:
+                self._local.popitem(last=False)
+
+    def _sign(self, data: bytes) -> bytes:
+        if not self.signing_key:
+            return data
+        return hmac.new(self.signing_key, data, hashlib.sha256).digest() + data
+
+    def _verify(self, raw: bytes) -> Optional[bytes]:
+        if not self.signing_key:
+            return raw
+        digest, data = raw[:32], raw[32:]
+        if not hmac.compare_digest(digest, hmac.new(self.signing_key, data, hashlib.sha256).digest()):
+            return None
+        return data
+
+    def __contains__(self, session_id: str) -> bool:
+        if not self.backend.shared:
+            with self._lock:
+                return self._cached(session_id) is not None
+        return self.backend.exists(self._keys(session_id)[1])
+
+    def get(self, session_id: str) -> Optional[Any]:
+        if not self.backend.shared:
+            with self._lock:
+                item = self._cached(session_id)
+            return item[1] if item else None
+
+        data_key, version_key = self._keys(session_id)
+        version = self.backend.get(version_key)
+        if version is None:
+            with self._lock:
+                self._local.pop(session_id, None)
+            return None
+        version = version.decode("utf-8")
+
+        with self._lock:
+            cached = self._cached(session_id)
+            if cached and cached[0] == version:
+                return cached[1]
+
+        raw = self.backend.get(data_key)
+        if raw is None:
+            return None
+        data = self._verify(raw)
+        if data is None:
+            print(f"SharedObjectRegistry: {data_key} imzası geçersiz, yok sayıldı")
+            return None
+        obj = self.deserialize(data)
+        self._remember(session_id, version, obj)
+        return obj
+
+    def put(self, session_id: str, obj: Any) -> None:
+        version = f"{time.time_ns()}-{os.getpid()}"
+        if self.backend.shared:
+            data_key, version_key = self._keys(session_id)
+            # Önce veri, sonra versiyon: okuyucular yarım veri görmez
+            self.backend.set(data_key, self._sign(self.serialize(obj)), ttl=self.ttl)
+            self.backend.set(version_key, version.encode("utf-8"), ttl=self.ttl)
+        self._remember(session_id, version, obj)
@@ -0,0 +1,200 @@
+"""
+Web Knowledge Index - Çekilen web sayfalarından kalıcı, paylaşımlı lokal index
+
+- fetch_url_content ile indirilen sayfalar chunk'lanıp URL + çekilme zamanı metadata'sıyla diske yazılır
+- Web modu önce bu index'e bakar; yeterince taze ve benzer sonuç varsa SerpAPI / sayfa çekme atlanır
+- Aynı dizini kullanan tüm worker'lar index'i paylaşır (dosya kilidi + mtime ile yeniden yükleme)
+- Copy-on-write: ekleme yeni bir store kopyası üzerinde yapılıp referans değiştirilir,
+  okuyucuların elindeki store hiç değişmez
+- max_age_seconds'ı geçen sayfalar ve max_pages üstündeki en eski sayfalar index'ten atılır
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+
+try:
+    import fcntl
+except ImportError:  # Windows: process'ler arası kilit yok, tek worker varsayılır
+    fcntl = None
+
+
+class WebKnowledgeIndex:
+    """Disk üzerinde FAISS tabanlı web sayfası bilgi index'i"""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        directory: str,
+        chunker: Callable[[List[str]], List[str]],
+        max_age_seconds: float = 72 * 3600,
+        min_score: float = 0.75,
+        max_pages: int = 2000,
+        embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None,
+    ):
+        self.embeddings = embeddings
+        # Sayfa chunk'larını embed eden fonksiyon (limiter / breaker korumalı yol verilmeli)
+        self.embed_fn = embed_fn or embeddings.embed_documents
+        self.directory = Path(directory)
+        self.chunker = chunker
+        self.max_age_seconds = max_age_seconds
+        self.min_score = min_score
+        self.max_pages = max_pages
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._urls_file = self.directory / "urls.json"
+        self._lock_file = self.directory / ".lock"
+
+        self._store: Optional[FAISS] = None
+        self._urls: Dict[str, dict] = {}  # url -> {"fetched_at": ..., "ids": [...]}
+        self._loaded_mtime: Optional[float] = None
+        self._lock = threading.Lock()
+        # Sayfa ekleme (embedding + diske yazma) yanıtı bekletmez
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="web-knowledge")
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False) -> Iterator[None]:
+        # Yazan worker LOCK_EX, diskten okuyan worker LOCK_SH alır (yarım yazılmış index okunmaz)
+        with open(self._lock_file, "a") as handle:
+            if fcntl:
+                fcntl.flock(handle, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _mtime(self) -> Optional[float]:
+        try:
+            return self._urls_file.stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _read_disk(self) -> Optional[Tuple[FAISS, Dict[str, dict], float]]:
+        """Diskteki index değiştiyse (store, urls, mtime) oku; dosya kilidi çağıranda olmalı"""
+        mtime = self._mtime()
+        if mtime is None or mtime == self._loaded_mtime:
+            return None
+        store = FAISS.load_local(
+            str(self.directory), self.embeddings, allow_dangerous_deserialization=True
+        )
+        urls = json.loads(self._urls_file.read_text(encoding="utf-8"))
+        return store, urls, mtime
+
+    def _reload_if_changed(self) -> None:
+        """Başka bir worker index'i güncellediyse diskten yeniden yükle"""
+        mtime = self._mtime()
+        if mtime is None or mtime == self._loaded_mtime:
+            return
+        # self._lock tutulmadan beklenir: yazan thread LOCK_EX altında self._lock'u ister
+        with self._file_lock(shared=True):
+            loaded = self._read_disk()
+        if not loaded:
+            return
+        with self._lock:
+            # Bu arada daha yeni bir hal yüklendiyse eskisiyle ezme
+            if self._loaded_mtime is None or loaded[2] > self._loaded_mtime:
+                self._store, self._urls, self._loaded_mtime = loaded
+
+    def _clone(self, store: FAISS) -> FAISS:
+        return FAISS.deserialize_from_bytes(
+            store.serialize_to_bytes(), self.embeddings, allow_dangerous_deserialization=True
+        )
+
+    def _evicted_urls(self, urls: Dict[str, dict], new_url: str, now: float) -> List[str]:
+        """new_url eklenmeden önce atılacaklar: eski kopyası, TTL'i dolanlar ve max_pages'i aşan en eskiler"""
+        oldest = now - self.max_age_seconds
+        evicted = [u for u, entry in urls.items() if u == new_url or entry["fetched_at"] < oldest]
+        alive = sorted((u for u in urls if u not in evicted), key=lambda u: urls[u]["fetched_at"])
+        overflow = len(alive) + 1 - self.max_pages
+        return evicted + (alive[:overflow] if overflow > 0 else [])
+
+    def lookup(self, query: str, k: int = 3) -> List[Document]:
+        """
+        Sorguya benzer, taze chunk'ları döndür.
+
+        Returns:
+            min_score üstünde ve max_age_seconds'tan yeni chunk'lar (yoksa boş liste)
+        """
+        self._reload_if_changed()
+        with self._lock:
+            store = self._store
+        if store is None:
+            return []
+
+        oldest = time.time() - self.max_age_seconds
+        results = store.similarity_search_with_relevance_scores(query, k=k * 3)
+        fresh = [
+            doc for doc, score in results
+            if score >= self.min_score and doc.metadata.get("fetched_at", 0) >= oldest
+        ]
+        return fresh[:k]
+
+    def is_fresh(self, url: str) -> bool:
+        with self._lock:
+            entry = self._urls.get(url)
+        return bool(entry) and entry["fetched_at"] >= time.time() - self.max_age_seconds
+
+    def add_page(self, url: str, title: str, text: str) -> None:
+        """Sayfayı chunk'la, embed et ve index'e ekle (eski kopyası varsa değiştir)"""
+        chunks = self.chunker([text])
+        if not chunks:
+            return
+
+        fetched_at = time.time()
+        vectors = self.embed_fn(chunks)
+        metadatas = [{"url": url, "title": title, "fetched_at": fetched_at} for _ in chunks]
+
+        with self._file_lock():
+            # Diğer worker'ların eklemelerini kaybetmemek için önce en güncel hali yükle
+            with self._lock:
+                loaded = self._read_disk()
+                if loaded:
+                    self._store, self._urls, self._loaded_mtime = loaded
+                base, urls = self._store, dict(self._urls)
+
+            # Değişiklikler kopya üzerinde: okuyucular aramaya eski store ile devam eder
+            store = self._clone(base) if base is not None else None
+            removed = self._evicted_urls(urls, url, fetched_at)
+            if store is not None:
+                present = set(store.index_to_docstore_id.values())
+                stale_ids = [i for u in removed for i in urls[u]["ids"] if i in present]
+                if stale_ids:
+                    store.delete(stale_ids)
+            for u in removed:
+                del urls[u]
+
+            if store is None:
+                store = FAISS.from_embeddings(list(zip(chunks, vectors)), self.embeddings, metadatas=metadatas)
+                ids = list(store.index_to_docstore_id.values())
+            else:
+                ids = store.add_embeddings(list(zip(chunks, vectors)), metadatas=metadatas)
+
+            urls[url] = {"fetched_at": fetched_at, "ids": ids}
+            store.save_local(str(self.directory))
+            # urls.json en son yazılır: mtime'ı okuyucular için "index hazır" sinyalidir
+            tmp = self._urls_file.with_suffix(".tmp")
+            tmp.write_text(json.dumps(urls), encoding="utf-8")
+            os.replace(tmp, self._urls_file)
+
+            with self._lock:
+                self._store, self._urls, self._loaded_mtime = store, urls, self._urls_file.stat().st_mtime
+
+    def add_page_async(self, url: str, title: str, text: str) -> None:
+        """add_page'i arka planda çalıştır; hatalar sadece loglanır"""
+        def run():
+            try:
+                self.add_page(url, title, text)
+            except Exception as e:
+                print(f"WebKnowledgeIndex error: {e}")
+
+        self._writer.submit(run)
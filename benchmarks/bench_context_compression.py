@@ -0,0 +1,177 @@
+"""
+Benchmark: çıkarımsal bağlam sıkıştırmanın token tasarrufu vs cevap kapsama kalitesi
+
+Sabit bir soru seti üzerinde, her soru için alınan 3 pasaj (1 ilgili + 2 alakasız) sıkıştırılır:
+- token azalması: sıkıştırılmış / tam bağlamın tahmini token oranı
+- kapsama: referans cevap cümlesinin terimlerinin sıkıştırılmış bağlamda kalma oranı
+- tam isabet: referans cümlenin bağlamda aynen kalma oranı
+
+Gerçek embedding yerine deterministik, karakter trigram hash'li sahte embedding kullanılır.
+
+Kullanım:
+    python benchmarks/bench_context_compression.py --budgets 100 200 400
+"""
+
+import argparse
+import hashlib
+import statistics
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from context_compression import ContextCompressor, _terms  # noqa: E402
+from context_fusion import Passage, estimate_tokens  # noqa: E402
+
+PASSAGES = {
+    "cache": (
+        "Önbellekleme, sık okunan verinin daha hızlı bir katmanda tutulmasıdır. "
+        "Cache-aside deseninde uygulama önce önbelleğe bakar, veri yoksa veritabanından okuyup önbelleğe yazar. "
+        "Write-through stratejisinde her yazma işlemi hem önbelleğe hem veritabanına aynı anda yapılır. "
+        "Önbellekteki kayıtlar için TTL belirlemek bayat veri riskini sınırlar. "
+        "Cache stampede, süresi dolan popüler bir anahtar için çok sayıda isteğin aynı anda veritabanına gitmesidir. "
+        "Bu sorun genellikle istek birleştirme veya erken yenileme ile çözülür. "
+        "Dağıtık önbelleklerde tutarlı hash'leme, düğüm eklenince taşınan anahtar sayısını azaltır."
+    ),
+    "microservices": (
+        "Mikroservis mimarisinde uygulama bağımsız olarak dağıtılabilen küçük servislere bölünür. "
+        "Her servis kendi veritabanına sahip olmalıdır, paylaşılan veritabanı servisler arasında sıkı bağ oluşturur. "
+        "Servisler arası iletişim senkron REST/gRPC veya asenkron mesajlaşma ile yapılabilir. "
+        "Dağıtık işlemlerde iki aşamalı commit yerine saga deseni tercih edilir. "
+        "Saga, her adımın telafi edici bir işlemi olan yerel işlemler zinciridir. "
+        "API gateway istemcilere tek giriş noktası sağlar ve kimlik doğrulamayı merkezileştirir. "
+        "Küçük ekipler için mikroservislerin operasyonel maliyeti çoğu zaman monolitten yüksektir."
+    ),
+    "cqrs": (
+        "CQRS, okuma ve yazma modellerinin ayrılması prensibidir. "
+        "Komut tarafı iş kurallarını uygular, sorgu tarafı okumaya optimize edilmiş görünümler sunar. "
+        "Okuma modeli genellikle olaylar dinlenerek asenkron güncellenir, bu yüzden nihai tutarlılık kabul edilmelidir. "
+        "Event sourcing ile birlikte kullanıldığında sistemin durumu olay günlüğünden yeniden oluşturulabilir. "
+        "Basit CRUD uygulamalarında CQRS gereksiz karmaşıklık ekler. "
+        "Okuma ve yazma yükü çok farklı olduğunda iki taraf bağımsız ölçeklenebilir."
+    ),
+    "observability": (
+        "Gözlemlenebilirlik metrikler, loglar ve dağıtık izlerden oluşur. "
+        "Dağıtık izleme bir isteğin servisler arasındaki yolunu trace id ile takip eder. "
+        "RED yöntemi servisler için istek oranı, hata oranı ve süreyi izlemeyi önerir. "
+        "Ortalama gecikme yerine p95 ve p99 gibi yüzdelikler izlenmelidir, çünkü kuyruk gecikmesi kullanıcı deneyimini belirler. "
+        "Yapılandırılmış loglar sorgulanabilirliği artırır. "
+        "Alarm eşikleri semptomlara, yani kullanıcıyı etkileyen hata ve gecikmeye göre kurulmalıdır."
+    ),
+    "resilience": (
+        "Circuit breaker, hata oranı eşiği aşan bir bağımlılığa yapılan çağrıları bir süre keser. "
+        "Açık durumdaki breaker belirli bir süre sonra yarı açık duruma geçip deneme istekleri gönderir. "
+        "Retry işlemleri üstel geri çekilme ve jitter ile yapılmalıdır, aksi halde senkron yeniden deneme fırtınası oluşur. "
+        "Timeout değerleri çağrı zinciri boyunca kalan süre bütçesine göre belirlenmelidir. "
+        "Bulkhead deseni kaynakları bölerek bir bağımlılıktaki sorunun tüm sistemi etkilemesini engeller. "
+        "Idempotent olmayan işlemlerde retry yapmadan önce idempotency anahtarı kullanılmalıdır."
+    ),
+    "kafka": (
+        "Kafka'da bir topic paralellik için partition'lara bölünür. "
+        "Aynı partition içindeki mesajların sırası korunur, partition'lar arasında sıra garantisi yoktur. "
+        "Consumer group içindeki her partition tek bir consumer tarafından okunur. "
+        "Bu yüzden bir consumer group'taki etkin consumer sayısı partition sayısını aşamaz. "
+        "Exactly-once semantiği idempotent producer ve transaction'lar ile sağlanır. "
+        "Mesaj saklama süresi retention ayarıyla belirlenir, mesajlar okunduktan sonra silinmez."
+    ),
+}
+
+# (soru, ilgili pasaj, referans cevap cümlesi)
+QUESTIONS = [
+    ("Cache stampede nedir ve nasıl önlenir?", "cache",
+     "Cache stampede, süresi dolan popüler bir anahtar için çok sayıda isteğin aynı anda veritabanına gitmesidir."),
+    ("Write-through önbellek stratejisi nasıl çalışır?", "cache",
+     "Write-through stratejisinde her yazma işlemi hem önbelleğe hem veritabanına aynı anda yapılır."),
+    ("Mikroservislerde dağıtık işlemler için hangi desen kullanılır?", "microservices",
+     "Dağıtık işlemlerde iki aşamalı commit yerine saga deseni tercih edilir."),
+    ("Servisler ortak veritabanı paylaşmalı mı?", "microservices",
+     "Her servis kendi veritabanına sahip olmalıdır, paylaşılan veritabanı servisler arasında sıkı bağ oluşturur."),
+    ("CQRS'te okuma modeli nasıl güncellenir?", "cqrs",
+     "Okuma modeli genellikle olaylar dinlenerek asenkron güncellenir, bu yüzden nihai tutarlılık kabul edilmelidir."),
+    ("When is CQRS unnecessary?", "cqrs",
+     "Basit CRUD uygulamalarında CQRS gereksiz karmaşıklık ekler."),
+    ("Neden ortalama gecikme yerine yüzdelikler izlenmeli?", "observability",
+     "Ortalama gecikme yerine p95 ve p99 gibi yüzdelikler izlenmelidir, çünkü kuyruk gecikmesi kullanıcı deneyimini belirler."),
+    ("RED yöntemi neyi izler?", "observability",
+     "RED yöntemi servisler için istek oranı, hata oranı ve süreyi izlemeyi önerir."),
+    ("Retry yaparken nelere dikkat etmeli?", "resilience",
+     "Retry işlemleri üstel geri çekilme ve jitter ile yapılmalıdır, aksi halde senkron yeniden deneme fırtınası oluşur."),
+    ("Circuit breaker yarı açık durumda ne yapar?", "resilience",
+     "Açık durumdaki breaker belirli bir süre sonra yarı açık duruma geçip deneme istekleri gönderir."),
+    ("Kafka consumer group'ta kaç consumer olabilir?", "kafka",
+     "Bu yüzden bir consumer group'taki etkin consumer sayısı partition sayısını aşamaz."),
+    ("Does Kafka keep message order across partitions?", "kafka",
+     "Aynı partition içindeki mesajların sırası korunur, partition'lar arasında sıra garantisi yoktur."),
+]
+
+
+def hashed_embeddings(texts, dim: int = 512):
+    """Karakter trigram'larının hash'lendiği deterministik sahte embedding"""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        text = f"  {text.lower()}  "
+        for i in range(len(text) - 2):
+            bucket = int(hashlib.md5(text[i:i + 3].encode()).hexdigest()[:8], 16) % dim
+            vectors[row, bucket] += 1.0
+    return vectors.tolist()
+
+
+def context_for(question_index: int):
+    """İlgili pasaj + sıradaki iki alakasız pasaj (retrieval sırası: ilgili en üstte)"""
+    _, topic, _ = QUESTIONS[question_index]
+    topics = list(PASSAGES)
+    others = [t for t in topics if t != topic]
+    distractors = [others[(question_index + i) % len(others)] for i in range(2)]
+    return [Passage(PASSAGES[t], t, "doc") for t in [topic, *distractors]]
+
+
+def evaluate(compressor, budget):
+    ratios, coverage, exact = [], [], []
+    for i, (question, _, gold) in enumerate(QUESTIONS):
+        passages = context_for(i)
+        full_tokens = sum(estimate_tokens(p.text) for p in passages)
+        if compressor is None:
+            kept = passages
+        else:
+            kept = compressor.compress(question, passages, token_budget=budget)
+        text = " ".join(p.text for p in kept)
+
+        ratios.append(sum(estimate_tokens(p.text) for p in kept) / full_tokens)
+        gold_terms = _terms(gold)
+        coverage.append(len(gold_terms & _terms(text)) / len(gold_terms))
+        exact.append(gold in text)
+    return statistics.mean(ratios), statistics.mean(coverage), sum(exact) / len(exact)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[30, 60, 120, 240])
+    parser.add_argument("--semantic-weight", type=float, default=0.7)
+    args = parser.parse_args()
+
+    full_tokens = statistics.mean(
+        sum(estimate_tokens(p.text) for p in context_for(i)) for i in range(len(QUESTIONS))
+    )
+    print(f"{len(QUESTIONS)} soru, soru başına ortalama tam bağlam ~{full_tokens:.0f} token\n")
+    print(f"{'strateji':<22}{'bütçe':>7}{'token oranı':>13}{'kapsama':>10}{'tam isabet':>12}")
+
+    ratio, cov, hit = evaluate(None, None)
+    print(f"{'tam bağlam':<22}{'-':>7}{ratio:>13.0%}{cov:>10.0%}{hit:>12.0%}")
+
+    # ratio=1, min_tokens=0: verilen bütçe oransal sınır olmadan aynen uygulanır
+    strategies = {
+        "kelime örtüşmesi": ContextCompressor(embed_fn=None, ratio=1.0, min_tokens=0),
+        "embedding + kelime": ContextCompressor(
+            embed_fn=hashed_embeddings, ratio=1.0, min_tokens=0, semantic_weight=args.semantic_weight
+        ),
+    }
+    for budget in args.budgets:
+        for name, compressor in strategies.items():
+            ratio, cov, hit = evaluate(compressor, budget)
+            print(f"{name:<22}{budget:>7}{ratio:>13.0%}{cov:>10.0%}{hit:>12.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+Benchmark: yönlendirme stratejilerinin doğruluk vs gecikme karşılaştırması
+
+Etiketli TR/EN mesaj seti (router_eval_set.jsonl: yazilim_mimarisi_50_soru.pdf soruları +
+web / rag / hybrid örnekleri) üzerinde her strateji için:
+- karışıklık matrisi (satır: beklenen, sütun: seçilen mod) ve doğruluk (toplam, TR, EN)
+- mesaj başına yönlendirme gecikmesi p50 / p99
+- mesaj başına upstream (LLM / embedding) çağrısı
+
+Stratejiler:
+- llm-route:   SemanticRouter.route() (ayrı yönlendirme çağrısı)
+- llm-single:  SemanticRouter.route_or_answer() (tek çağrı; chat'te süre yanıt üretimini de içerir)
+- keyword:     güncellik / doküman / karşılaştırma ipuçlarıyla regex sezgisi
+- speculation: speculation.predict_mode() tahmininin router olarak kullanılması
+- embedding:   mesaj embedding'ine en yakın etiket merkezi (leave-one-out)
+- cascade:     embedding kararı yeterince net değilse llm-route'a düşer
+
+LLM kullanan stratejiler (llm-route, llm-single, cascade) --live (gerçek Gemini, --record ile
+çıktılar kaydedilir) veya --replay (kayıttan offline) ister; bunlar olmadan sadece LLM'siz
+stratejiler çalışır. --simulate-llm etiketi bilen ve --llm-error-rate oranında yanılan sahte bir
+model kullanır: bu satırların doğruluğu ölçüm değil varsayımdır (≈ 1 - hata oranı) ve tabloda
+"*" ile işaretlenir; sadece gecikme / çağrı sayısı karşılaştırması için anlamlıdır.
+Embedding'ler deterministik trigram hash'idir; mesaj embedding'i yine de bir upstream çağrısı sayılır.
+
+Kullanım:
+    python benchmarks/bench_router_accuracy.py --show-errors
+    python benchmarks/bench_router_accuracy.py --live --record router_outputs.json
+    python benchmarks/bench_router_accuracy.py --replay router_outputs.json --strategies llm-route cascade
+    python benchmarks/bench_router_accuracy.py --simulate-llm --llm-error-rate 0.05
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from langchain_core.messages import AIMessage  # noqa: E402
+
+from bench_context_compression import hashed_embeddings  # noqa: E402
+from bench_single_call_routing import SYSTEM_PROMPT, percentile  # noqa: E402
+from semantic_router import ROUTES, SemanticRouter  # noqa: E402
+from speculation import DOCUMENT_CUES, RECENCY_CUES, predict_mode  # noqa: E402
+
+DEFAULT_DATASET = Path(__file__).resolve().parent / "router_eval_set.jsonl"
+
+STRATEGIES = ["llm-route", "llm-single", "keyword", "speculation", "embedding", "cascade"]
+# Kararı (kısmen) LLM'e bağlı stratejiler: doğrulukları sadece gerçek / kayıtlı LLM ile ölçülür
+LLM_STRATEGIES = {"llm-route", "llm-single", "cascade"}
+
+COMPARISON_CUES = re.compile(
+    r"(en iyi|karşılaştır|kıyasla|önerir misin|öneriler|\bbest\b|\bcompare\b|\brecommend)",
+    re.IGNORECASE,
+)
+
+
+def load_dataset(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def allowed_routes(has_document):
+    # Router doküman yokken rag / hybrid seçemez
+    return ROUTES if has_document else ["chat", "web_search"]
+
+
+def _message_of(prompt):
+    """LLM'e giden prompt'tan (tür, kullanıcı mesajı) çıkar"""
+    if isinstance(prompt, str):
+        return "route", prompt.split("MESAJ: ", 1)[1].split("\n", 1)[0]
+    return "route_or_answer", prompt[-1].content
+
+
+class SimulatedLLM:
+    """
+    Mesajın etiketini bilen, belirli oranda yanılan sahte LLM; gecikme uyumadan sanal saate eklenir.
+
+    Etiketi okuduğu için doğruluğu tanım gereği ~1 - hata oranıdır: sadece gecikme / çağrı modeli.
+    """
+
+    def __init__(self, labels, args):
+        self.labels = labels
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.calls = 0
+        self.virtual_seconds = 0.0
+
+    def _answer_label(self, message):
+        # Hata mesaja göre deterministik: iki LLM stratejisi aynı mesajlarda yanılır
+        rng = random.Random(f"{self.args.seed}:{message}")
+        label = self.labels[message]
+        if rng.random() < self.args.llm_error_rate:
+            return rng.choice([route for route in ROUTES if route != label])
+        return label
+
+    def _latency(self, output_tokens):
+        latency = self.args.ttft + output_tokens * self.args.per_token
+        latency *= self.rng.uniform(1 - self.args.jitter, 1 + self.args.jitter)
+        if self.rng.random() < self.args.tail_rate:
+            latency *= self.args.tail_factor
+        return latency
+
+    def invoke(self, prompt):
+        self.calls += 1
+        kind, message = _message_of(prompt)
+        label = self._answer_label(message)
+        if kind == "route":
+            self.virtual_seconds += self._latency(1)
+            return AIMessage(content=label)
+        if label != "chat":
+            self.virtual_seconds += self._latency(3)
+            return AIMessage(content=f"MODE: {label}")
+        self.virtual_seconds += self._latency(self.args.answer_tokens + 3)
+        return AIMessage(content="MODE: chat\n" + "yanıt " * self.args.answer_tokens)
+
+
+class RecordedLLM:
+    """--record ile kaydedilmiş çıktıları ve gecikmeleri tekrar oynatan LLM"""
+
+    def __init__(self, path):
+        with open(path, encoding="utf-8") as f:
+            self.records = json.load(f)
+        self.calls = 0
+        self.virtual_seconds = 0.0
+        self.missing = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        kind, message = _message_of(prompt)
+        record = self.records.get(kind, {}).get(message)
+        if record is None:
+            self.missing += 1
+            raise KeyError(f"Kayıt yok: {kind} / {message}")
+        self.virtual_seconds += record["latency"]
+        return AIMessage(content=record["content"])
+
+
+class RecordingLLM:
+    """Gerçek LLM çağrılarını geçirip çıktı + gecikmeyi kaydeden sarmalayıcı"""
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.records = defaultdict(dict)
+        self.calls = 0
+        self.virtual_seconds = 0.0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        kind, message = _message_of(prompt)
+        started = time.perf_counter()
+        result = self.llm.invoke(prompt)
+        self.records[kind][message] = {"content": result.content, "latency": time.perf_counter() - started}
+        return result
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.records, f, ensure_ascii=False, indent=1)
+
+
+def live_llm(model):
+    import os
+
+    from dotenv import load_dotenv
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    # Backend ile aynı .env (önce proje kökü, yoksa backend/)
+    root = Path(__file__).resolve().parent.parent
+    load_dotenv(root / ".env" if (root / ".env").exists() else root / "backend" / ".env", override=True)
+    api_key = (os.getenv("GOOGLE_API_KEY") or "").strip().strip("'").strip('"')
+    return ChatGoogleGenerativeAI(model=model, google_api_key=api_key, temperature=0.3)
+
+
+class SimulatedEmbedder:
+    """Mesaj embedding'ini upstream çağrısı olarak sayan, trigram hash'li embedder"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.virtual_seconds = 0.0
+
+    def embed(self, text):
+        self.calls += 1
+        self.virtual_seconds += self.latency
+        vector = np.asarray(hashed_embeddings([text])[0], dtype=np.float32)
+        return vector / max(np.linalg.norm(vector), 1e-12)
+
+
+class CentroidClassifier:
+    """Etiket merkezlerine kosinüs benzerliği; değerlendirilen mesaj kendi merkezinden çıkarılır"""
+
+    def __init__(self, dataset):
+        self.label_of = {item["text"]: item["label"] for item in dataset}
+        vectors = np.asarray(hashed_embeddings([item["text"] for item in dataset]), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        self.vectors = dict(zip(self.label_of, vectors))
+        self.sums = {route: np.zeros(vectors.shape[1], dtype=np.float32) for route in ROUTES}
+        self.counts = Counter()
+        for text, label in self.label_of.items():
+            self.sums[label] += self.vectors[text]
+            self.counts[label] += 1
+
+    def scores(self, vector, text, has_document):
+        """Aday mod -> benzerlik (leave-one-out merkezlerle)"""
+        own = self.label_of.get(text)
+        scores = {}
+        for route in allowed_routes(has_document):
+            total, count = self.sums[route], self.counts[route]
+            if route == own:
+                total, count = total - self.vectors[text], count - 1
+            if count:
+                centroid = total / count
+                scores[route] = float(vector @ centroid / max(np.linalg.norm(centroid), 1e-12))
+        return scores
+
+
+def build_strategies(names, dataset, args, llm):
+    classifier = CentroidClassifier(dataset)
+    embedder = SimulatedEmbedder(args.embed_latency)
+    router = SemanticRouter(llm)
+
+    def llm_route(text, has_document):
+        return router.route(text, has_document=has_document)
+
+    def llm_single(text, has_document):
+        return router.route_or_answer(text, [], SYSTEM_PROMPT, has_document=has_document)[0]
+
+    def keyword(text, has_document):
+        document = has_document and DOCUMENT_CUES.search(text)
+        recent = RECENCY_CUES.search(text) or COMPARISON_CUES.search(text)
+        if document and recent:
+            return "hybrid"
+        if document:
+            return "rag"
+        return "web_search" if recent else "chat"
+
+    def speculation(text, has_document):
+        return predict_mode(text, has_document) or "chat"
+
+    def embedding(text, has_document):
+        scores = classifier.scores(embedder.embed(text), text, has_document)
+        return max(scores, key=scores.get)
+
+    def cascade(text, has_document):
+        scores = classifier.scores(embedder.embed(text), text, has_document)
+        best, second = sorted(scores.values(), reverse=True)[:2]
+        if best - second >= args.cascade_margin:
+            return max(scores, key=scores.get)
+        return router.route(text, has_document=has_document)
+
+    available = {
+        "llm-route": (llm_route, [llm]),
+        "llm-single": (llm_single, [llm]),
+        "keyword": (keyword, []),
+        "speculation": (speculation, []),
+        "embedding": (embedding, [embedder]),
+        "cascade": (cascade, [embedder, llm]),
+    }
+    return {name: available[name] for name in names}
+
+
+def evaluate(route_fn, meters, dataset):
+    """Her mesajı yönlendir; (tahminler, gecikmeler, upstream çağrı sayısı) döndür"""
+    predictions, latencies = [], []
+    calls_before = sum(meter.calls for meter in meters)
+    for item in dataset:
+        virtual_before = sum(meter.virtual_seconds for meter in meters)
+        started = time.perf_counter()
+        predictions.append(route_fn(item["text"], item["has_document"]))
+        local = time.perf_counter() - started
+        latencies.append(local + sum(meter.virtual_seconds for meter in meters) - virtual_before)
+    calls = sum(meter.calls for meter in meters) - calls_before
+    return predictions, latencies, calls
+
+
+def accuracy(dataset, predictions, lang=None):
+    pairs = [(item["label"], pred) for item, pred in zip(dataset, predictions) if lang in (None, item["lang"])]
+    return sum(gold == pred for gold, pred in pairs) / len(pairs) if pairs else float("nan")
+
+
+def print_confusion(name, dataset, predictions):
+    matrix = Counter((item["label"], pred) for item, pred in zip(dataset, predictions))
+    print(f"[{name}] satır: beklenen, sütun: seçilen")
+    print(f"{'':<12}" + "".join(f"{route:>12}" for route in ROUTES) + f"{'recall':>9}")
+    for gold in ROUTES:
+        row = [matrix[(gold, pred)] for pred in ROUTES]
+        recall = matrix[(gold, gold)] / sum(row) if sum(row) else float("nan")
+        print(f"{gold:<12}" + "".join(f"{count:>12}" for count in row) + f"{recall:>9.0%}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=str(DEFAULT_DATASET))
+    parser.add_argument(
+        "--strategies", nargs="+", choices=STRATEGIES,
+        help="Varsayılan: LLM varsa hepsi, yoksa LLM'siz stratejiler",
+    )
+    parser.add_argument(
+        "--simulate-llm", action="store_true",
+        help="Kayıt / canlı model olmadan sahte LLM kullan (LLM satırlarının doğruluğu varsayımdır)",
+    )
+    parser.add_argument("--llm-error-rate", type=float, default=0.05, help="Sahte LLM'in yanlış mod seçme oranı")
+    parser.add_argument("--ttft", type=float, default=0.35, help="İlk token gecikmesi (sn)")
+    parser.add_argument("--per-token", type=float, default=0.002, help="Çıktı token'ı başına süre (sn)")
+    parser.add_argument("--answer-tokens", type=int, default=150)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--tail-rate", type=float, default=0.02, help="Kuyruk gecikmesi yaşayan çağrı oranı")
+    parser.add_argument("--tail-factor", type=float, default=4.0)
+    parser.add_argument("--embed-latency", type=float, default=0.08, help="Mesaj embedding çağrısı süresi (sn)")
+    parser.add_argument("--cascade-margin", type=float, default=0.05, help="Embedding kararı için min. skor farkı")
+    parser.add_argument("--live", action="store_true", help="Gerçek Gemini modelini çağır")
+    parser.add_argument("--model", default="gemini-2.5-flash-lite", help="--live için model adı")
+    parser.add_argument("--record", help="--live çıktılarını bu JSON dosyasına kaydet")
+    parser.add_argument("--replay", help="Kaydedilmiş LLM çıktılarıyla offline çalış")
+    parser.add_argument("--show-errors", action="store_true", help="Yanlış yönlendirilen mesajları listele")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    measured_llm = bool(args.replay or args.live)
+    if args.strategies is None:
+        args.strategies = [
+            name for name in STRATEGIES if measured_llm or args.simulate_llm or name not in LLM_STRATEGIES
+        ]
+    needs_llm = LLM_STRATEGIES.intersection(args.strategies)
+    if needs_llm and not measured_llm and not args.simulate_llm:
+        parser.error(
+            f"{', '.join(sorted(needs_llm))} için --replay veya --live gerekir "
+            "(sahte LLM etiketi okur; yine de istiyorsanız --simulate-llm)"
+        )
+
+    dataset = load_dataset(args.dataset)
+    labels = {item["text"]: item["label"] for item in dataset}
+    if args.replay:
+        llm = RecordedLLM(args.replay)
+    elif args.live:
+        llm = RecordingLLM(live_llm(args.model))
+    else:
+        llm = SimulatedLLM(labels, args)
+    # Sahte LLM'le çalışan LLM stratejilerinin doğruluğu ölçülmez, varsayılır
+    assumed = set() if measured_llm else needs_llm
+
+    counts = Counter(item["label"] for item in dataset)
+    print(f"{len(dataset)} mesaj: " + ", ".join(f"{route} {counts[route]}" for route in ROUTES))
+    if measured_llm:
+        print(f"LLM: {'kayıt ' + args.replay if args.replay else 'canlı'}\n")
+    elif needs_llm:
+        print(f"LLM: sahte (hata oranı {args.llm_error_rate:.0%}) - LLM satırlarının doğruluğu varsayımdır\n")
+    else:
+        print("LLM: yok - LLM stratejileri için --replay / --live (veya --simulate-llm)\n")
+
+    rows = []
+    for name, (route_fn, meters) in build_strategies(args.strategies, dataset, args, llm).items():
+        predictions, latencies, calls = evaluate(route_fn, meters, dataset)
+        print_confusion(name, dataset, predictions)
+        if args.show_errors:
+            for item, pred in zip(dataset, predictions):
+                if pred != item["label"]:
+                    print(f"  {item['label']:>10} -> {pred:<10} doc={item['has_document']!s:<5} {item['text']}")
+            print()
+        rows.append((name, predictions, latencies, calls))
+
+    print(f"{'strateji':<13}{'doğruluk':>10}{'TR':>7}{'EN':>7}{'p50 (ms)':>10}{'p99 (ms)':>10}{'çağrı/mesaj':>13}")
+    for name, predictions, latencies, calls in rows:
+        label = f"{name}*" if name in assumed else name
+        print(
+            f"{label:<13}{accuracy(dataset, predictions):>10.1%}{accuracy(dataset, predictions, 'tr'):>7.0%}"
+            f"{accuracy(dataset, predictions, 'en'):>7.0%}{percentile(latencies, 0.5) * 1000:>10.1f}"
+            f"{percentile(latencies, 0.99) * 1000:>10.1f}{calls / len(dataset):>13.2f}"
+        )
+    if assumed:
+        print(
+            "\n* Varsayım, ölçüm değil: sahte LLM etiketi okur, doğruluk ~1 - --llm-error-rate "
+            "(cascade'de LLM'e düşen mesajlar için). Gerçek doğruluk için --live / --replay."
+        )
+    if "llm-single" in args.strategies:
+        print("\nNot: llm-single süresi chat mesajlarında yanıt üretimini de içerir (ayrı yanıt çağrısı gerekmez).")
+    if isinstance(llm, RecordedLLM) and llm.missing:
+        print(f"\nUyarı: {llm.missing} çağrının kaydı yoktu (router bu mesajları chat'e yönlendirdi).")
+    if isinstance(llm, RecordingLLM) and args.record:
+        llm.save(args.record)
+        print(f"\nLLM çıktıları kaydedildi: {args.record}")
+
+
+if __name__ == "__main__":
+    main()
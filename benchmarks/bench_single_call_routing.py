@@ -0,0 +1,156 @@
+"""
+Benchmark: iki çağrılı (route + answer) akış vs tek çağrılı optimistic routing
+
+Gerçekçi gecikmeli sahte bir LLM ile /smart_chat'in chat yolunu simüle eder:
+- İlk token gecikmesi (TTFT) + çıktı token'ı başına üretim süresi
+- Mesajların çoğunluğu chat, bir kısmı web_search / rag
+
+Kullanım:
+    python benchmarks/bench_single_call_routing.py --requests 200 --chat-ratio 0.8
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from langchain_core.messages import AIMessage  # noqa: E402
+
+from semantic_router import SemanticRouter  # noqa: E402
+
+SYSTEM_PROMPT = "Sen deneyimli bir Yazılım Mimarı Asistanısın."
+
+MESSAGES = {
+    "chat": [
+        "SOLID prensiplerini açıklar mısın?",
+        "Observer deseni ne zaman kullanılır?",
+        "Mikroservis ve monolit arasındaki trade-off'lar neler?",
+        "CQRS nedir, bir örnekle anlatır mısın?",
+    ],
+    "web_search": [
+        "Kafka'nın en son sürümünde neler değişti?",
+        "2025'te en popüler backend framework'ü hangisi?",
+    ],
+    "rag": [
+        "Yüklediğim dokümanda cache stratejisi nasıl anlatılıyor?",
+    ],
+}
+
+
+class FakeLLM:
+    """TTFT + token başına süre ile uyuyan, mesajın etiketini bilen sahte LLM"""
+
+    def __init__(self, labels: dict, ttft: float, per_token: float, answer_tokens: int, jitter: float, seed: int):
+        self.labels = labels
+        self.ttft = ttft
+        self.per_token = per_token
+        self.answer_tokens = answer_tokens
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def _sleep(self, output_tokens: int) -> None:
+        latency = (self.ttft + output_tokens * self.per_token) * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+        time.sleep(latency)
+
+    def _label_of(self, text: str) -> str:
+        for message, label in self.labels.items():
+            if message in text:
+                return label
+        return "chat"
+
+    def invoke(self, prompt):
+        self.calls += 1
+        if isinstance(prompt, str):
+            label = self._label_of(prompt)
+            if "SADECE şu kelimelerden" in prompt:
+                # Sadece yönlendirme çağrısı: tek token çıktı
+                self._sleep(1)
+                return AIMessage(content=label)
+            self._sleep(self.answer_tokens)
+            return AIMessage(content="yanıt " * self.answer_tokens)
+
+        # Mesaj listesi: optimistic prompt veya history'li chat
+        label = self._label_of(prompt[-1].content)
+        if "MODE:" in prompt[0].content:
+            if label != "chat":
+                self._sleep(3)
+                return AIMessage(content=f"MODE: {label}")
+            self._sleep(self.answer_tokens + 3)
+            return AIMessage(content="MODE: chat\n" + "yanıt " * self.answer_tokens)
+        self._sleep(self.answer_tokens)
+        return AIMessage(content="yanıt " * self.answer_tokens)
+
+
+def two_call_flow(router: SemanticRouter, llm: FakeLLM, message: str) -> str:
+    """Mevcut akış: route() + moda göre ikinci çağrı"""
+    mode = router.route(message, has_document=True)
+    llm.invoke(f"{SYSTEM_PROMPT}\n{message}")
+    return mode
+
+
+def single_call_flow(router: SemanticRouter, llm: FakeLLM, message: str) -> str:
+    """Optimistic akış: route_or_answer(), sadece chat dışı mesajlarda ikinci çağrı"""
+    mode, answer = router.route_or_answer(message, [], SYSTEM_PROMPT, has_document=True)
+    if answer is None:
+        llm.invoke(f"{SYSTEM_PROMPT}\n{message}")
+    return mode
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run(flow, args, workload, labels):
+    llm = FakeLLM(labels, args.ttft, args.per_token, args.answer_tokens, args.jitter, args.seed)
+    router = SemanticRouter(llm)
+    latencies = []
+    for message, _ in workload:
+        started = time.perf_counter()
+        flow(router, llm, message)
+        latencies.append(time.perf_counter() - started)
+    return latencies, llm.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--chat-ratio", type=float, default=0.8)
+    parser.add_argument("--ttft", type=float, default=0.35, help="İlk token gecikmesi (sn)")
+    parser.add_argument("--per-token", type=float, default=0.002, help="Çıktı token'ı başına süre (sn)")
+    parser.add_argument("--answer-tokens", type=int, default=150)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    labels = {m: label for label, messages in MESSAGES.items() for m in messages}
+    non_chat = MESSAGES["web_search"] + MESSAGES["rag"]
+    workload = []
+    for _ in range(args.requests):
+        message = rng.choice(MESSAGES["chat"]) if rng.random() < args.chat_ratio else rng.choice(non_chat)
+        workload.append((message, labels[message]))
+
+    print(f"{args.requests} istek, chat oranı {args.chat_ratio:.0%}\n")
+    print(f"{'akış':<14}{'p50 (ms)':>10}{'p95 (ms)':>10}{'ort (ms)':>10}{'çağrı/istek':>13}")
+
+    results = {}
+    for name, flow in (("iki çağrı", two_call_flow), ("tek çağrı", single_call_flow)):
+        latencies, calls = run(flow, args, workload, labels)
+        results[name] = latencies
+        print(
+            f"{name:<14}{percentile(latencies, 0.5) * 1000:>10.0f}{percentile(latencies, 0.95) * 1000:>10.0f}"
+            f"{statistics.mean(latencies) * 1000:>10.0f}{calls / len(workload):>13.2f}"
+        )
+
+    saved = 1 - percentile(results["tek çağrı"], 0.5) / percentile(results["iki çağrı"], 0.5)
+    print(f"\nMedyan gecikmede kazanç: {saved:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark: uzun sohbette Streamlit rerun süresi (mesaj sayfalama + cache'li geçmiş)
+
+app_streamlit.py, Streamlit'in AppTest'i ile tarayıcısız çalıştırılır. Session'a N mesaj
+yüklenir ve her tuş vuruşu / buton tıklamasının tetiklediği tam rerun'un süresi ölçülür:
+- tüm mesajlar: MESSAGES_PAGE_SIZE=0 (her mesaj ayrı chat_message olarak çizilir)
+- sayfalı: MESSAGES_PAGE_SIZE=40 (sadece son sayfa tek tek çizilir)
+- sayfalı + geçmiş açık: eski sayfalar cache'li tek markdown bloğu olarak çizilir
+
+Backend'e istek atılmaz (chat_input boş kaldığı için).
+
+Kullanım:
+    python benchmarks/bench_streamlit_rerun.py --messages 500 --reruns 20
+"""
+
+import argparse
+import os
+import statistics
+import time
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest
+
+APP = str(Path(__file__).resolve().parent.parent / "frontend" / "app_streamlit.py")
+
+ANSWER = (
+    "Mikroservis mimarisinde **her servis kendi verisine** sahip olmalıdır.\n\n"
+    "- Servisler arası iletişim: REST, gRPC veya mesajlaşma\n"
+    "- Dağıtık işlemler için saga deseni\n\n"
+    "```python\nclass OrderService:\n    def place(self, order):\n        ...\n```"
+)
+
+
+def make_messages(count: int):
+    messages = []
+    for i in range(count):
+        if i % 2 == 0:
+            messages.append({"role": "user", "content": f"Soru {i}: mikroservislerde veri nasıl yönetilir?"})
+        else:
+            messages.append({"role": "assistant", "content": ANSWER, "mode": ("chat", "rag", "web_search")[i % 3]})
+    return messages
+
+
+def measure(page_size: int, messages, reruns: int, history_pages: int = 0):
+    os.environ["MESSAGES_PAGE_SIZE"] = str(page_size)
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.session_state["messages"] = list(messages)
+    at.session_state["history_pages"] = history_pages
+    at.run()  # ısınma: import, CSS, cache'ler
+
+    timings = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        at.run()
+        timings.append(time.perf_counter() - started)
+    elements = len(at.markdown)
+    return timings, elements
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=40)
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages)
+    scenarios = [
+        ("tüm mesajlar", 0, 0),
+        ("sayfalı", args.page_size, 0),
+        ("sayfalı + geçmiş açık", args.page_size, args.messages),
+    ]
+
+    print(f"{args.messages} mesaj, {args.reruns} rerun\n")
+    print(f"{'senaryo':<24}{'p50 (ms)':>10}{'p95 (ms)':>10}{'ort (ms)':>10}{'markdown eleman':>18}")
+    for name, page_size, history_pages in scenarios:
+        timings, elements = measure(page_size, messages, args.reruns, history_pages)
+        print(
+            f"{name:<24}{percentile(timings, 0.5) * 1000:>10.1f}{percentile(timings, 0.95) * 1000:>10.1f}"
+            f"{statistics.mean(timings) * 1000:>10.1f}{elements:>18}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,28 @@
+import os
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+import time
 import uuid
 
 # API URL
 SMART_API_URL = "http://localhost:8000/smart_chat"
 RAG_UPLOAD_URL = "http://localhost:8000/rag/upload"
+UPLOAD_MAX_RETRIES = 5
+
+# Uzun sohbetlerde sadece son sayfa tek tek çizilir (0: tüm mesajlar tek tek)
+MESSAGES_PAGE_SIZE = int(os.getenv("MESSAGES_PAGE_SIZE", "40"))
+
+
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """Rerun'lar ve tarayıcı oturumları arasında paylaşılan keep-alive bağlantı havuzu"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 
 # Page config
 st.set_page_config(
@@ -136,6 +154,12 @@ st.markdown("""
         border: 1px solid rgba(72, 187, 120, 0.2);
     }
     
+    .mode-hybrid {
+        background: rgba(128, 90, 213, 0.12);
+        color: #805ad5;
+        border: 1px solid rgba(128, 90, 213, 0.2);
+    }
+    
     /* File indicator */
     .file-indicator {
         background: rgba(72, 187, 120, 0.08);
@@ -245,6 +269,74 @@ if "force_mode" not in st.session_state:
     st.session_state.force_mode = None
 if "show_settings" not in st.session_state:
     st.session_state.show_settings = False
+if "history_pages" not in st.session_state:
+    st.session_state.history_pages = 0
+
+http = get_http_session()
+
+def upload_in_parts(uploaded_file, progress):
+    """Dosyayı parça parça gönder; bağlantı koparsa sunucudaki offset'ten devam et"""
+    # Aynı dosya için yarım kalmış yükleme varsa ona devam edilir
+    key = f"{uploaded_file.name}:{uploaded_file.size}"
+    pending = st.session_state.setdefault("pending_uploads", {})
+    upload = None
+    if key in pending:
+        response = http.get(f"{RAG_UPLOAD_URL}/{pending[key]}", timeout=10)
+        if response.status_code == 200:
+            upload = response.json()
+    if upload is None:
+        response = http.post(
+            f"{RAG_UPLOAD_URL}/init",
+            json={
+                "session_id": st.session_state.session_id,
+                "file_name": uploaded_file.name,
+                "total_size": uploaded_file.size
+            },
+            timeout=10
+        )
+        if response.status_code != 200:
+            return response
+        upload = response.json()
+        pending[key] = upload["upload_id"]
+    
+    upload_url = f"{RAG_UPLOAD_URL}/{upload['upload_id']}"
+    offset, total = upload["received"], upload["total_size"]
+    failures = 0
+    while offset < total:
+        progress.progress(offset / total, text=f"📤 {offset * 100 // total}% gönderildi")
+        uploaded_file.seek(offset)
+        part = uploaded_file.read(upload["part_size"])
+        try:
+            response = http.put(
+                upload_url,
+                params={"offset": offset},
+                files={"part": (uploaded_file.name, part)},
+                timeout=60
+            )
+        except requests.exceptions.RequestException:
+            response = None
+        
+        if response is not None and response.status_code in (200, 409):
+            # 409: sunucu farklı bir offset bekliyor, oradan devam
+            offset = response.json()["received"]
+            failures = 0
+            continue
+        
+        failures += 1
+        if failures > UPLOAD_MAX_RETRIES:
+            raise requests.exceptions.ConnectionError("Yükleme yarıda kaldı")
+        time.sleep(min(2 ** failures, 10))
+        try:
+            offset = http.get(upload_url, timeout=10).json()["received"]
+        except (requests.exceptions.RequestException, ValueError, KeyError):
+            pass
+    
+    progress.progress(1.0, text="⚙️ Doküman işleniyor...")
+    response = http.post(f"{upload_url}/finalize", timeout=300)
+    if response.status_code != 429:
+        # 429'da dosya sunucuda kalır, tekrar denemede sadece finalize yapılır
+        pending.pop(key, None)
+    return response
 
 # File upload dialog - separate function
 @st.dialog("📁 Dosya Yükle")
@@ -258,14 +350,13 @@ def show_upload_dialog():
     )
     
     if uploaded_file is not None:
-        with st.spinner("📤 Dosya işleniyor..."):
-            files = {"file": (uploaded_file.name, uploaded_file.getvalue())}
-            response = requests.post(
-                f"{RAG_UPLOAD_URL}?session_id={st.session_state.session_id}",
-                files=files
-            )
-            
-            if response.status_code == 200:
+        progress = st.progress(0.0, text="📤 Dosya gönderiliyor...")
+        try:
+            response = upload_in_parts(uploaded_file, progress)
+        except requests.exceptions.RequestException:
+            st.error("🔌 Bağlantı koptu, tekrar denediğinizde yükleme kaldığı yerden devam edecek.")
+        else:
+            if response.status_code == 200 and response.json()["status"] == "success":
                 result = response.json()
                 st.session_state.uploaded_file_name = uploaded_file.name
                 st.session_state.messages.append({
@@ -274,6 +365,9 @@ def show_upload_dialog():
                     "mode": "rag"
                 })
                 st.rerun()
+            elif response.status_code == 429:
+                retry_after = response.headers.get("Retry-After", "birkaç")
+                st.warning(f"⏳ Sunucu yoğun, {retry_after} sn sonra tekrar deneyin.")
             else:
                 st.error("❌ Dosya yüklenirken hata oluştu!")
     
@@ -318,7 +412,8 @@ if st.session_state.show_settings:
         "🤖 Otomatik": None,
         "💬 Chat": "chat",
         "🌐 Web Search": "web_search",
-        "📄 RAG": "rag"
+        "📄 RAG": "rag",
+        "🔀 Hybrid": "hybrid"
     }
     selected = st.radio(
         "Yanıt modu:",
@@ -338,16 +433,57 @@ def get_mode_badge(mode):
     return {
         "chat": '<span class="mode-badge mode-chat">💬 Chat</span>',
         "web_search": '<span class="mode-badge mode-web">🌐 Web</span>',
-        "rag": '<span class="mode-badge mode-rag">📄 RAG</span>'
+        "rag": '<span class="mode-badge mode-rag">📄 RAG</span>',
+        "hybrid": '<span class="mode-badge mode-hybrid">🔀 Hybrid</span>'
     }.get(mode, "")
 
-# Display messages
-for msg in st.session_state.messages:
+MODE_LABELS = {"chat": "💬 Chat", "web_search": "🌐 Web", "rag": "📄 RAG", "hybrid": "🔀 Hybrid"}
+
+
+@st.cache_data(max_entries=500, show_spinner=False)
+def render_history_page(messages: tuple) -> str:
+    """Eski bir mesaj sayfasını tek markdown bloğuna çevir (sayfa değişmediği için cache'ten gelir)"""
+    parts = []
+    for role, content, mode in messages:
+        header = "**👤 Sen**" if role == "user" else f"**🧠 Asistan** · {MODE_LABELS.get(mode, '')}"
+        parts.append(f"{header}\n\n{content}")
+    return "\n\n---\n\n".join(parts)
+
+
+def render_message(msg):
     with st.chat_message(msg["role"], avatar="🧠" if msg["role"] == "assistant" else "👤"):
         if msg["role"] == "assistant" and "mode" in msg:
             st.markdown(get_mode_badge(msg["mode"]), unsafe_allow_html=True)
         st.markdown(msg["content"])
 
+
+# Display messages
+messages = st.session_state.messages
+live_start = 0
+if MESSAGES_PAGE_SIZE and len(messages) >= 2 * MESSAGES_PAGE_SIZE:
+    # Sayfalar sabit indeks aralıklarıdır, yeni mesaj gelince eski sayfaların cache'i bozulmaz
+    live_start = (len(messages) - MESSAGES_PAGE_SIZE) // MESSAGES_PAGE_SIZE * MESSAGES_PAGE_SIZE
+    older_pages = live_start // MESSAGES_PAGE_SIZE
+    shown_pages = min(st.session_state.history_pages, older_pages)
+    
+    if shown_pages < older_pages:
+        hidden = live_start - shown_pages * MESSAGES_PAGE_SIZE
+        if st.button(f"⬆️ Daha eski mesajlar ({hidden})", use_container_width=True, key="older_btn"):
+            st.session_state.history_pages += 1
+            st.rerun()
+    
+    for page in range(older_pages - shown_pages, older_pages):
+        start = page * MESSAGES_PAGE_SIZE
+        page_messages = tuple(
+            (m["role"], m["content"], m.get("mode"))
+            for m in messages[start:start + MESSAGES_PAGE_SIZE]
+        )
+        with st.container(border=True):
+            st.markdown(render_history_page(page_messages))
+
+for msg in messages[live_start:]:
+    render_message(msg)
+
 # Chat input
 user_input = st.chat_input("Mesajınızı yazın...")
 
@@ -366,7 +502,13 @@ if user_input:
     with st.chat_message("assistant", avatar="🧠"):
         with st.spinner(""):
             try:
-                response = requests.post(SMART_API_URL, json=payload, timeout=120)
+                # Sunucu, kendi deadline'ını istemci timeout'undan önce bitirecek şekilde ayarlar
+                response = http.post(
+                    SMART_API_URL,
+                    json=payload,
+                    headers={"X-Request-Timeout": "110"},
+                    timeout=120
+                )
                 
                 if response.status_code == 200:
                     result = response.json()
@@ -381,6 +523,11 @@ if user_input:
                         "content": answer,
                         "mode": mode
                     })
+                elif response.status_code == 429:
+                    retry_after = response.headers.get("Retry-After", "birkaç")
+                    st.warning(f"⏳ Sunucu yoğun, {retry_after} sn sonra tekrar deneyin.")
+                elif response.status_code in (503, 504):
+                    st.warning("⏳ Yanıt zamanında üretilemedi, lütfen tekrar deneyin.")
                 else:
                     st.error(f"❌ API hatası: {response.status_code}")
             except requests.exceptions.Timeout:
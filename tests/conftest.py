@@ -0,0 +1,19 @@
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Backend modülleri düz import ile kullanılır (uvicorn'un backend/ içinden çalıştırılması gibi)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture(scope="session")
+def main(tmp_path_factory):
+    """backend/main.py - sahte API anahtarı ve geçici veri dizinleriyle"""
+    directory = tmp_path_factory.mktemp("app")
+    os.environ.setdefault("GOOGLE_API_KEY", "test")
+    for name in ("UPLOAD_DIR", "WEB_INDEX_DIR", "PROFILE_DIR"):
+        os.environ[name] = str(directory / name.lower())
+    return importlib.import_module("main")
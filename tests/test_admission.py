@@ -0,0 +1,108 @@
+"""PriorityLimiter - öncelik sırası, toplu işlerin kuyruk payı, bekleme süresi ve uçtan uca 429 + Retry-After"""
+
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from admission import BULK, INTERACTIVE, PriorityLimiter, UpstreamBusyError, request_priority
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "koşul zamanında sağlanmadı"
+        time.sleep(0.005)
+
+
+def start_waiter(limiter, priority, admitted, name):
+    def run():
+        limiter.acquire(priority=priority)
+        admitted.append(name)
+        limiter.release()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_interactive_waiters_are_admitted_before_bulk():
+    limiter = PriorityLimiter("stub", max_concurrency=1, max_queue=10, max_wait=5)
+    limiter.acquire()
+    admitted = []
+
+    # Toplu işler önce kuyruğa girse de interaktif istekler öne geçer
+    threads = [start_waiter(limiter, BULK, admitted, f"bulk-{i}") for i in range(2)]
+    wait_until(lambda: limiter.stats()["queued"] == 2)
+    threads += [start_waiter(limiter, INTERACTIVE, admitted, f"chat-{i}") for i in range(2)]
+    wait_until(lambda: limiter.stats()["queued"] == 4)
+
+    limiter.release()
+    for thread in threads:
+        thread.join()
+
+    assert admitted == ["chat-0", "chat-1", "bulk-0", "bulk-1"]
+
+
+def test_bulk_share_keeps_room_for_interactive_requests():
+    limiter = PriorityLimiter("stub", max_concurrency=1, max_queue=4, max_wait=5, bulk_queue_share=0.5)
+    limiter.acquire()
+    admitted = []
+    threads = [start_waiter(limiter, BULK, admitted, f"bulk-{i}") for i in range(2)]
+    wait_until(lambda: limiter.stats()["queued"] == 2)
+
+    # Toplu pay (4 * 0.5) dolu: yeni yükleme hemen reddedilir, interaktif istek yine kuyruğa girer
+    with pytest.raises(UpstreamBusyError) as error:
+        limiter.acquire(priority=BULK)
+    assert error.value.retry_after >= 1
+    threads.append(start_waiter(limiter, INTERACTIVE, admitted, "chat"))
+    wait_until(lambda: limiter.stats()["queued"] == 3)
+
+    limiter.release()
+    for thread in threads:
+        thread.join()
+    assert admitted[0] == "chat" and len(admitted) == 3
+
+
+def test_full_queue_and_wait_timeout_reject_without_leaking_waiters():
+    limiter = PriorityLimiter("stub", max_concurrency=1, max_queue=1, max_wait=0.05)
+    limiter.acquire()
+
+    started = time.monotonic()
+    with pytest.raises(UpstreamBusyError):
+        limiter.acquire()
+    assert time.monotonic() - started >= 0.05
+    assert limiter.stats() == {"active": 1, "queued": 0, "max_concurrency": 1, "max_queue": 1}
+
+    limiter.release()
+    with limiter.slot():
+        assert limiter.stats()["active"] == 1
+    assert limiter.stats()["active"] == 0
+
+
+def test_request_priority_sets_default_priority():
+    limiter = PriorityLimiter("stub", max_concurrency=1, max_queue=2, max_wait=5, bulk_queue_share=0)
+    limiter.acquire()
+
+    # bulk_queue_share=0: toplu öncelikli bir çağrı hiç kuyruğa giremez
+    with request_priority(BULK), pytest.raises(UpstreamBusyError):
+        limiter.acquire()
+    limiter.release()
+
+
+def test_saturated_upstream_returns_429_with_retry_after(main, monkeypatch):
+    limiter = main.upstream_limiters["llm"]
+    monkeypatch.setattr(limiter, "max_queue", 0)
+    for _ in range(limiter.max_concurrency):
+        limiter.acquire()
+    try:
+        response = TestClient(main.app).post("/chat", json={"session_id": "busy", "message": "merhaba"})
+    finally:
+        for _ in range(limiter.max_concurrency):
+            limiter.release()
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.json()["upstream"] == "llm"
+    assert main.get_history("busy").messages == []
@@ -0,0 +1,157 @@
+"""ChunkMetadataTable / filtered_search ve /rag/query, /smart_chat filtreleri; aynı session'a eşzamanlı yükleme"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage
+
+from chunk_metadata import ChunkMetadataTable, filtered_search
+from embedding_ingest import AIMDController, ParallelEmbedder
+
+# (metin, doc_id, dosya, sayfa, bölüm) - vektörler birbirine yakın, en yakını hep "a-1"
+CHUNKS = [
+    ("a-1", "docA", "a.pdf", 1, 0),
+    ("a-2", "docA", "a.pdf", 2, 0),
+    ("a-5", "docA", "a.pdf", 5, 1),
+    ("b-1", "docB", "b.txt", 1, 2),
+    ("b-3", "docB", "b.txt", 3, 2),
+]
+
+
+def vector(i):
+    return [1.0, 0.1 * i, 0.0]
+
+
+QUERY = vector(0)
+
+
+def build_store():
+    pairs = [(text, vector(i)) for i, (text, *_) in enumerate(CHUNKS)]
+    metadatas = [
+        {"doc_id": doc_id, "file_name": name, "page": page, "section": section, "offset": 0}
+        for _, doc_id, name, page, section in CHUNKS
+    ]
+    return FAISS.from_embeddings(pairs, embedding=None, metadatas=metadatas)
+
+
+def texts(docs):
+    return [doc.page_content for doc in docs]
+
+
+@pytest.fixture
+def store():
+    return build_store()
+
+
+def test_mask_combines_document_page_and_section_filters(store):
+    table = ChunkMetadataTable.from_faiss(store)
+
+    assert table.mask().all()
+    assert table.mask(doc_ids=["docB"]).tolist() == [False, False, False, True, True]
+    assert table.mask(file_names=["a.pdf"], page_from=2).tolist() == [False, True, True, False, False]
+    assert table.mask(page_to=1).tolist() == [True, False, False, True, False]
+    assert table.mask(sections=[1, 2], page_from=2, page_to=3).tolist() == [False, False, False, False, True]
+    assert not table.mask(doc_ids=["yok"]).any()
+
+
+def test_filtered_search_only_returns_allowed_rows(store):
+    table = ChunkMetadataTable.from_faiss(store)
+
+    # En yakın chunk (a-1) filtre dışında: arama öncesi elenir, sonuç yine k tane
+    docs = filtered_search(store, QUERY, table.rows(doc_ids=["docB"]), k=2)
+
+    assert sorted(texts(docs)) == ["b-1", "b-3"]
+    assert filtered_search(store, QUERY, np.array([], dtype=np.int64)) == []
+
+
+class QueryEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [QUERY for _ in texts]
+
+    def embed_query(self, text):
+        return QUERY
+
+
+@pytest.fixture
+def client(main, monkeypatch):
+    monkeypatch.setattr(main, "embeddings", QueryEmbeddings())
+    monkeypatch.setattr(main, "invoke_llm", lambda prompt: AIMessage(content="yanıt"))
+    monkeypatch.setattr(main, "compress_passages", lambda question, passages, token_budget=None: passages)
+    return TestClient(main.app)
+
+
+def test_rag_query_applies_filters_without_a_stored_table(main, client):
+    # Tablosu olmayan (eski / süresi dolmuş) session: filtre yine uygulanmalı
+    main._faiss_stores.put("filter-rag", build_store())
+
+    response = client.post(
+        "/rag/query", json={"session_id": "filter-rag", "message": "soru", "filters": {"doc_ids": ["docB"]}}
+    )
+
+    assert {ref["doc_id"] for ref in response.json()["source_refs"]} == {"docB"}
+
+
+def test_smart_chat_rag_applies_page_filter(main, client):
+    main._faiss_stores.put("filter-smart", build_store())
+
+    response = client.post(
+        "/smart_chat",
+        json={
+            "session_id": "filter-smart", "message": "soru", "force_mode": "rag",
+            "filters": {"file_names": ["a.pdf"], "page_from": 2},
+        },
+    )
+
+    assert sorted(ref["excerpt"][:3] for ref in response.json()["source_refs"]) == ["a-2", "a-5"]
+
+
+def test_stale_table_is_rebuilt_before_filtering(main, store, monkeypatch):
+    monkeypatch.setattr(main, "embeddings", QueryEmbeddings())
+    # Tablo store'un gerisinde (yeni doküman henüz tabloya yazılmamış)
+    stale = ChunkMetadataTable.from_faiss(build_store())
+    store.add_embeddings([("c-1", vector(9))], metadatas=[{"doc_id": "docC", "file_name": "c.txt", "page": 1}])
+    # Eski tablonun tüm satırlarını seçen filtre, yeni dokümanı (docC) dışarıda bırakmalı
+    filters = main.RAGFilters(doc_ids=["docA", "docB"])
+
+    docs = main.search_documents(store, "soru", k=6, filters=filters, table=stale)
+
+    assert sorted(texts(docs)) == ["a-1", "a-2", "a-5", "b-1", "b-3"]
+
+
+class SlowEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        time.sleep(0.1)
+        return [[1.0, float(len(text)), 0.0] for text in texts]
+
+    def embed_query(self, text):
+        return [1.0, 0.0, 0.0]
+
+
+def test_concurrent_uploads_to_same_session_keep_both_documents(main, monkeypatch, tmp_path):
+    slow = SlowEmbeddings()
+    monkeypatch.setattr(main, "embeddings", slow)
+    monkeypatch.setattr(main, "parallel_embedder", ParallelEmbedder(slow, batch_size=4, controller=AIMDController(initial=2)))
+    paths = []
+    for name in ("bir.txt", "iki.txt"):
+        path = tmp_path / name
+        path.write_text(f"{name} dokümanının içeriği.", encoding="utf-8")
+        paths.append(path)
+
+    threads = [
+        threading.Thread(target=main.ingest_document, args=("concurrent-session", str(path), path.name))
+        for path in paths
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    store = main._faiss_stores.get("concurrent-session")
+    names = {store.docstore.search(i).metadata["file_name"] for i in store.index_to_docstore_id.values()}
+    assert names == {"bir.txt", "iki.txt"}
+    assert main._session_locks == {}
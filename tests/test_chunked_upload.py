@@ -0,0 +1,178 @@
+"""ChunkedUploadStore ve /rag/upload uçları - kaldığı yerden devam, erken embedding ve 429 sonrası finalize"""
+
+import io
+import threading
+import time
+import uuid
+from collections import Counter
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.embeddings import Embeddings
+
+from admission import UpstreamBusyError
+from chunked_upload import ChunkedUploadStore, UploadError, UploadOffsetMismatch
+from embedding_ingest import AIMDController, ParallelEmbedder
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ChunkedUploadStore(str(tmp_path), max_size=1024)
+
+
+def test_offset_mismatch_reports_received_for_resume(store):
+    meta = store.init("s", "a.txt", 10)
+    store.append(meta["upload_id"], 0, io.BytesIO(b"12345"))
+
+    # Kopan bağlantı sonrası istemci yanlış offset'le gelirse sunucudaki offset'i öğrenir
+    with pytest.raises(UploadOffsetMismatch) as error:
+        store.append(meta["upload_id"], 0, io.BytesIO(b"12345"))
+    assert error.value.received == 5
+
+    meta = store.append(meta["upload_id"], error.value.received, io.BytesIO(b"67890"))
+    assert meta["received"] == 10
+
+
+def test_oversized_part_is_rejected_and_truncated(store):
+    meta = store.init("s", "a.txt", 8)
+    upload_id = meta["upload_id"]
+    store.append(upload_id, 0, io.BytesIO(b"1234"))
+
+    with pytest.raises(UploadError):
+        store.append(upload_id, 4, io.BytesIO(b"56789"))
+
+    assert store.status(upload_id)["received"] == 4
+    store.append(upload_id, 4, io.BytesIO(b"5678"))
+    with open(store.finalize(upload_id)["path"], "rb") as data:
+        assert data.read() == b"12345678"
+
+
+def test_take_complete_text_holds_back_trailing_paragraph(store):
+    text = b"ilk paragraf\n\nikinci paragraf\n\nson para"
+    meta = store.init("s", "a.txt", len(text) + 4)
+    upload_id = meta["upload_id"]
+    store.append(upload_id, 0, io.BytesIO(text))
+
+    assert store.take_complete_text(upload_id) == "ilk paragraf\n\nikinci paragraf\n\n"
+    assert store.take_complete_text(upload_id) == ""
+
+    # Dosya tamamlanınca bekletilen son paragraf da verilir
+    store.append(upload_id, len(text), io.BytesIO(b"graf"))
+    assert store.take_complete_text(upload_id) == "son paragraf"
+
+
+def test_finalize_requires_all_bytes_and_reopen_allows_retry(store):
+    meta = store.init("s", "a.txt", 4)
+    upload_id = meta["upload_id"]
+    store.append(upload_id, 0, io.BytesIO(b"12"))
+    with pytest.raises(UploadOffsetMismatch):
+        store.finalize(upload_id)
+
+    store.append(upload_id, 2, io.BytesIO(b"34"))
+    store.finalize(upload_id)
+    with pytest.raises(UploadError):
+        store.finalize(upload_id)
+    store.reopen(upload_id)
+    assert store.finalize(upload_id)["received"] == 4
+
+
+class CountingEmbeddings(Embeddings):
+    """Her metnin kaç kez embed edildiğini sayan, gecikmeli sahte embedding modeli"""
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.embedded = Counter()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        # Gecikme: arka plan prefetch'i finalize çağrıldığında henüz bitmemiş olur
+        time.sleep(self.latency)
+        with self._lock:
+            self.embedded.update(texts)
+        return [[float(len(text)), float(sum(map(ord, text)) % 97), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def document(paragraphs=40):
+    # Her paragraf tek bir chunk'a denk gelir
+    return "\n\n".join(f"Paragraf {i}: " + f"kelime{i} " * 40 for i in range(paragraphs)).encode()
+
+
+@pytest.fixture
+def uploader(main, monkeypatch):
+    fake = CountingEmbeddings()
+    monkeypatch.setattr(main, "parallel_embedder", ParallelEmbedder(fake, batch_size=8, controller=AIMDController(initial=2)))
+    client = TestClient(main.app)
+
+    def start(data):
+        response = client.post(
+            "/rag/upload/init",
+            json={"session_id": f"upload-{uuid.uuid4().hex}", "file_name": "notlar.txt", "total_size": len(data)},
+        )
+        return response.json()["upload_id"]
+
+    def send_part(upload_id, offset, part):
+        return client.put(f"/rag/upload/{upload_id}", params={"offset": offset}, files={"part": ("part", part)})
+
+    client.start, client.send_part, client.fake = start, send_part, fake
+    return client
+
+
+def test_single_part_upload_embeds_each_chunk_once(uploader):
+    data = document()
+    upload_id = uploader.start(data)
+    uploader.send_part(upload_id, 0, data)
+
+    response = uploader.post(f"/rag/upload/{upload_id}/finalize")
+
+    assert response.json()["chunks"] == 40
+    assert sum(uploader.fake.embedded.values()) == 40
+
+
+def test_multi_part_upload_reuses_prefetched_vectors(uploader):
+    data = document()
+    middle = data.index(b"Paragraf 20")
+    upload_id = uploader.start(data)
+    uploader.send_part(upload_id, 0, data[:middle])
+    uploader.send_part(upload_id, middle, data[middle:])
+
+    response = uploader.post(f"/rag/upload/{upload_id}/finalize")
+
+    assert response.json()["chunks"] == 40
+    assert set(uploader.fake.embedded.values()) == {1}
+
+
+def test_part_with_wrong_offset_returns_409_with_received(uploader):
+    data = document(4)
+    upload_id = uploader.start(data)
+    uploader.send_part(upload_id, 0, data[:10])
+
+    response = uploader.send_part(upload_id, 0, data[10:])
+
+    assert response.status_code == 409
+    assert response.json()["received"] == 10
+
+
+def test_finalize_can_be_retried_after_429(main, uploader, monkeypatch):
+    data = document(4)
+    upload_id = uploader.start(data)
+    uploader.send_part(upload_id, 0, data)
+    real_ingest = main.ingest_document
+    outcomes = [UpstreamBusyError("embeddings", 3)]
+
+    def flaky_ingest(*args, **kwargs):
+        if outcomes:
+            raise outcomes.pop()
+        return real_ingest(*args, **kwargs)
+
+    monkeypatch.setattr(main, "ingest_document", flaky_ingest)
+
+    busy = uploader.post(f"/rag/upload/{upload_id}/finalize")
+    assert busy.status_code == 429
+    assert busy.headers["Retry-After"] == "3"
+
+    retried = uploader.post(f"/rag/upload/{upload_id}/finalize")
+    assert retried.json()["status"] == "success"
+    assert not main.upload_store.exists(upload_id)
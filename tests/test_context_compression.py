@@ -0,0 +1,52 @@
+"""ContextCompressor bütçesi - bağlamın oranı, üst sınır ve küçük bağlamda embedding çağrısı yapılmaması"""
+
+from context_compression import ContextCompressor
+from context_fusion import Passage, estimate_tokens
+
+SENTENCE = "Önbellek katmanı okuma yükünü azaltır ve gecikmeyi düşürür."
+
+
+def rag_context(chunks=3, chars=500):
+    # RAG: k=3, chunk_size=500 -> ~375 token
+    text = " ".join([SENTENCE] * (chars // len(SENTENCE)))
+    return [Passage(text, f"doc{i}", "doc") for i in range(chunks)]
+
+
+def tokens(passages):
+    return sum(estimate_tokens(p.text) for p in passages)
+
+
+class CountingEmbed:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, texts):
+        self.calls += 1
+        return [[1.0, float(len(t))] for t in texts]
+
+
+def test_rag_sized_context_is_compressed_to_ratio():
+    passages = rag_context()
+    compressor = ContextCompressor(embed_fn=None, token_budget=600, ratio=0.5)
+
+    kept = compressor.compress("önbellek gecikme", passages)
+
+    assert tokens(kept) <= tokens(passages) * 0.5 + estimate_tokens(SENTENCE)
+    assert tokens(kept) < tokens(passages)
+
+
+def test_token_budget_caps_large_context():
+    passages = rag_context(chunks=12)
+    compressor = ContextCompressor(embed_fn=None, token_budget=200, ratio=0.5)
+
+    # Cümleler birleştirilirken eklenen boşluk / "…" için küçük pay
+    assert tokens(compressor.compress("önbellek", passages)) <= 200 * 1.1
+
+
+def test_small_context_skips_embedding_round_trip():
+    embed = CountingEmbed()
+    compressor = ContextCompressor(embed_fn=embed, min_tokens=150)
+    passages = [Passage(SENTENCE * 3, "doc", "doc")]
+
+    assert compressor.compress("önbellek", passages) == passages
+    assert embed.calls == 0
@@ -0,0 +1,163 @@
+"""ParallelEmbedder / AIMDController - rate limit simüle eden sahte embedding sunucusuna karşı testler"""
+
+import threading
+import time
+from collections import Counter
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from embedding_ingest import AIMDController, ParallelEmbedder, is_rate_limit_error
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class StubEmbeddings(Embeddings):
+    """Eşzamanlı çağrı kapasitesi aşılınca 429 veren, gecikmeli sahte embedding sunucusu"""
+
+    def __init__(self, capacity: int = 2, latency: float = 0.02, fail_once=()):
+        self.capacity = capacity
+        self.latency = latency
+        self.fail_once = set(fail_once)
+        self.active = 0
+        self.calls = []
+        self.succeeded = Counter()
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+            failing = self.fail_once & set(texts)
+            self.fail_once -= failing
+            if failing or self.active >= self.capacity:
+                self.throttled += 1
+                raise RateLimitError("429 Resource exhausted")
+            self.active += 1
+        try:
+            time.sleep(self.latency)
+            vectors = [self._vector(text) for text in texts]
+        finally:
+            with self._lock:
+                self.active -= 1
+        with self._lock:
+            self.succeeded.update(texts)
+        return vectors
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+    @staticmethod
+    def _vector(text):
+        number = int(text.rsplit("-", 1)[1])
+        return [float(number), 1.0, 0.0, 0.5]
+
+
+def chunks(n):
+    return [f"chunk-{i}" for i in range(n)]
+
+
+def stored_texts(store):
+    return Counter(store.docstore.search(doc_id).page_content for doc_id in store.index_to_docstore_id.values())
+
+
+def test_rate_limit_error_detection():
+    assert is_rate_limit_error(RateLimitError("x"))
+    assert is_rate_limit_error(RuntimeError("ResourceExhausted: quota"))
+    assert not is_rate_limit_error(ValueError("bad input"))
+
+
+def test_controller_halves_on_throttle_and_grows_additively():
+    controller = AIMDController(initial=8, minimum=1, maximum=16)
+    controller.on_throttle()
+    assert controller.current == 4
+    # Her tam pencere (~limit kadar başarı) için +1
+    for _ in range(5):
+        controller.on_success(0.1)
+    assert controller.current == 5
+    controller.on_success(controller.latency_target + 1)
+    assert controller.current == 2
+
+
+def test_concurrency_drops_on_429_and_every_chunk_indexed_once():
+    stub = StubEmbeddings(capacity=2)
+    controller = AIMDController(initial=8, maximum=8)
+    embedder = ParallelEmbedder(stub, batch_size=4, controller=controller, backoff_base=0.01, max_retries=50)
+    texts = chunks(80)
+
+    store = embedder.embed_into_faiss(texts)
+
+    assert stub.throttled > 0
+    assert controller.current < 8
+    assert store.index.ntotal == len(texts)
+    assert stored_texts(store) == Counter(texts)
+    # Her chunk API'de tam bir kez başarıyla embed edildi
+    assert stub.succeeded == Counter(texts)
+
+
+def test_failed_batch_is_retried_alone():
+    stub = StubEmbeddings(capacity=100, fail_once={"chunk-5"})
+    embedder = ParallelEmbedder(stub, batch_size=4, controller=AIMDController(initial=4), backoff_base=0.01)
+    texts = chunks(16)
+
+    store = embedder.embed_into_faiss(texts)
+
+    sent = Counter(text for call in stub.calls for text in call)
+    failed_batch = texts[4:8]
+    assert all(sent[text] == 2 for text in failed_batch)
+    assert all(sent[text] == 1 for text in texts if text not in failed_batch)
+    assert stored_texts(store) == Counter(texts)
+
+
+def test_metadata_follows_chunks_and_on_batch_sees_every_chunk():
+    stub = StubEmbeddings(capacity=1, fail_once={"chunk-0"})
+    embedder = ParallelEmbedder(stub, batch_size=3, controller=AIMDController(initial=4), backoff_base=0.01)
+    texts = chunks(10)
+    seen = []
+
+    store = embedder.embed_into_faiss(
+        texts,
+        metadatas=[{"n": i} for i in range(10)],
+        on_batch=lambda start, ids, vectors: seen.extend(range(start, start + len(ids))),
+    )
+
+    assert sorted(seen) == list(range(10))
+    for doc_id in store.index_to_docstore_id.values():
+        doc = store.docstore.search(doc_id)
+        assert doc.page_content == f"chunk-{doc.metadata['n']}"
+
+
+def test_known_vectors_are_not_sent():
+    stub = StubEmbeddings(capacity=100)
+    embedder = ParallelEmbedder(stub, batch_size=4)
+    texts = chunks(8)
+    known = {text: StubEmbeddings._vector(text) for text in texts[:4]}
+
+    store = embedder.embed_into_faiss(texts, known_vectors=known)
+
+    assert [text for call in stub.calls for text in call] == texts[4:]
+    assert store.index.ntotal == 8
+
+
+def test_gives_up_after_max_retries():
+    class AlwaysThrottled(StubEmbeddings):
+        def embed_documents(self, texts):
+            raise RateLimitError("429")
+
+    embedder = ParallelEmbedder(AlwaysThrottled(), batch_size=4, max_retries=2, backoff_base=0.001)
+    with pytest.raises(RateLimitError):
+        embedder.embed_into_faiss(chunks(4))
+
+
+def test_embed_documents_returns_vectors_in_input_order_under_throttling():
+    stub = StubEmbeddings(capacity=1)
+    embedder = ParallelEmbedder(stub, batch_size=3, controller=AIMDController(initial=4), backoff_base=0.01, max_retries=50)
+    texts = chunks(20)
+
+    vectors = embedder.embed_documents(texts)
+
+    assert stub.throttled > 0
+    assert vectors == [StubEmbeddings._vector(text) for text in texts]
+    assert stub.succeeded == Counter(texts)
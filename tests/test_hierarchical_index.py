@@ -0,0 +1,98 @@
+"""HierarchicalIndex - iki aşamalı arama, eşzamanlı ilk sorgu, store'dan yeniden kurma; çözülemeyen id'ler"""
+
+import threading
+
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from hierarchical_index import HierarchicalIndex
+
+
+def one_hot(i, dim=8):
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[i] = 1.0
+    return vector
+
+
+def build_index():
+    index = HierarchicalIndex()
+    index.add(["a0", "a1"], [one_hot(0), one_hot(1)], [0, 0])
+    index.add(["b0", "b1"], [one_hot(4), one_hot(5)], [1, 1])
+    return index
+
+
+def test_search_finds_chunk_in_best_section():
+    index = build_index()
+    assert index.search(one_hot(5), k=1, fan_out=1) == ["b1"]
+    assert index.search(one_hot(0) + 0.1 * one_hot(1), k=2, fan_out=1) == ["a0", "a1"]
+
+
+def test_add_invalidates_search_state():
+    index = build_index()
+    index.search(one_hot(0), k=1)
+    index.add(["c0"], [one_hot(7)], [2])
+    assert index.search(one_hot(7), k=1, fan_out=1) == ["c0"]
+
+
+def test_concurrent_first_searches_see_complete_state():
+    errors = []
+    for _ in range(50):
+        index = build_index()
+        barrier = threading.Barrier(8)
+
+        def search():
+            barrier.wait()
+            try:
+                assert index.search(one_hot(4), k=1, fan_out=1) == ["b0"]
+            except Exception as e:  # pragma: no cover - hata ayrıntısı için
+                errors.append(e)
+
+        threads = [threading.Thread(target=search) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert errors == []
+
+
+def test_search_documents_skips_ids_missing_from_store(main, monkeypatch):
+    index = build_index()
+
+    class Store:
+        docstore = InMemoryDocstore({"b0": Document(page_content="var")})
+
+    class QueryEmbeddings:
+        def embed_query(self, query):
+            return one_hot(4) + 0.5 * one_hot(5)
+
+    monkeypatch.setattr(main, "HIERARCHICAL_MIN_CHUNKS", 1)
+    monkeypatch.setattr(main, "embeddings", QueryEmbeddings())
+
+    docs = main.search_documents(Store(), "soru", k=2, hierarchy=index)
+
+    assert [doc.page_content for doc in docs] == ["var"]
+
+
+def test_from_faiss_rebuilds_index_with_every_document():
+    pairs = [(f"chunk {i}", list(one_hot(i))) for i in range(6)]
+    metadatas = [{"section": i // 3} for i in range(6)]
+    store = FAISS.from_embeddings(pairs, embedding=None, metadatas=metadatas)
+
+    index = HierarchicalIndex.from_faiss(store)
+
+    assert len(index) == 6 and index.next_section == 2
+    found = index.search(one_hot(4), k=1, fan_out=1)
+    assert store.docstore.search(found[0]).page_content == "chunk 4"
+
+
+def test_missing_hierarchy_is_rebuilt_from_session_store(main):
+    store = FAISS.from_embeddings([("eski", list(one_hot(1)))], embedding=None, metadatas=[{"section": 0}])
+    main._faiss_stores.put("rebuild-session", store)
+
+    hierarchy = main.session_hierarchy("rebuild-session", store)
+
+    assert len(hierarchy) == 1
+    assert main._hierarchies.get("rebuild-session") is hierarchy
+    assert len(main.session_table("rebuild-session", store)) == 1
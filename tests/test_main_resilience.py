@@ -0,0 +1,99 @@
+"""main.py - istek deadline'ı, LLM çağrılarına timeout aktarımı, timeout sonrası history ve toplu prefetch yolu"""
+
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage
+
+from admission import BULK, _request_priority
+from resilience import DeadlineExceeded, deadline_scope, remaining
+
+
+class FakeChatModel:
+    """Verilen timeout'u kaydeden, `latency` kadar süren (timeout'u yok sayan) sahte model"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.timeouts = []
+
+    def invoke(self, prompt, timeout=None):
+        self.timeouts.append(timeout)
+        time.sleep(self.latency)
+        return AIMessage(content="yanıt")
+
+
+def test_invoke_llm_passes_attempt_budget_to_client(main, monkeypatch):
+    fake = FakeChatModel()
+    monkeypatch.setattr(main, "llm", fake)
+    with deadline_scope(3):
+        main.invoke_llm("merhaba")
+    assert fake.timeouts and 0 < fake.timeouts[0] <= 3
+
+
+def test_chatbot_writes_history_only_for_accepted_answer(main, monkeypatch):
+    monkeypatch.setattr(main, "llm", FakeChatModel())
+    main.invoke_chatbot("selam", "s-ok")
+    assert [m.content for m in main.get_history("s-ok").messages] == ["selam", "yanıt"]
+
+    monkeypatch.setattr(main, "llm", FakeChatModel(latency=0.3))
+    with deadline_scope(0.1), pytest.raises(DeadlineExceeded):
+        main.invoke_chatbot("selam", "s-late")
+    # Geç gelen yanıt, istemciye 504 döndükten sonra history'ye yazılmamalı
+    time.sleep(0.4)
+    assert main.get_history("s-late").messages == []
+
+
+def test_request_timeout_header_is_clamped(main, monkeypatch):
+    monkeypatch.setattr(main, "invoke_chatbot", lambda message, session_id: AIMessage(content=f"{remaining():.3f}"))
+    client = TestClient(main.app)
+
+    def budget(header):
+        response = client.post("/chat", json={"session_id": "s", "message": "x"}, headers={"X-Request-Timeout": header})
+        return float(response.json()["answer"])
+
+    assert main.MIN_REQUEST_DEADLINE_SECONDS - 1 < budget("0.01") <= main.MIN_REQUEST_DEADLINE_SECONDS
+    assert budget("nan") > main.MIN_REQUEST_DEADLINE_SECONDS
+    assert budget("100000") <= main.REQUEST_DEADLINE_SECONDS
+
+
+def test_upload_prefetch_uses_bulk_ingestion_path(main, monkeypatch):
+    seen = {}
+
+    class FakeEmbedder:
+        def embed_documents(self, texts):
+            seen["priority"] = _request_priority.get()
+            return [[float(i)] for i, _ in enumerate(texts)]
+
+    def interactive_call(fn):
+        raise AssertionError("prefetch interaktif embeddings upstream'ini kullanmamalı")
+
+    monkeypatch.setattr(main, "parallel_embedder", FakeEmbedder())
+    monkeypatch.setattr(main.upstreams["embeddings"], "call", interactive_call)
+
+    main.prefetch_embeddings("upload-x", ["a", "b"])
+    deadline = time.monotonic() + 5
+    while "upload-x" not in main._prefetched_vectors and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert seen["priority"] == BULK
+    assert main._prefetched_vectors.pop("upload-x") == {"a": [0.0], "b": [1.0]}
+
+
+def test_web_index_fill_goes_through_bulk_embedder_and_breaker(main, monkeypatch):
+    seen = []
+
+    class FakeEmbedder:
+        def embed_documents(self, texts):
+            seen.append(_request_priority.get())
+            return [[1.0] for _ in texts]
+
+    monkeypatch.setattr(main, "parallel_embedder", FakeEmbedder())
+    assert main.embed_web_page_chunks(["a", "b"]) == [[1.0], [1.0]]
+    assert seen == [BULK]
+
+    breaker = main.upstreams["embeddings"].breaker
+    monkeypatch.setattr(breaker, "_opened_at", time.monotonic())
+    with pytest.raises(main.CircuitOpenError):
+        main.embed_web_page_chunks(["c"])
+    assert seen == [BULK]
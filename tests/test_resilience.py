@@ -0,0 +1,241 @@
+"""resilience - hang / hızlı hata / aralıklı hata enjekte eden sahte upstream'lerle testler"""
+
+import threading
+import time
+
+import pytest
+
+from admission import PriorityLimiter, UpstreamBusyError
+from resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, Upstream, deadline_scope, time_left
+
+
+class StubUpstream:
+    """Senaryoya göre uyuyan / hata veren, verilen timeout'a uyan sahte upstream"""
+
+    def __init__(self, *behaviours, default="ok"):
+        # Her çağrı sıradaki davranışı kullanır: ("sleep", sn) / ("fail", None) / ("ok", None)
+        self.behaviours = list(behaviours)
+        self.default = default
+        self.calls = 0
+        self.timeouts = []
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, timeout):
+        with self._lock:
+            index = self.calls
+            self.calls += 1
+            self.timeouts.append(timeout)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        kind, value = self.behaviours[index] if index < len(self.behaviours) else (self.default, None)
+        try:
+            if kind == "fail":
+                raise ConnectionError(f"call {index} failed")
+            if kind == "sleep":
+                # İstemci kütüphanesi gibi: timeout'tan uzun sürecek çağrı timeout'ta kesilir
+                time.sleep(min(value, timeout))
+                if value > timeout:
+                    raise TimeoutError(f"call {index} timed out")
+            return f"result-{index}"
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def warmed_upstream(latency=0.01, **kwargs):
+    """p95'i bilinen (hedge gecikmesi hesaplanabilen) upstream"""
+    upstream = Upstream("stub", **kwargs)
+    for _ in range(upstream.latency.min_samples):
+        upstream.latency.record(latency)
+    return upstream
+
+
+def test_time_left_uses_remaining_deadline():
+    assert time_left(5.0) == 5.0
+    with deadline_scope(0.5):
+        assert time_left(5.0) <= 0.5
+        # İçteki daha uzun deadline dıştakini uzatamaz
+        with deadline_scope(10):
+            assert time_left(5.0) <= 0.5
+    with deadline_scope(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            time_left(5.0)
+
+
+def test_deadline_propagates_to_attempt_timeout():
+    stub = StubUpstream(("sleep", 5))
+    upstream = Upstream("stub", timeout=10, hedge=False)
+    started = time.monotonic()
+    with deadline_scope(0.2), pytest.raises(DeadlineExceeded):
+        upstream.call(stub)
+    assert time.monotonic() - started < 0.5
+    assert stub.timeouts[0] <= 0.2
+
+
+def test_hedge_starts_after_p95_and_first_success_wins():
+    stub = StubUpstream(("sleep", 2), ("ok", None))
+    upstream = warmed_upstream(latency=0.02, timeout=5, min_hedge_delay=0.01)
+    started = time.monotonic()
+    assert upstream.call(stub) == "result-1"
+    assert time.monotonic() - started < 0.5
+    assert stub.calls == 2
+
+
+def test_no_hedge_before_p95():
+    stub = StubUpstream(("sleep", 0.05))
+    upstream = warmed_upstream(latency=0.5, timeout=5)
+    assert upstream.call(stub) == "result-0"
+    assert stub.calls == 1
+
+
+def test_fast_failure_is_retried_once():
+    stub = StubUpstream(("fail", None), ("ok", None))
+    upstream = Upstream("stub", timeout=5)
+    assert upstream.call(stub) == "result-1"
+
+    failing = StubUpstream(default="fail")
+    with pytest.raises(ConnectionError):
+        upstream.call(failing)
+    assert failing.calls == 2
+
+
+def test_breaker_opens_on_intermittent_failures_and_rejects_fast():
+    upstream = Upstream("stub", timeout=5, hedge=False, breaker=CircuitBreaker(min_calls=4, cooldown=60))
+    stub = StubUpstream(("ok", None), ("fail", None), ("fail", None), ("fail", None), default="ok")
+    upstream.call(stub)
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            upstream.call(stub)
+
+    assert upstream.breaker.state == "open"
+    calls = stub.calls
+    with pytest.raises(CircuitOpenError):
+        upstream.call(stub)
+    assert stub.calls == calls
+
+
+def test_half_open_allows_single_probe_and_closes_on_success():
+    breaker = CircuitBreaker(min_calls=2, cooldown=0.05)
+    breaker.record(False)
+    breaker.record(False)
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # probe sürerken başka çağrı yok
+    breaker.record(True)
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker(min_calls=2, cooldown=0.05)
+    breaker.record(False)
+    breaker.record(False)
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open"
+
+
+def test_short_client_deadline_does_not_open_breaker():
+    # Sağlıklı ama 0.3 sn süren upstream; istemciler 0.05 sn deadline ile geliyor
+    upstream = Upstream("stub", timeout=1, hedge=False, breaker=CircuitBreaker(min_calls=5))
+    stub = StubUpstream(default="sleep")
+    stub.behaviours = [("sleep", 0.3)] * 10
+    for _ in range(10):
+        with deadline_scope(0.05), pytest.raises(DeadlineExceeded):
+            upstream.call(stub)
+
+    assert upstream.breaker.state == "closed"
+    assert upstream.call(lambda timeout: "ok") == "ok"
+
+
+def test_own_timeout_counts_as_failure():
+    upstream = Upstream("stub", timeout=0.05, hedge=False, breaker=CircuitBreaker(min_calls=3, cooldown=60))
+    stub = StubUpstream(*[("sleep", 1)] * 3)
+    for _ in range(3):
+        with pytest.raises(DeadlineExceeded):
+            upstream.call(stub)
+    assert upstream.breaker.state == "open"
+
+
+def test_deadline_bound_probe_is_released():
+    breaker = CircuitBreaker(min_calls=2, cooldown=0.01)
+    breaker.record(False)
+    breaker.record(False)
+    time.sleep(0.02)
+    upstream = Upstream("stub", timeout=1, hedge=False, breaker=breaker)
+    with deadline_scope(0.05), pytest.raises(DeadlineExceeded):
+        upstream.call(StubUpstream(("sleep", 0.5)))
+    # Probe sonucu bilinmiyor: bir sonraki çağrı tekrar probe olabilir
+    assert upstream.call(lambda timeout: "ok") == "ok"
+    assert breaker.state == "closed"
+
+
+def test_timed_out_attempts_stop_and_release_limiter_slot():
+    limiter = PriorityLimiter("stub", max_concurrency=2, max_queue=0, max_wait=0.01)
+    upstream = Upstream("stub", timeout=0.1, hedge=False, limiter=limiter, ignore_errors=(UpstreamBusyError,))
+    stub = StubUpstream(*[("sleep", 5)] * 4)
+    for _ in range(4):
+        with pytest.raises(DeadlineExceeded):
+            upstream.call(stub)
+
+    # Timeout'a uyan denemeler bitti: slot'lar boşaldı, sonraki çağrı meşgul hatası almaz
+    time.sleep(0.05)
+    assert limiter.stats()["active"] == 0
+    assert upstream.call(lambda timeout: "ok") == "ok"
+
+
+def test_limiter_slot_is_held_while_attempt_still_runs():
+    limiter = PriorityLimiter("stub", max_concurrency=1, max_queue=0, max_wait=0.01)
+    upstream = Upstream("stub", timeout=0.05, hedge=False, limiter=limiter, ignore_errors=(UpstreamBusyError,))
+    release = threading.Event()
+    with pytest.raises(DeadlineExceeded):
+        upstream.call(lambda timeout: release.wait(1))
+
+    # Terk edilen deneme hâlâ çalışıyor: slot'u bırakılmamalı
+    assert limiter.stats()["active"] == 1
+    release.set()
+    time.sleep(0.05)
+    assert limiter.stats()["active"] == 0
+
+
+def test_hedge_is_skipped_when_limiter_is_full():
+    limiter = PriorityLimiter("stub", max_concurrency=1, max_queue=0, max_wait=0.01)
+    upstream = warmed_upstream(
+        latency=0.01, timeout=2, min_hedge_delay=0.01, limiter=limiter, ignore_errors=(UpstreamBusyError,)
+    )
+    stub = StubUpstream(("sleep", 0.3))
+
+    # Slot'u tutan ilk deneme p95'i aşar; dolu limiter'a hedge gönderilmez, çağrı 429 almadan biter
+    assert upstream.call(stub) == "result-0"
+    assert stub.calls == 1
+
+
+def test_rejected_hedge_only_drops_that_attempt():
+    limiter = PriorityLimiter("stub", max_concurrency=1, max_queue=0, max_wait=0.01)
+    upstream = warmed_upstream(
+        latency=0.01, timeout=2, min_hedge_delay=0.01, limiter=limiter, ignore_errors=(UpstreamBusyError,)
+    )
+    # Limiter boş görünse de hedge'in slot'u başka bir istek tarafından kapılır
+    upstream._has_free_slot = lambda: True
+    stub = StubUpstream(("sleep", 0.3))
+
+    assert upstream.call(stub) == "result-0"
+    assert upstream.breaker.state == "closed"
+
+
+def test_latency_excludes_limiter_queue_wait():
+    limiter = PriorityLimiter("stub", max_concurrency=1, max_queue=4, max_wait=2)
+    upstream = Upstream("stub", timeout=2, hedge=False, limiter=limiter)
+    limiter.acquire()
+    threading.Timer(0.2, limiter.release).start()
+
+    upstream.call(lambda timeout: "ok")
+
+    assert upstream.latency._samples[-1] < 0.1
@@ -0,0 +1,51 @@
+"""SemanticRouter - 'MODE:' protokolünün ayrıştırılması"""
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from semantic_router import SemanticRouter
+
+parse = SemanticRouter._parse_route_and_answer
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("MODE: chat\nMerhaba", ("chat", "Merhaba")),
+    ("MODE: web_search", ("web_search", None)),
+    ("**MODE: web_search**", ("web_search", None)),
+    ("**MODE:** rag", ("rag", None)),
+    ("`MODE: rag`", ("rag", None)),
+    ("```\nMODE: rag\n```", ("rag", None)),
+    ("```text\nMODE: hybrid\n```", ("hybrid", None)),
+    ("\n\n  mode: RAG.", ("rag", None)),
+    ("## MODE: chat\n\nSOLID beş prensiptir.", ("chat", "SOLID beş prensiptir.")),
+    ("**MODE: chat**\nMerhaba", ("chat", "Merhaba")),
+    ("```\nMODE: chat\n```\nMerhaba\n\n**kalın** kısım", ("chat", "Merhaba\n\n**kalın** kısım")),
+    ("MODE: chat Merhaba", ("chat", "Merhaba")),
+    ("MODE: bilinmeyen\nyanıt", ("chat", "yanıt")),
+    ("Sadece yanıt, başlık yok", ("chat", "Sadece yanıt, başlık yok")),
+    ("", ("chat", None)),
+])
+def test_parse_route_and_answer(text, expected):
+    assert parse(text) == expected
+
+
+class FakeLLM:
+    def __init__(self, content):
+        self.content = content
+
+    def invoke(self, prompt):
+        return AIMessage(content=self.content)
+
+
+def test_route_or_answer_markdown_header_triggers_retrieval():
+    router = SemanticRouter(FakeLLM("**MODE: rag**"))
+    assert router.route_or_answer("dokümanda ne var?", [], "sistem", has_document=True) == ("rag", None)
+    # Doküman yoksa rag chat'e, hybrid web aramasına iner
+    assert router.route_or_answer("dokümanda ne var?", [], "sistem") == ("chat", None)
+    router = SemanticRouter(FakeLLM("`MODE: hybrid`"))
+    assert router.route_or_answer("karşılaştır", [], "sistem") == ("web_search", None)
+
+
+def test_route_or_answer_chat_answer_has_no_header():
+    router = SemanticRouter(FakeLLM("**MODE: chat**\nMerhaba!"))
+    assert router.route_or_answer("selam", [], "sistem") == ("chat", "Merhaba!")
@@ -0,0 +1,74 @@
+"""/smart_chat hybrid modu - bir retrieval tarafı hata verdiğinde diğeriyle devam"""
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+
+from resilience import CircuitOpenError, DeadlineExceeded
+
+SEARCH_RESULT = {"url": "https://example.com/cache", "title": "Cache rehberi", "snippet": "..."}
+DOCS = [Document(page_content="Dokümanda write-through cache anlatılıyor.", metadata={"file_name": "tasarim.pdf"})]
+
+
+@pytest.fixture
+def client(main, monkeypatch):
+    prompts = []
+
+    def fake_llm(prompt_text):
+        prompts.append(prompt_text)
+        return AIMessage(content="yanıt")
+
+    monkeypatch.setattr(main, "invoke_llm", fake_llm)
+    monkeypatch.setattr(main, "compress_passages", lambda question, passages, token_budget=None: passages)
+    # Arama monkeypatch'lenir; store sadece session'da doküman olduğunu gösterir
+    store = FAISS.from_embeddings([("doküman", [1.0, 0.0])], embedding=None, metadatas=[{"section": 0}])
+    main._faiss_stores.put("hybrid-session", store)
+    client = TestClient(main.app)
+    client.prompts = prompts
+    return client
+
+
+def ask(client):
+    return client.post("/smart_chat", json={"session_id": "hybrid-session", "message": "karşılaştır", "force_mode": "hybrid"})
+
+
+def test_rag_failure_falls_back_to_web_context(main, client, monkeypatch):
+    def broken_search(*args, **kwargs):
+        raise CircuitOpenError("embeddings")
+
+    monkeypatch.setattr(main, "search_documents", broken_search)
+    monkeypatch.setattr(main, "retrieve_web", lambda query: (SEARCH_RESULT, "Web'de cache-aside öneriliyor."))
+
+    response = ask(client)
+    assert response.status_code == 200
+    assert response.json()["mode_used"] == "hybrid"
+    assert "cache-aside" in client.prompts[-1]
+    assert "Doküman araması başarısız" in response.json()["mode_explanation"]
+
+
+def test_web_failure_falls_back_to_document_context(main, client, monkeypatch):
+    def broken_web(query):
+        raise DeadlineExceeded("fetch")
+
+    monkeypatch.setattr(main, "search_documents", lambda *args, **kwargs: DOCS)
+    monkeypatch.setattr(main, "retrieve_web", broken_web)
+
+    response = ask(client)
+    assert response.status_code == 200
+    assert "write-through" in client.prompts[-1]
+    assert response.json()["source_refs"][0]["file_name"] == "tasarim.pdf"
+
+
+def test_both_sides_failing_surfaces_upstream_error(main, client, monkeypatch):
+    def broken_search(*args, **kwargs):
+        raise CircuitOpenError("embeddings")
+
+    def broken_web(query):
+        raise DeadlineExceeded("fetch")
+
+    monkeypatch.setattr(main, "search_documents", broken_search)
+    monkeypatch.setattr(main, "retrieve_web", broken_web)
+
+    assert ask(client).status_code == 503
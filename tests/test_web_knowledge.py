@@ -0,0 +1,131 @@
+"""WebKnowledgeIndex - copy-on-write ekleme, TTL / boyut sınırı ve worker'lar arası yeniden yükleme"""
+
+import hashlib
+import threading
+import time
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from web_knowledge import WebKnowledgeIndex
+
+# Sahte vektörlerde ortogonal metinlerin skoru negatif çıkar; langchain bunun için uyarı basar
+pytestmark = pytest.mark.filterwarnings("ignore:Relevance scores")
+
+
+class HashEmbeddings(Embeddings):
+    """Metnin kelimelerinden deterministik vektör - aynı metin aynı vektörü verir"""
+
+    def _embed(self, text):
+        vector = [0.0] * 32
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % 32] += 1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def make_index(directory, **kwargs):
+    kwargs.setdefault("min_score", 0.9)
+    return WebKnowledgeIndex(HashEmbeddings(), str(directory), chunker=lambda texts: list(texts), **kwargs)
+
+
+def urls_in(index, query):
+    return {doc.metadata["url"] for doc in index.lookup(query, k=5)}
+
+
+def test_add_page_does_not_mutate_store_held_by_readers(tmp_path):
+    index = make_index(tmp_path)
+    index.add_page("https://a.example", "A", "redis cache aside pattern")
+    reader_store = index._store
+    before = dict(reader_store.index_to_docstore_id)
+
+    index.add_page("https://b.example", "B", "kafka consumer group rebalance")
+    index.add_page("https://a.example", "A", "redis write through pattern")
+
+    assert index._store is not reader_store
+    assert reader_store.index_to_docstore_id == before
+    assert urls_in(index, "kafka consumer group rebalance") == {"https://b.example"}
+    assert urls_in(index, "redis cache aside pattern") == set()
+
+
+def test_expired_pages_are_evicted_on_next_add(tmp_path):
+    index = make_index(tmp_path, max_age_seconds=60)
+    index.add_page("https://old.example", "Old", "postgres vacuum tuning")
+    index._urls["https://old.example"]["fetched_at"] -= 3600
+
+    index.add_page("https://new.example", "New", "nginx upstream keepalive")
+
+    assert set(index._urls) == {"https://new.example"}
+    assert len(index._store.index_to_docstore_id) == 1
+
+
+def test_size_cap_evicts_oldest_pages(tmp_path):
+    index = make_index(tmp_path, max_pages=2)
+    for i, text in enumerate(["alpha beta", "gamma delta", "epsilon zeta"]):
+        index.add_page(f"https://{i}.example", str(i), text)
+
+    assert set(index._urls) == {"https://1.example", "https://2.example"}
+    assert urls_in(index, "alpha beta") == set()
+    assert urls_in(index, "epsilon zeta") == {"https://2.example"}
+
+
+def test_other_worker_sees_added_pages_and_keeps_them(tmp_path):
+    writer = make_index(tmp_path)
+    reader = make_index(tmp_path)
+    writer.add_page("https://a.example", "A", "grpc deadline propagation")
+    assert urls_in(reader, "grpc deadline propagation") == {"https://a.example"}
+
+    # İkinci worker'ın eklemesi birincininkini silmemeli
+    time.sleep(0.01)
+    reader.add_page("https://b.example", "B", "http2 stream multiplexing")
+    assert urls_in(writer, "grpc deadline propagation") == {"https://a.example"}
+    assert urls_in(writer, "http2 stream multiplexing") == {"https://b.example"}
+
+
+def test_lookups_run_safely_during_adds(tmp_path):
+    index = make_index(tmp_path, max_pages=5)
+    index.add_page("https://base.example", "Base", "stable baseline page")
+    errors = []
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            try:
+                assert urls_in(index, "stable baseline page") == {"https://base.example"}
+            except Exception as e:  # pragma: no cover - hata ayrıntısı için
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for t in threads:
+        t.start()
+    try:
+        for i in range(20):
+            index.add_page(f"https://p{i % 3}.example", "P", f"rotating page number{i}")
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+
+    assert errors == []
+
+
+
+def test_add_page_uses_given_embed_function(tmp_path):
+    calls = []
+    embeddings = HashEmbeddings()
+
+    def guarded(texts):
+        calls.append(list(texts))
+        return embeddings.embed_documents(texts)
+
+    index = WebKnowledgeIndex(embeddings, str(tmp_path), chunker=lambda texts: list(texts), embed_fn=guarded)
+    index.add_page("https://a.example", "A", "service mesh sidecar")
+
+    assert calls == [["service mesh sidecar"]]